@@ -0,0 +1,103 @@
+"""Бенчмарк розподілу місць з урахуванням місткості і тривалості бронювань.
+
+Горизонт - 8 днів (як у календарі бронювання). Індекс зайнятості
+заповнюється жадібно: на кожен день і кожну кабінку бронювання
+випадкової тривалості ставляться одне за одним з випадковими
+проміжками до 1,5 години, поки вміщуються. Міряється:
+
+- підбір місць для гостя (вільні на весь час кабінки, відфільтровані і
+  впорядковані за місткістю) для кожної комбінації день × слот × розмір
+  компанії;
+- зайняття і звільнення інтервалу в індексі;
+- перевірка перетину в БД (place_hold) з тим самим наповненням.
+
+Запуск: python benchmarks/bench_allocation.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+HORIZON_DAYS = 8
+DURATIONS = (60, 90, 120, 180)
+INSERT_SQL = (
+    "INSERT INTO bookings (user_id, name, nickname, date, time, guests, cabin, contact, status, chat_id, created_at, duration) "
+    "VALUES (?, 'Гість', '', ?, ?, 2, ?, '+380000000000', 'Підтверджено', ?, 0, ?)"
+)
+
+
+def horizon_bookings(rng):
+    """Бронювання на HORIZON_DAYS днів: інтервали одне за одним з випадковими проміжками на кожну кабінку."""
+    today = date.today()
+    bookings = []
+    for day in range(HORIZON_DAYS):
+        booking_date = (today + timedelta(days=day)).isoformat()
+        for cabin in bot.venue.cabin_names:
+            i = rng.randrange(2)
+            while i < len(bot.venue.time_slots):
+                duration = rng.choice(DURATIONS)
+                bookings.append({'date': booking_date, 'time': bot.venue.time_slots[i], 'cabin': cabin, 'duration': duration})
+                i += -(-duration // bot.venue.slot_minutes) + rng.randrange(4)
+    return bookings
+
+
+def timed(samples, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    samples.append((time.perf_counter() - started) * 1e6)
+    return result
+
+
+def report(name, samples):
+    samples.sort()
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]  # noqa: E731
+    print(f"{name:<40}{len(samples):>8}{p(0.5):>10.1f}{p(0.99):>10.1f}")
+
+
+def main():
+    rng = random.Random(21)
+    bookings = horizon_bookings(rng)
+    bot.occupancy.load(bookings)
+    days = sorted({b['date'] for b in bookings})
+    print(f"{len(bookings)} бронювань на {len(days)} днів, {len(bot.venue.cabin_names)} місць, {len(bot.venue.time_slots)} слотів на день")
+    print(f"{'операція':<40}{'викликів':>8}{'p50, мкс':>10}{'p99, мкс':>10}")
+
+    pick, offered = [], 0
+    for booking_date in days:
+        for booking_time in bot.venue.time_slots:
+            for guests in range(1, bot.venue.max_party_size + 1):
+                bot.user_booking_data[1] = {'date': booking_date, 'time': booking_time, 'guests': guests}
+                offered += len(timed(pick, bot.get_available_cabins, 1))
+    report("підбір місць (день × слот × компанія)", pick)
+
+    occupy, release = [], []
+    for b in rng.sample(bookings, min(2000, len(bookings))):
+        timed(release, bot.occupancy.release, b['date'], b['time'], b['cabin'], b['duration'])
+        timed(occupy, bot.occupancy.occupy, b['date'], b['time'], b['cabin'], b['duration'])
+    report("звільнення інтервалу", release)
+    report("зайняття інтервалу", occupy)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.db = bot.Database(os.path.join(tmp, 'bench.db'))
+        bot.init_db()
+        with bot.db.transaction() as conn:
+            conn.executemany(
+                INSERT_SQL, [(i, b['date'], b['time'], b['cabin'], i, b['duration']) for i, b in enumerate(bookings)]
+            )
+        holds = []
+        for user_id in range(1, 1001):
+            timed(holds, bot.place_hold, rng.choice(days), rng.choice(bot.venue.time_slots), rng.choice(bot.venue.cabin_names), user_id)
+        report("place_hold з перевіркою перетину в БД", holds)
+        bot.db.close()
+    print(f"у середньому запропоновано {offered / len(pick):.1f} місць")
+
+
+if __name__ == '__main__':
+    bot.logging.getLogger().setLevel(bot.logging.WARNING)
+    main()
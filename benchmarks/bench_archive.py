@@ -0,0 +1,129 @@
+"""Бенчмарк гарячих запитів до bookings залежно від обсягу історії, до і після архівації.
+
+Для кожного розміру історії таблиця містить той самий набір активних
+бронювань на найближчі 8 днів і n минулих та завершених бронювань.
+Гарячі запити міряються до архівації і після того, як
+storage.archive_bookings перенесла історію в bookings_archive; після
+архівації їхній час не залежить від n.
+
+Запуск: python benchmarks/bench_archive.py [розмір історії ...]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+REPEATS = 20
+HISTORY_STATUSES = ['Підтверджено'] * 6 + ['Відхилено'] * 2 + ['Скасовано (адміном)', bot.EXPIRED_BOOKING_STATUS]
+INSERT_SQL = (
+    "INSERT INTO bookings (user_id, name, nickname, date, time, guests, cabin, contact, status, chat_id, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def fill(n):
+    """n минулих бронювань і однаковий для всіх розмірів набір майбутніх.
+
+    Кожне минуле бронювання займає окрему пару (дата, час, кабінка), як у
+    справжній базі, тож історія з більшим n сягає далі в минуле.
+    """
+    rng = random.Random(42)
+    today = date.today()
+    created_at = time.time() - 2 * bot.ARCHIVE_TERMINAL_AFTER_SECONDS
+    slots = [(t, cabin) for t in bot.venue.time_slots for cabin in bot.venue.cabin_names]
+    history = (
+        (
+            rng.randrange(1, 50_000), "Гість", "", (today - timedelta(days=1 + i // len(slots))).isoformat(),
+            slots[i % len(slots)][0], rng.randrange(1, 12), slots[i % len(slots)][1], "+380000000000",
+            rng.choice(HISTORY_STATUSES), 1, created_at,
+        )
+        for i in range(n)
+    )
+    upcoming = [
+        (
+            rng.randrange(1, 50_000), "Гість", "", (today + timedelta(days=d)).isoformat(), slot,
+            rng.randrange(1, 12), cabin, "+380000000000", rng.choice(bot.ACTIVE_STATUSES), 1, created_at,
+        )
+        for d in range(8) for slot in bot.venue.time_slots for cabin in bot.venue.cabin_names[:4]
+    ]
+    with bot.db.transaction() as conn:
+        conn.executemany(INSERT_SQL, history)
+        conn.executemany(INSERT_SQL, upcoming)
+
+
+def median_ms(func):
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def hot_queries():
+    today = date.today().isoformat()
+    return {
+        "доступність на дату і час": lambda: bot.get_bookings_from_db(
+            {'date': today, 'time': '20:00', 'status': bot.ACTIVE_STATUSES}
+        ),
+        "перша сторінка адмін-списку": lambda: bot.get_active_bookings_page(limit=bot.ADMIN_PAGE_SIZE),
+        "завантаження індексу зайнятості": bot.load_occupancy,
+        "підтверджені бронювання гостя": lambda: bot.get_bookings_from_db({'user_id': 777, 'status': 'Підтверджено'}),
+    }
+
+
+def file_size_mb(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix)) / 2 ** 20
+
+
+async def archive_all():
+    total = 0
+    while True:
+        archived = await bot.storage.archive_bookings()
+        total += archived
+        if archived < bot.ARCHIVE_BATCH_SIZE * bot.ARCHIVE_MAX_BATCHES:
+            await bot.db_writer.stop()
+            return total
+
+
+def run(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        bot.db = bot.Database(path)
+        bot.enable_incremental_vacuum()
+        bot.run_migrations()
+        fill(n)
+        bot.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        before = {name: median_ms(query) for name, query in hot_queries().items()}
+        size_before = file_size_mb(path)
+
+        started = time.perf_counter()
+        archived = asyncio.run(archive_all())
+        archive_seconds = time.perf_counter() - started
+        bot.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        after = {name: median_ms(query) for name, query in hot_queries().items()}
+        rows_left = bot.db.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+        bot.db.close()
+        size_after = file_size_mb(path)
+
+    print(f"\n{n:,} рядків історії: перенесено {archived:,} за {archive_seconds:.1f} с, у bookings лишилось {rows_left:,}")
+    print(f"розмір файлу БД: {size_before:.1f} МБ -> {size_after:.1f} МБ (архів у тому ж файлі)")
+    print(f"{'запит':<36}{'до архівації, мс':>18}{'після, мс':>12}")
+    for name in before:
+        print(f"{name:<36}{before[name]:>18.3f}{after[name]:>12.3f}")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    bot.logging.getLogger().setLevel(bot.logging.WARNING)
+    for size in sizes:
+        run(size)
@@ -0,0 +1,70 @@
+"""Мікробенчмарк розбору callback-даних і вибору обробника.
+
+Порівнює попередню схему (рядки на кшталт "cabin_<повна назва>", ланцюг
+CallbackQueryHandler з регулярними виразами, які перевіряються по черзі,
+і повторний розбір split("_") в обробнику) з компактним кодуванням і
+словником кодів CallbackRouter. Для кожної кнопки міряється шлях від
+callback_data до аргументів обробника; окремо виводиться розмір даних.
+Кнопки рішення адміна старого формату мають і далі декодуватися так само,
+як нові.
+
+Запуск: python benchmarks/bench_callbacks.py
+"""
+import os
+import re
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+NUMBER = 20000
+
+# Шаблони обробників у тому порядку, в якому їх перевіряли розмова і глобальні обробники
+LEGACY_PATTERNS = [re.compile(p) for p in (
+    "^(use_saved_contacts|enter_new_contacts)$", "^date_", "^time_", "^cabin_", "^save_contact_(yes|no)$", "^rating_",
+    "^admin_(confirm|reject)_.+", "^admin_force_cancel_.+", "^admin_list_(next|prev)_.+", "^bulk_(go_.+|no)$",
+)]
+
+
+def legacy_route(data):
+    for i, pattern in enumerate(LEGACY_PATTERNS):
+        if pattern.match(data):
+            return i, data.split("_")
+    return None
+
+
+def router_route(data):
+    op, args = bot.decode_callback_data(data, bot.venue)
+    return bot.callbacks._routes[op.code][1], list(args)
+
+
+def main():
+    today = date.today().isoformat()
+    cabin = bot.venue.cabin_names[5]
+    cases = [
+        ("дата", f"date_{today}", bot.CB_DATE.encode(today)),
+        ("час", "time_20:30", bot.CB_TIME.encode("20:30")),
+        ("місце", f"cabin_{cabin}", bot.CB_CABIN.encode(cabin)),
+        ("рейтинг", "rating_5", bot.CB_RATING.encode(5)),
+        ("підтвердження адміном", "admin_confirm_123456", bot.CB_ADMIN_DECISION.encode("confirm", 123456)),
+        ("гортання списку", f"admin_list_next_123456_{today}", bot.CB_ADMIN_LIST.encode("next", 123456, today)),
+        ("масова дія", f"bulk_go_cancel|{today}|20:00|1,2,3", bot.CB_BULK.encode("cancel", today, "20:00", list(bot.venue.cabin_names[:3]), None)),
+    ]
+    print(f"{'кнопка':<24}{'байтів до':>10}{'після':>7}{'до, мкс':>10}{'після, мкс':>12}")
+    for name, legacy, compact in cases:
+        before = timeit.timeit(lambda: legacy_route(legacy), number=NUMBER) / NUMBER * 1e6
+        after = timeit.timeit(lambda: router_route(compact), number=NUMBER) / NUMBER * 1e6
+        print(f"{name:<24}{len(legacy.encode()):>10}{len(compact.encode()):>7}{before:>10.2f}{after:>12.2f}")
+    for action in ("confirm", "reject"):
+        assert bot.decode_callback_data(f"admin_{action}_123456", bot.venue) == \
+            bot.decode_callback_data(bot.CB_ADMIN_DECISION.encode(action, 123456), bot.venue), action
+    assert bot.decode_callback_data("admin_force_cancel_1_0_all", bot.venue) is None
+    longest = max(len(f"cabin_{name}".encode()) for name in bot.venue.cabin_names)
+    print(f"найдовша кнопка місця за старою схемою: {longest} байтів з {bot.CALLBACK_DATA_LIMIT}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Бенчмарк гарячих запитів до bookings до і після міграції з індексами.
+
+"До" - схема версії 1 з доданою колонкою duration (її читає
+get_bookings_from_db, а додала міграція 11), "після" - та сама таблиця
+з тими самими рядками після міграції 2 з індексами. Пізніші міграції не
+застосовуються: вони змінюють дані і додають власні індекси. Кожен запит
+має повернути однакові рядки до і після.
+
+Наостанок через обробники проходить натискання кнопки календаря,
+надісланої до переходу на дати "рррр-мм-дд" ("date_дд.мм.рррр"):
+бронювання має зберегтися з датою "рррр-мм-дд" і знаходитися діапазонним
+запитом та індексом зайнятості.
+
+Запуск: python benchmarks/bench_indexes.py [кількість рядків ...]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+REPEATS = 50
+STATUSES = (
+    ['Очікує підтвердження'] * 2
+    + ['Підтверджено'] * 30
+    + ['Відхилено'] * 18
+    + ['Скасовано (адміном)'] * 50
+)
+
+
+def fill_bookings(n):
+    """Заповнює таблицю n випадковими бронюваннями за кілька років історії."""
+    rng = random.Random(42)
+    start = date.today() - timedelta(days=3 * 365)
+    days = [(start + timedelta(days=i)).isoformat() for i in range(3 * 365 + 8)]
+    rows = (
+        (
+            rng.randrange(1, 50_000), "Гість", "", rng.choice(days), rng.choice(bot.venue.time_slots),
+            rng.randrange(1, 12), rng.choice(bot.venue.cabin_names), "+380000000000", rng.choice(STATUSES), 1,
+        )
+        for _ in range(n)
+    )
+    with bot.db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO bookings (user_id, name, nickname, date, time, guests, cabin, contact, status, chat_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def add_duration_column():
+    """Колонка duration без індексів і перетворень даних пізніших міграцій."""
+    with bot.db.transaction() as conn:
+        conn.execute(f"ALTER TABLE bookings ADD COLUMN duration INTEGER NOT NULL DEFAULT {bot.BOOKING_DURATION_MINUTES}")
+
+
+class FailOnError(bot.logging.Handler):
+    """get_bookings_from_db при помилці SQL лише пише в журнал і повертає [] - тут це зупиняє бенчмарк."""
+
+    def emit(self, record):
+        raise AssertionError(f"запит завершився помилкою: {record.getMessage()}")
+
+
+def time_query(filters):
+    """Повертає медіанний час виконання get_bookings_from_db у мілісекундах і кількість рядків."""
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        rows = len(bot.get_bookings_from_db(filters))
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], rows
+
+
+def hot_queries():
+    today = date.today()
+    return {
+        "доступність (date, time, status)": {
+            'date': today.isoformat(), 'time': '20:00', 'status': ['Очікує підтвердження', 'Підтверджено'],
+        },
+        "очікують підтвердження (status)": {'status': 'Очікує підтвердження'},
+        "історія користувача (user_id)": {'user_id': 777},
+        "тиждень (діапазон date)": {
+            'date_from': today.isoformat(), 'date_to': (today + timedelta(days=6)).isoformat(),
+            'status': ['Очікує підтвердження', 'Підтверджено'],
+        },
+        "майбутні гостя (user_id, date)": {'user_id': 777, 'date_from': today.isoformat()},
+    }
+
+
+def run(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.db = bot.Database(os.path.join(tmp, 'bench.db'))
+        bot.run_migrations(target_version=1)
+        add_duration_column()
+        fill_bookings(n)
+        before = {name: time_query(f) for name, f in hot_queries().items()}
+        bot.run_migrations(target_version=2)
+        after = {name: time_query(f) for name, f in hot_queries().items()}
+        bot.db.close()
+
+    print(f"\n{n:,} рядків")
+    print(f"{'запит':<36}{'рядків':>8}{'без індексів, мс':>18}{'з індексами, мс':>18}")
+    for name in before:
+        assert before[name][1] == after[name][1], f"{name}: різні результати до і після міграції"
+        print(f"{name:<36}{after[name][1]:>8}{before[name][0]:>18.3f}{after[name][0]:>18.3f}")
+
+
+async def press(user_id, data):
+    """Натискання кнопки data гостем user_id через маршрутизатор; повертає новий стан розмови."""
+    async def reply(*args, **kwargs):
+        pass
+    query = SimpleNamespace(
+        data=data, from_user=SimpleNamespace(id=user_id), answer=reply, edit_message_text=reply,
+        message=SimpleNamespace(reply_text=reply),
+    )
+    update = SimpleNamespace(callback_query=query, effective_chat=SimpleNamespace(id=user_id))
+    return await bot.callbacks.dispatch(update, SimpleNamespace(args=None))
+
+
+async def replay_legacy_calendar():
+    day = date.today() + timedelta(days=1)
+    user_id = 777
+    bot.user_booking_data[user_id] = {}
+    assert await press(user_id, f"date_{day.strftime('%d.%m.%Y')}") == bot.BOOKING_TIME
+    assert bot.user_booking_data[user_id]['date'] == day.isoformat(), bot.user_booking_data[user_id]
+    bot.user_booking_data[user_id].update({
+        'time': '20:00', 'guests': 2, 'cabin': bot.venue.cabin_names[1], 'name': "Гість", 'contact': '+380000000000',
+    })
+    assert await press(user_id, bot.CB_SAVE_CONTACT.encode(False)) == bot.CHOOSING_MAIN_ACTION
+    await bot.db_writer.stop()
+
+    rows = bot.get_bookings_from_db({'date_from': day.isoformat(), 'date_to': day.isoformat()})
+    assert [row['date'] for row in rows] == [day.isoformat()], rows
+    assert bot.occupancy.busy_mask(day.isoformat(), '20:00', bot.venue.booking_duration), "бронювання немає в індексі"
+
+
+def run_replay():
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.db = bot.Database(os.path.join(tmp, 'replay.db'))
+        bot.init_db()
+        bot.load_occupancy()
+        asyncio.run(replay_legacy_calendar())
+        bot.db.close()
+    print("\nстара кнопка календаря: бронювання збережено з датою рррр-мм-дд, діапазон і індекс його знаходять")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    bot.logging.getLogger().setLevel(bot.logging.WARNING)
+    bot.logging.getLogger().addHandler(FailOnError(bot.logging.ERROR))
+    for size in sizes:
+        run(size)
+    run_replay()
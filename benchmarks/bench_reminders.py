@@ -0,0 +1,105 @@
+"""Бенчмарк планувальника нагадувань: побудова розкладу і точність спрацювання.
+
+Спершу в БД створюється n підтверджених бронювань на найближчі дні і
+міряється старт планувальника (один запит + побудова купи). Потім
+планується m нагадувань, що спрацьовують одночасно, половина з них
+скасовується, і міряється запізнення відправки відносно запланованого
+часу. Нагадування надсилається лише після того, як його позначено в
+БД, тож для них теж створюються справжні бронювання. Відправка підмінена
+записом у список.
+
+Запуск: python benchmarks/bench_reminders.py [n] [m]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+DEFAULT_BOOKINGS = 100_000
+DEFAULT_DUE = 2_000
+INSERT_SQL = (
+    "INSERT INTO bookings (user_id, name, nickname, date, time, guests, cabin, contact, status, chat_id, created_at) "
+    "VALUES (?, 'Гість', '', ?, ?, 2, ?, '+380000000000', 'Підтверджено', ?, 0)"
+)
+
+
+def fill(n, first_day=1):
+    """n підтверджених бронювань, кожне на окремій парі (дата, час, кабінка); повертає їхні id."""
+    slots = [(t, cabin) for t in bot.venue.time_slots for cabin in bot.venue.cabin_names]
+    today = date.today()
+    with bot.db.transaction() as conn:
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM bookings").fetchone()[0]
+        conn.executemany(INSERT_SQL, (
+            (i, (today + timedelta(days=first_day + i // len(slots))).isoformat(), *slots[i % len(slots)], i)
+            for i in range(n)
+        ))
+    return range(last_id + 1, last_id + n + 1)
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def measure(n, m):
+    sent = {}
+
+    async def fake_send(chat_id, text, reply_markup=None, priority=bot.PRIORITY_GUEST, booking_id=None):
+        sent[chat_id] = time.time()
+
+    bot.outbox.send = fake_send
+    started = time.perf_counter()
+    await bot.reminders.start()
+    start_ms = (time.perf_counter() - started) * 1000
+    loaded = len(bot.reminders)
+
+    # Розклад має хвилинну точність, тож усі m нагадувань призначаються на
+    # один слот, а випередження підбирається так, щоб вони спрацювали
+    # разом приблизно через секунду
+    starts = datetime.fromtimestamp((int(time.time()) // 60 + 2) * 60)
+    bot.reminders.lead_seconds = starts.timestamp() - time.time() - 1
+    # Бронювання для них - далеко після тих, що вже в розкладі
+    booking_ids = fill(m, first_day=2 + n // (len(bot.venue.time_slots) * len(bot.venue.cabin_names)))
+    due = {}
+    for i, booking_id in enumerate(booking_ids):
+        chat_id = -(i + 1)
+        bot.reminders.schedule(booking_id, chat_id, starts.date().isoformat(), starts.strftime("%H:%M"), bot.venue.cabin_names[0])
+        due[chat_id] = bot.reminders._pending[booking_id][0]
+    for i, chat_id in list(enumerate(due))[::2]:
+        bot.reminders.cancel(booking_ids[i])
+        del due[chat_id]
+    await asyncio.sleep(3)
+    await bot.reminders.stop()
+    await bot.db_writer.stop()
+
+    fired = [chat_id for chat_id in sent if chat_id in due]
+    late_ms = sorted((sent[chat_id] - due[chat_id]) * 1000 for chat_id in fired)
+    wrong = len(set(sent) - set(due))
+    return start_ms, loaded, late_ms, wrong
+
+
+def run(n, m):
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.db = bot.Database(os.path.join(tmp, 'bench.db'))
+        bot.init_db()
+        fill(n)
+        start_ms, loaded, late_ms, wrong = asyncio.run(measure(n, m))
+        bot.db.close()
+    print(f"старт планувальника: {loaded:,} нагадувань з {n:,} бронювань за {start_ms:.1f} мс")
+    if late_ms:
+        print(
+            f"спрацювало {len(late_ms):,} з {m - m // 2:,}; запізнення, мс: "
+            f"p50 {percentile(late_ms, 0.5):.1f}, p99 {percentile(late_ms, 0.99):.1f}, max {late_ms[-1]:.1f}"
+        )
+    print(f"надіслано скасованих: {wrong}")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    bot.logging.getLogger().setLevel(bot.logging.WARNING)
+    run(args[0] if args else DEFAULT_BOOKINGS, args[1] if len(args) > 1 else DEFAULT_DUE)
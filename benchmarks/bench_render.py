@@ -0,0 +1,113 @@
+"""Мікробенчмарк вартості рендерингу клавіатур і повідомлень на одне оновлення.
+
+Порівнює реалізації, що будували розмітку заново на кожен виклик
+(відтворені тут), з кешованими версіями з bot.py. Повідомлення про
+бронювання порівнюється двічі: з першою версією, що ще не показувала
+дату як дд.мм.рррр і кінець бронювання, і з f-рядком, що рахував їх на
+кожен виклик, - з тим самим текстом, що й у скомпільованого шаблону.
+
+Запуск: python benchmarks/bench_render.py
+"""
+import os
+import sys
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup  # noqa: E402
+
+import bot  # noqa: E402
+
+NUMBER = 2000
+
+BOOKING = {
+    'id': 42, 'user_id': 1, 'name': "Олена", 'nickname': "@olena", 'date': "2025-08-15", 'time': "20:00",
+    'guests': 6, 'cabin': bot.venue.cabin_names[3], 'contact': "+380991234567", 'status': "Очікує підтвердження", 'chat_id': 1,
+}
+
+
+def legacy_main_keyboard():
+    return ReplyKeyboardMarkup(
+        [
+            ["📅 Забронювати столик", "📸 Instagram"],
+            ["📖 Меню", "⭐ Залишити відгук"],
+            ["👀 Переглянути бронювання (адміну)", "📞 Зв'язатися з адміном"]
+        ],
+        resize_keyboard=True
+    )
+
+
+def legacy_calendar_keyboard():
+    keyboard = []
+    today = date.today()
+    for i in range(8):
+        day = today + timedelta(days=i)
+        keyboard.append([InlineKeyboardButton(f"{day.strftime('%d.%m')} ({day.strftime('%a')})", callback_data=f"date_{day.strftime('%d.%m.%Y')}")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def legacy_time_slots_keyboard():
+    keyboard = []
+    for i in range(0, len(bot.venue.time_slots), 4):
+        row = []
+        for slot in bot.venue.time_slots[i:i + 4]:
+            row.append(InlineKeyboardButton(slot, callback_data=f"time_{slot}"))
+        keyboard.append(row)
+    return InlineKeyboardMarkup(keyboard)
+
+
+def legacy_cabins_keyboard():
+    return InlineKeyboardMarkup([[InlineKeyboardButton(cabin, callback_data=f"cabin_{cabin}")] for cabin in bot.venue.cabin_names])
+
+
+def legacy_format_booking_msg(booking):
+    return (
+        f"📅 Нове бронювання:\n"
+        f"Ім'я: {booking['name']}\n"
+        f"Нік: {booking.get('nickname', 'не вказано')}\n"
+        f"Дата: {booking['date']}\n"
+        f"Час: {booking['time']}\n"
+        f"Гостей: {booking['guests']}\n"
+        f"Місце: {booking['cabin']}\n"
+        f"Телефон: {booking['contact']}\n"
+        f"Статус: {booking['status']}"
+    )
+
+
+def uncached_format_booking_msg(booking):
+    iso_day = booking['date']
+    end = bot.slot_minutes(booking['time']) + (booking.get('duration') or bot.venue.booking_duration)
+    return (
+        f"📅 Нове бронювання:\n"
+        f"Ім'я: {booking['name']}\n"
+        f"Нік: {booking.get('nickname', 'не вказано')}\n"
+        f"Дата: {iso_day[8:10]}.{iso_day[5:7]}.{iso_day[:4]}\n"
+        f"Час: {booking['time']}-{end // 60 % 24:02d}:{end % 60:02d}\n"
+        f"Гостей: {booking['guests']}\n"
+        f"Місце: {booking['cabin']}\n"
+        f"Телефон: {booking['contact']}\n"
+        f"Статус: {booking['status']}"
+    )
+
+
+CASES = [
+    ("головна клавіатура", legacy_main_keyboard, bot.get_main_keyboard),
+    ("календар на 8 днів", legacy_calendar_keyboard, bot.generate_calendar_keyboard),
+    ("сітка часу", legacy_time_slots_keyboard, lambda: bot.venue.time_slots_keyboard),
+    ("клавіатура кабінок", legacy_cabins_keyboard, lambda: bot.generate_cabins_keyboard(bot.venue.cabin_names)),
+    ("повідомлення про бронювання", lambda: legacy_format_booking_msg(BOOKING), lambda: bot.format_booking_msg(BOOKING)),
+    ("те саме з датою і кінцем", lambda: uncached_format_booking_msg(BOOKING), lambda: bot.format_booking_msg(BOOKING)),
+]
+
+
+def per_call_us(func):
+    return min(timeit.repeat(func, number=NUMBER, repeat=5)) / NUMBER * 1e6
+
+
+if __name__ == '__main__':
+    assert uncached_format_booking_msg(BOOKING) == bot.format_booking_msg(BOOKING)
+    print(f"{'рендер':<30}{'до, мкс':>12}{'після, мкс':>12}{'прискорення':>14}")
+    for name, before, after in CASES:
+        b, a = per_call_us(before), per_call_us(after)
+        print(f"{name:<30}{b:>12.2f}{a:>12.2f}{b / a:>13.1f}x")
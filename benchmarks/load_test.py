@@ -0,0 +1,354 @@
+"""Навантажувальний тест усього бота в одному процесі.
+
+Будує той самий Application і ConversationHandler, що й main(), але з
+ботом-заглушкою: замість запитів до Telegram він записує виклики API і
+повертає вигадані відповіді. Симульовані гості одночасно проходять
+/start → дата → час → гості → кабінка → ім'я → нік → телефон →
+збереження контактів і залишають відгук, після чого адмін переглядає
+список і підтверджує або відхиляє кожне бронювання.
+
+Звіт: пропускна здатність і p50/p95/p99 для кожного стану розмови,
+обробника і функції БД. Результати пишуться в JSON (--output), а з
+--baseline попередній файл порівнюється з поточним прогоном, тож
+регресії видно між комітами.
+
+Запуск: python benchmarks/load_test.py [--users 500] [--api-latency-ms 0] [--output load_test_results.json] [--baseline old.json]
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import InlineKeyboardMarkup, Update  # noqa: E402
+from telegram.ext import ConversationHandler, ExtBot  # noqa: E402
+
+import bot  # noqa: E402
+
+DEFAULT_USERS = 500
+DEFAULT_OUTPUT = "load_test_results.json"
+STUB_TOKEN = "123456:LOAD-TEST"
+STUB_USER = {"id": 123456, "is_bot": True, "first_name": "Load test", "username": "load_test_bot"}
+
+# Функції БД, час яких міряється. Методи storage шукають їх у модулі
+# bot під час виклику, тож достатньо підмінити атрибути модуля.
+DB_FUNCTIONS = (
+    "get_bookings_from_db", "get_booking_by_id", "get_active_bookings_page", "get_user_contact",
+    "add_booking_to_db", "update_booking_status_in_db", "save_user_contact", "save_review",
+    "place_hold", "release_hold", "sweep_expired_reservations", "save_session_state",
+    "outbox_insert", "outbox_mark_sent", "outbox_reschedule",
+)
+
+
+class ApiRecorder:
+    """Записує виклики Telegram API, зроблені ботом-заглушкою."""
+
+    def __init__(self, api_latency=0.0):
+        self.api_latency = api_latency
+        self.calls = defaultdict(int)
+        self.last_markup = {}  # chat_id -> остання inline-клавіатура
+        self.last_message_id = {}
+        self.last_text = {}
+        self._message_ids = itertools.count(1)
+
+    def record(self, endpoint, data):
+        """Повертає вигадану відповідь Telegram на виклик endpoint."""
+        self.calls[endpoint] += 1
+        if endpoint == "getMe":
+            return STUB_USER
+        if endpoint not in ("sendMessage", "editMessageText"):
+            return True
+
+        chat_id = data["chat_id"]
+        markup = data.get("reply_markup")
+        if isinstance(markup, InlineKeyboardMarkup):
+            self.last_markup[chat_id] = markup.to_dict()
+        elif endpoint == "editMessageText":
+            self.last_markup.pop(chat_id, None)
+        message_id = data.get("message_id") or next(self._message_ids)
+        self.last_message_id[chat_id] = message_id
+        self.last_text[chat_id] = data.get("text", "")
+        return {
+            "message_id": message_id, "date": int(time.time()), "text": data.get("text", ""),
+            "chat": {"id": chat_id, "type": "private"}, "from": STUB_USER,
+        }
+
+    def find_button(self, chat_id, prefix, text=None):
+        """Повертає callback_data першої кнопки з префіксом (і текстом) у останній клавіатурі чату."""
+        markup = self.last_markup.get(chat_id) or {}
+        for row in markup.get("inline_keyboard", []):
+            for button in row:
+                if button.get("callback_data", "").startswith(prefix) and text in (None, button["text"]):
+                    return button["callback_data"]
+        return None
+
+
+class RecordingBot(ExtBot):
+    """Бот, що нічого не надсилає в Telegram, а передає виклики API в ApiRecorder."""
+
+    def __init__(self, recorder):
+        super().__init__(STUB_TOKEN)
+        self._recorder = recorder
+
+    async def _do_post(self, endpoint, data, *, read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if self._recorder.api_latency:
+            await asyncio.sleep(self._recorder.api_latency)
+        return self._recorder.record(endpoint, data)
+
+
+class Stats:
+    """Збирає тривалості (у секундах) за групами і назвами."""
+
+    def __init__(self):
+        self.samples = defaultdict(lambda: defaultdict(list))
+
+    def add(self, group, name, seconds):
+        self.samples[group][name].append(seconds)
+
+    @staticmethod
+    def summarize(samples):
+        samples = sorted(samples)
+        p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000  # noqa: E731
+        return {
+            'count': len(samples), 'mean_ms': sum(samples) / len(samples) * 1000,
+            'p50_ms': p(0.5), 'p95_ms': p(0.95), 'p99_ms': p(0.99),
+        }
+
+    def report(self):
+        return {group: {name: self.summarize(s) for name, s in sorted(names.items())} for group, names in self.samples.items()}
+
+
+def timed(stats, group, func):
+    """Обгортає синхронну або асинхронну функцію, записуючи тривалість викликів."""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                stats.add(group, func.__name__, time.perf_counter() - started)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.add(group, func.__name__, time.perf_counter() - started)
+    return wrapper
+
+
+def instrument(application, stats):
+    """Міряє час кожного обробника і кожної функції БД.
+
+    Натискання кнопок усі проходять через CallbackRouter.dispatch, тож
+    міряються не вони, а обробники, до яких dispatch їх направляє.
+    """
+    for handler in itertools.chain.from_iterable(application.handlers.values()):
+        handlers = [handler]
+        if isinstance(handler, ConversationHandler):
+            handlers = handler.entry_points + handler.fallbacks + list(itertools.chain.from_iterable(handler.states.values()))
+        for h in handlers:
+            if h.callback != bot.callbacks.dispatch:
+                h.callback = timed(stats, 'handlers', h.callback)
+    routes = bot.callbacks._routes
+    for code, (op, handler) in routes.items():
+        routes[code] = (op, timed(stats, 'handlers', handler))
+    for name in DB_FUNCTIONS:
+        setattr(bot, name, timed(stats, 'db', getattr(bot, name)))
+
+
+class Simulation:
+    """Надсилає синтетичні оновлення від імені гостей і адміна."""
+
+    def __init__(self, application, stub, stats):
+        self.application = application
+        self.stub = stub
+        self.stats = stats
+        self.update_ids = itertools.count(1)
+        self.outcome = defaultdict(int)
+
+    async def send(self, state, user_id, text=None, callback_data=None):
+        """Подає одне оновлення тим самим шляхом, що й Updater, і міряє час обробки."""
+        user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+        chat = {"id": user_id, "type": "private"}
+        update_id = next(self.update_ids)
+        if callback_data is None:
+            message = {"message_id": update_id, "date": int(time.time()), "chat": chat, "from": user, "text": text}
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+            data = {"update_id": update_id, "message": message}
+        else:
+            message = {"message_id": self.stub.last_message_id.get(user_id, 1), "date": int(time.time()), "chat": chat, "text": ""}
+            data = {"update_id": update_id, "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": str(user_id), "data": callback_data, "message": message,
+            }}
+        update = Update.de_json(data, self.application.bot)
+        started = time.perf_counter()
+        await self.application.update_processor.process_update(update, self.application.process_update(update))
+        self.stats.add('states', state, time.perf_counter() - started)
+
+    async def guest(self, user_id, index):
+        days = len(bot.generate_calendar_keyboard().inline_keyboard)
+        await self.send("start", user_id, "/start")
+        await self.send("CHOOSING_MAIN_ACTION", user_id, "📅 Забронювати столик")
+        # Гості розподіляються по днях і слотах, щоб місця закінчувались лише за великого N
+        day_button = self.stub.last_markup[user_id]["inline_keyboard"][index % days][0]["callback_data"]
+        await self.send("BOOKING_DATE", user_id, callback_data=day_button)
+        slot = bot.venue.time_slots[(index // days) % len(bot.venue.time_slots)]
+        await self.send("BOOKING_TIME", user_id, callback_data=bot.CB_TIME.encode(slot))
+        await self.send("BOOKING_GUESTS", user_id, str(2 + index % 6))
+        # Якщо місце щойно утримав інший гість, бот пропонує інші - пробуємо наступне
+        cabin = self.stub.find_button(user_id, bot.CB_CABIN.prefix)
+        while cabin is not None:
+            await self.send("BOOKING_CABIN", user_id, callback_data=cabin)
+            cabin = self.stub.find_button(user_id, bot.CB_CABIN.prefix)
+            if cabin is not None:
+                self.outcome['cabin_retries'] += 1
+        if self.stub.last_text.get(user_id) != "Як вас звати?":
+            self.outcome['no_cabins'] += 1
+        else:
+            await self.send("BOOKING_NAME", user_id, f"Гість {user_id}")
+            await self.send("BOOKING_NICKNAME", user_id, f"@guest{user_id}")
+            await self.send("BOOKING_PHONE", user_id, f"+380{user_id:09d}")
+            await self.send("ASK_SAVE_CONTACT", user_id, callback_data=bot.CB_SAVE_CONTACT.encode(True))
+            self.outcome['booking_flows'] += 1
+
+        await self.send("CHOOSING_MAIN_ACTION", user_id, "⭐ Залишити відгук")
+        await self.send("ASK_REVIEW_RATING", user_id, callback_data=bot.CB_RATING.encode(1 + index % 5))
+        await self.send("ASK_REVIEW_TEXT", user_id, "Все сподобалось")
+        self.outcome['review_flows'] += 1
+
+    async def admin(self):
+        admin_id = bot.ADMIN_USER_ID
+        await self.send("start", admin_id, "/start")
+        await self.send("CHOOSING_MAIN_ACTION", admin_id, "👀 Переглянути бронювання (адміну)")
+        while True:
+            next_page = self.stub.find_button(admin_id, bot.CB_ADMIN_LIST.prefix, text="Далі ➡️")
+            if next_page is None:
+                break
+            await self.send("admin_list", admin_id, callback_data=next_page)
+
+        pending = bot.get_bookings_from_db(filters={'status': 'Очікує підтвердження'})
+        for i, booking in enumerate(pending):
+            action = "confirm" if i % 4 else "reject"
+            await self.send(f"admin_{action}", admin_id, callback_data=bot.CB_ADMIN_DECISION.encode(action, booking['id']))
+            self.outcome[f"admin_{action}"] += 1
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def verify():
+    duplicates = bot.db.execute(
+        "SELECT date, time, cabin, COUNT(*) FROM bookings WHERE status IN ('Очікує підтвердження', 'Підтверджено') "
+        "GROUP BY date, time, cabin HAVING COUNT(*) > 1"
+    ).fetchall()
+    assert not duplicates, f"подвійні бронювання: {duplicates}"
+
+
+async def run(users, api_latency):
+    stub = ApiRecorder(api_latency)
+    application = bot.build_application(bot=RecordingBot(stub))
+    stats = Stats()
+    instrument(application, stats)
+    simulation = Simulation(application, stub, stats)
+
+    await application.initialize()
+    await bot.on_startup(application)
+    await application.start()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(simulation.guest(1000 + i, i) for i in range(users)))
+    guests_elapsed = time.perf_counter() - started
+    await simulation.admin()
+    elapsed = time.perf_counter() - started
+
+    await application.stop()
+    await application.shutdown()
+    await bot.flush_session_state(application.persistence)
+    verify()
+    await bot.on_shutdown(application)
+
+    report = stats.report()
+    updates = sum(s['count'] for s in report['states'].values())
+    return {
+        'meta': {
+            'revision': git_revision(), 'python': platform.python_version(), 'timestamp': int(time.time()),
+            'users': users, 'api_latency_ms': api_latency * 1000,
+        },
+        'totals': {
+            'updates': updates, 'elapsed_s': elapsed, 'guests_elapsed_s': guests_elapsed,
+            'updates_per_s': updates / elapsed, 'api_calls': dict(stub.calls), 'outcome': dict(simulation.outcome),
+        },
+        **report,
+    }
+
+
+def print_table(title, rows, baseline=None):
+    print(f"\n{title}")
+    print(f"{'':<34}{'к-сть':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}" + (f"{'p95 було':>10}{'Δ':>9}" if baseline is not None else ""))
+    for name, s in rows.items():
+        line = f"{name:<34}{s['count']:>8}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+        old = (baseline or {}).get(name)
+        if old:
+            line += f"{old['p95_ms']:>10.2f}{(s['p95_ms'] / old['p95_ms'] - 1) * 100 if old['p95_ms'] else 0:>+8.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS, help="кількість симульованих гостей")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="штучна затримка кожного виклику Telegram API")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="куди записати результати в JSON")
+    parser.add_argument("--baseline", help="JSON попереднього прогону для порівняння")
+    args = parser.parse_args()
+
+    bot.logging.getLogger().setLevel(bot.logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.db = bot.Database(os.path.join(tmp, 'load.db'))
+        bot.init_db()
+        bot.load_occupancy()
+        bot.load_slot_holds()
+        bot.load_booking_sessions()
+        results = asyncio.run(run(args.users, args.api_latency_ms / 1000))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    totals = results['totals']
+    print(f"ревізія {results['meta']['revision']}, гостей: {args.users}, оновлень: {totals['updates']}, за {totals['elapsed_s']:.2f} с")
+    print(f"пропускна здатність: {totals['updates_per_s']:.0f} оновлень/с" + (
+        f" (було {baseline['totals']['updates_per_s']:.0f})" if baseline else ""))
+    print(f"результати: {totals['outcome']}")
+    print(f"виклики API: {totals['api_calls']}")
+    print_table("стани розмови", results['states'], baseline and baseline.get('states'))
+    print_table("обробники", results['handlers'], baseline and baseline.get('handlers'))
+    print_table("функції БД", results['db'], baseline and baseline.get('db'))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nрезультати записано в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Стрес-тест кешу контактів: кеш і БД не розходяться.
+
+Сотні одночасних гостей з невеликого пулу читають і зберігають
+контакти через storage; читання з БД затримується на випадкові частки
+мілісекунди, щоб записи потрапляли між початком читання і заповненням
+кешу. Після кожного раунду кожен запис кешу звіряється з таблицею users
+(включно з відсутністю контактів). Друга фаза імітує інший процес зі
+спільною БД: контакти змінюються через окреме з'єднання, і після
+SharedSQLiteStorage.refresh() кеш знову має збігатися з БД.
+
+Наприкінці - влучання і промахи кешу та час get_user_contact з кешем і без.
+
+Запуск: python benchmarks/stress_contact_cache.py [раундів] [гостей]
+"""
+import asyncio
+import functools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+DEFAULT_ROUNDS = 20
+DEFAULT_GUESTS = 500
+USER_POOL = 300
+
+
+def with_read_delay(func, rng):
+    @functools.wraps(func)
+    def wrapper(*args):
+        time.sleep(rng.random() / 1000)
+        return func(*args)
+    return wrapper
+
+
+def db_contacts():
+    return {user_id: {'name': name, 'contact': contact} for user_id, name, contact in bot.db.execute(
+        "SELECT user_id, name, contact FROM users"
+    )}
+
+
+def divergent_entries():
+    """Записи кешу, що не збігаються з БД (відсутній у users гість має бути в кеші як None)."""
+    stored = db_contacts()
+    with bot.contact_cache._lock:
+        cached = {user_id: contact for user_id, (contact, _) in bot.contact_cache._entries.items()}
+    return {user_id: (contact, stored.get(user_id)) for user_id, contact in cached.items() if contact != stored.get(user_id)}
+
+
+async def guest(rng, round_number):
+    user_id = rng.randrange(1, USER_POOL + 1)
+    contact = await bot.storage.get_user_contact(user_id)
+    if contact is not None:
+        assert set(contact) == {'name', 'contact'}
+    if rng.random() < 0.3:
+        await bot.storage.save_user_contact(user_id, f"Гість {user_id}.{round_number}", f"+380{rng.randrange(10 ** 9):09d}")
+        await bot.storage.get_user_contact(user_id)
+
+
+async def local_phase(rounds, guests, rng):
+    for round_number in range(rounds):
+        await asyncio.gather(*(guest(random.Random(rng.random()), round_number) for _ in range(guests)))
+        divergent = divergent_entries()
+        assert not divergent, f"раунд {round_number}: кеш розійшовся з БД: {divergent}"
+
+
+async def shared_phase(db_path, rng):
+    shared = bot.SharedSQLiteStorage()
+    await shared.refresh()
+    for user_id in range(1, USER_POOL + 1):
+        await bot.storage.get_user_contact(user_id)
+    other = bot.Database(db_path)
+    changed = rng.sample(range(1, USER_POOL + 1), USER_POOL // 3)
+    with other.transaction() as conn:
+        conn.executemany(
+            "REPLACE INTO users (user_id, name, contact, updated_at) VALUES (?, ?, ?, ?)",
+            [(user_id, f"Інший процес {user_id}", "+380000000000", time.time()) for user_id in changed]
+        )
+    other.close()
+    stale = len(divergent_entries())
+    await shared.refresh()
+    divergent = divergent_entries()
+    assert not divergent, f"після refresh кеш розійшовся з БД: {divergent}"
+    return stale, len(changed)
+
+
+async def timing():
+    user_id = 1
+    await bot.storage.get_user_contact(user_id)
+    started = time.perf_counter()
+    for _ in range(1000):
+        await bot.storage.get_user_contact(user_id)
+    cached_us = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    for _ in range(1000):
+        await bot.run_db_read(bot.get_user_contact, user_id)
+    uncached_us = (time.perf_counter() - started) * 1000
+    return cached_us, uncached_us
+
+
+async def main(db_path, rounds, guests):
+    rng = random.Random(25)
+    await local_phase(rounds, guests, rng)
+    hits, misses = bot.contact_cache.hits, bot.contact_cache.misses
+    stale, changed = await shared_phase(db_path, rng)
+    bot.get_user_contact = bot.get_user_contact.__wrapped__
+    cached_us, uncached_us = await timing()
+    await bot.db_writer.stop()
+
+    print(f"раундів: {rounds}, гостей у раунді: {guests}, різних гостей: {USER_POOL}")
+    print(f"влучань: {hits:,}, промахів: {misses:,} ({hits / (hits + misses):.1%} з кешу)")
+    print(f"інший процес змінив {changed} контактів: до refresh розходилось {stale}, після - 0")
+    print(f"get_user_contact: з кешу {cached_us:.1f} мкс, з БД {uncached_us:.1f} мкс")
+    print("кеш жодного разу не розійшовся з БД")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    bot.logging.getLogger().setLevel(bot.logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stress.db')
+        bot.db = bot.Database(path)
+        bot.init_db()
+        bot.load_contact_cache()
+        bot.get_user_contact = with_read_delay(bot.get_user_contact, random.Random(1))
+        asyncio.run(main(path, args[0] if args else DEFAULT_ROUNDS, args[1] if len(args) > 1 else DEFAULT_GUESTS))
+        bot.db.close()
@@ -0,0 +1,194 @@
+"""Стрес-тест кількох процесів бота зі спільною БД (STORAGE_BACKEND=shared-sqlite).
+
+Кожен процес має власний WORKER_ID і працює з тим самим файлом SQLite.
+Процеси одночасно стартують на порожньому файлі (міграції), перший
+додає підтверджені бронювання для нагадувань, далі всі симулюють
+гостей, які ставлять утримання і оформлюють бронювання на кілька
+популярних слотів, а потім усі разом намагаються позначити ті самі
+нагадування. Перевіряється:
+
+- жодні два активні бронювання одного місця не перетинаються в часі;
+- кожне нагадування позначив рівно один процес;
+- у журналі немає помилок блокування БД;
+- після storage.refresh() індекс зайнятості кожного процесу збігається з БД.
+
+Запуск: python benchmarks/stress_multiprocess.py [процесів] [гостей на процес]
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WORKERS = 4
+DEFAULT_GUESTS = 200
+REMINDERS = 500
+SLOTS = [((date.today() + timedelta(days=1)).isoformat(), t) for t in ("17:00", "18:30", "19:00", "19:30", "21:00", "22:30")]
+INSERT_SQL = (
+    "INSERT INTO bookings (user_id, name, nickname, date, time, guests, cabin, contact, status, chat_id, created_at) "
+    "VALUES (?, 'Гість', '', ?, ?, 2, ?, '+380000000000', 'Підтверджено', ?, 0)"
+)
+
+
+def import_bot(db_path, worker_id):
+    """Імпортує bot з налаштуваннями спільного сховища для цього процесу."""
+    os.environ.update(STORAGE_BACKEND="shared-sqlite", DB_PATH=db_path, WORKER_ID=worker_id)
+    sys.path.insert(0, ROOT)
+    import bot
+    bot.logging.getLogger().setLevel(bot.logging.WARNING)
+    return bot
+
+
+class ErrorCounter:
+    """Рахує записи журналу рівня ERROR і вище."""
+
+    def __init__(self, bot):
+        self.count = 0
+        handler = bot.logging.Handler(bot.logging.ERROR)
+        handler.emit = self._emit
+        bot.logging.getLogger().addHandler(handler)
+
+    def _emit(self, record):
+        self.count += 1
+
+
+async def guest(bot, user_id, rng, outcome):
+    booking_date, booking_time = rng.choice(SLOTS)
+    for _ in range(3):
+        bot.user_booking_data[user_id] = {'date': booking_date, 'time': booking_time}
+        free = bot.get_available_cabins(user_id)
+        if not free:
+            outcome['no_cabins'] += 1
+            return
+        cabin = rng.choice(free)
+        if not await bot.storage.place_hold(booking_date, booking_time, cabin, user_id):
+            outcome['hold_lost'] += 1
+            continue
+        await asyncio.sleep(rng.random() * 0.01)
+        try:
+            await bot.storage.add_booking({
+                'user_id': user_id, 'name': f"Гість {user_id}", 'nickname': '',
+                'date': booking_date, 'time': booking_time, 'guests': 2, 'cabin': cabin,
+                'contact': '+380000000000', 'status': 'Очікує підтвердження', 'chat_id': user_id,
+            })
+            outcome['booked'] += 1
+        except bot.SlotUnavailableError:
+            outcome['conflict'] += 1
+        return
+
+
+def index_mismatches(bot):
+    reference = bot.OccupancyIndex()
+    today = date.today().isoformat()
+    reference.load(bot.get_bookings_from_db(filters={'status': bot.ACTIVE_STATUSES, 'date_from': today}), today)
+    return sum(reference.busy_mask(*slot) != bot.occupancy.busy_mask(*slot) for slot in SLOTS)
+
+
+def add_reminder_bookings(bot):
+    """Підтверджені бронювання через тиждень і далі, про які ще не нагадували (user_id < 0)."""
+    today = date.today()
+    cabins = bot.venue.cabin_names
+    with bot.db.transaction() as conn:
+        conn.executemany(INSERT_SQL, (
+            (-i - 1, (today + timedelta(days=7 + i // len(cabins))).isoformat(), bot.venue.time_slots[0], cabins[i % len(cabins)], -i - 1)
+            for i in range(REMINDERS)
+        ))
+
+
+async def run_worker(bot, number, guests, barrier):
+    rng = random.Random(number)
+    outcome = {'booked': 0, 'conflict': 0, 'hold_lost': 0, 'no_cabins': 0}
+    first_user = number * guests + 1
+    await asyncio.gather(*(
+        guest(bot, user_id, random.Random(rng.random()), outcome) for user_id in range(first_user, first_user + guests)
+    ))
+
+    # Усі процеси водночас беруть ті самі нагадування, кожен у своєму порядку
+    ids = [row[0] for row in bot.db.execute("SELECT id FROM bookings WHERE user_id < 0")]
+    rng.shuffle(ids)
+    claimed = []
+    for i in range(0, len(ids), 50):
+        claimed += await bot.db_writer.submit(bot.claim_booking_reminders, ids[i:i + 50], time.time())
+
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+    stale = await bot.db_writer.submit(index_mismatches, bot)
+    started = time.perf_counter()
+    await bot.storage.refresh()
+    refresh_ms = (time.perf_counter() - started) * 1000
+    fresh = await bot.db_writer.submit(index_mismatches, bot)
+    await bot.db_writer.stop()
+    return {'outcome': outcome, 'reminders': ids, 'claimed': claimed, 'stale': stale, 'fresh': fresh, 'refresh_ms': refresh_ms}
+
+
+def worker(number, db_path, guests, barrier, results):
+    bot = import_bot(db_path, f"w{number}")
+    errors = ErrorCounter(bot)
+    barrier.wait()
+    started = time.perf_counter()
+    bot.storage.open()
+    if number == 0:
+        add_reminder_bookings(bot)
+    barrier.wait()
+    result = asyncio.run(run_worker(bot, number, guests, barrier))
+    result.update(number=number, elapsed=time.perf_counter() - started, errors=errors.count)
+    bot.db.close()
+    results.put(result)
+
+
+def verify(bot):
+    minutes = "(substr({0}.time, 1, 2) * 60 + substr({0}.time, 4, 2))"
+    overlaps = bot.db.execute(
+        f"SELECT a.id, b.id FROM bookings a JOIN bookings b "
+        f"ON a.date = b.date AND a.cabin = b.cabin AND a.id < b.id "
+        f"AND {minutes.format('a')} < {minutes.format('b')} + b.duration "
+        f"AND {minutes.format('b')} < {minutes.format('a')} + a.duration "
+        f"WHERE a.status IN ('Очікує підтвердження', 'Підтверджено') AND b.status IN ('Очікує підтвердження', 'Підтверджено')"
+    ).fetchall()
+    assert not overlaps, f"бронювання, що перетинаються в часі: {overlaps}"
+
+
+def main(workers, guests):
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'shared.db')
+        bot = import_bot(db_path, "main")
+        barrier = ctx.Barrier(workers)
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(target=worker, args=(number, db_path, guests, barrier, results))
+            for number in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        reports = sorted((results.get() for _ in processes), key=lambda r: r['number'])
+        for process in processes:
+            process.join()
+
+        verify(bot)
+        bot.db.close()
+
+    reminder_ids = reports[0]['reminders']
+    claims = [booking_id for r in reports for booking_id in r['claimed']]
+    assert len(claims) == len(set(claims)), "одне нагадування позначили кілька процесів"
+    assert set(claims) == set(reminder_ids), "частину нагадувань не позначив жоден процес"
+    assert not any(r['errors'] for r in reports), "у журналі є помилки БД"
+    assert not any(r['fresh'] for r in reports), "після refresh індекс зайнятості розійшовся з БД"
+
+    print(f"процесів: {workers}, гостей у кожному: {guests}")
+    print(f"{'процес':<8}{'за, с':>7}{'заброньовано':>14}{'конфліктів':>12}{'нагадувань':>12}{'розбіжностей до/після refresh':>32}{'refresh, мс':>13}")
+    for r in reports:
+        print(
+            f"w{r['number']:<7}{r['elapsed']:>7.2f}{r['outcome']['booked']:>14}{r['outcome']['conflict']:>12}"
+            f"{len(r['claimed']):>12}{r['stale']:>25}/{r['fresh']}{r['refresh_ms']:>13.1f}"
+        )
+    print(f"кожне з {len(reminder_ids)} нагадувань позначено рівно одним процесом")
+    print("бронювань, що перетинаються, немає, помилок блокування немає, індекси після refresh збігаються з БД")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else DEFAULT_WORKERS, args[1] if len(args) > 1 else DEFAULT_GUESTS)
@@ -0,0 +1,113 @@
+"""Стрес-тест узгодженості індексу зайнятості з БД.
+
+Випадкові операції йдуть одночасно через storage, як з обробників:
+нові бронювання різної тривалості (частина відхиляється як зайняте
+місце), зміни статусу з перевіркою поточного статусу і без неї, зокрема
+повернення скасованих бронювань в активні (і на вже зайняте
+місце - такий запис відкочується). Після кожного раунду живий
+OccupancyIndex порівнюється з індексом, перебудованим з активних
+бронювань у БД від сьогодні, - інтервал за інтервалом і масками
+зайнятості для кожного слоту. Частина бронювань припадає на вчорашній
+день, якого в індексі бути не повинно; наприкінці імітується перехід
+на наступну добу.
+
+Запуск: python benchmarks/stress_occupancy_index.py [операцій] [операцій у раунді]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+DEFAULT_OPERATIONS = 3000
+DEFAULT_ROUND = 100
+DAYS = 3
+DURATIONS = (60, 90, 120, 180)
+STATUSES = bot.ACTIVE_STATUSES + ['Відхилено', 'Скасовано (адміном)', bot.EXPIRED_BOOKING_STATUS]
+
+
+def snapshot(index):
+    with index._lock:
+        return {
+            (booking_date, cabin): list(intervals)
+            for booking_date, cabins in index._by_date.items() for cabin, intervals in cabins.items()
+        }
+
+
+def verify(days, first_date):
+    reference = bot.OccupancyIndex()
+    reference.load(bot.get_bookings_from_db(filters={'status': bot.ACTIVE_STATUSES, 'date_from': first_date}), first_date)
+    live, rebuilt = snapshot(bot.occupancy), snapshot(reference)
+    assert live == rebuilt, f"індекс розійшовся з БД: {set(live.items()) ^ set(rebuilt.items())}"
+    for booking_date in days:
+        for booking_time in bot.venue.time_slots:
+            for duration in DURATIONS:
+                assert bot.occupancy.busy_mask(booking_date, booking_time, duration) == \
+                    reference.busy_mask(booking_date, booking_time, duration), (booking_date, booking_time, duration)
+    return sum(len(intervals) for intervals in live.values())
+
+
+async def add(rng, days, booking_ids, outcome):
+    try:
+        booking_ids.append(await bot.storage.add_booking({
+            'user_id': rng.randrange(1, 10_000), 'name': "Гість", 'nickname': '',
+            'date': rng.choice(days), 'time': rng.choice(bot.venue.time_slots), 'guests': 2,
+            'cabin': rng.choice(bot.venue.cabin_names), 'contact': '+380000000000',
+            'status': rng.choice(bot.ACTIVE_STATUSES), 'chat_id': 1, 'duration': rng.choice(DURATIONS),
+        }))
+        outcome['added'] += 1
+    except bot.SlotUnavailableError:
+        outcome['slot_taken'] += 1
+
+
+async def change_status(rng, booking_ids, outcome):
+    expected = [rng.choice(STATUSES)] if rng.random() < 0.5 else None
+    if await bot.storage.update_booking_status(rng.choice(booking_ids), rng.choice(STATUSES), expected_statuses=expected):
+        outcome['status_changed'] += 1
+    else:
+        outcome['status_kept'] += 1
+
+
+async def main(operations, per_round):
+    rng = random.Random(4)
+    days = [(date.today() + timedelta(days=i)).isoformat() for i in range(-1, DAYS)]
+    booking_ids = []
+    outcome = {'added': 0, 'slot_taken': 0, 'status_changed': 0, 'status_kept': 0}
+    started = time.perf_counter()
+    checks = 0
+    for done in range(0, operations, per_round):
+        await asyncio.gather(*(
+            add(random.Random(rng.random()), days, booking_ids, outcome) if not booking_ids or rng.random() < 0.5
+            else change_status(random.Random(rng.random()), booking_ids, outcome)
+            for _ in range(min(per_round, operations - done))
+        ))
+        intervals = verify(days, days[1])
+        checks += 1
+    elapsed = time.perf_counter() - started
+    # Перехід на наступну добу: сьогоднішній день випадає з індексу
+    bot.occupancy.drop_before(days[2])
+    verify(days, days[2])
+    await bot.db_writer.stop()
+
+    print(f"операцій: {operations} за {elapsed:.2f} с, перевірок індексу: {checks}")
+    print(f"результати: {outcome}")
+    print(f"активних інтервалів наприкінці: {intervals}; індекс після кожного раунду збігався з БД")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    # Повернення в активні бронювання, чиє місце вже зайняли, відкочується з помилкою
+    # унікального індексу в журналі - це очікуваний шлях, і він теж перевіряється
+    bot.logging.getLogger().setLevel(bot.logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.db = bot.Database(os.path.join(tmp, 'stress.db'))
+        bot.init_db()
+        bot.load_occupancy()
+        asyncio.run(main(args[0] if args else DEFAULT_OPERATIONS, args[1] if len(args) > 1 else DEFAULT_ROUND))
+        bot.db.close()
@@ -0,0 +1,102 @@
+"""Стрес-тест утримань і бронювання місць при сотнях одночасних розмов.
+
+Кожен симульований гість обирає випадкове місце на один з кількох
+популярних слотів, ставить утримання і, якщо вдалося, оформлює
+бронювання. Слоти перетинаються (бронювання триває кілька слотів).
+Наприкінці перевіряється, що жодні два бронювання одного місця не
+перетинаються в часі, а індекс зайнятості збігається з БД.
+
+Запуск: python benchmarks/stress_reservations.py [кількість гостей]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+DEFAULT_GUESTS = 500
+SLOTS = [((date.today() + timedelta(days=1)).isoformat(), t) for t in ("17:00", "18:30", "19:00", "19:30", "21:00", "22:30")]
+
+
+async def guest(user_id, rng, latencies, outcome):
+    booking_date, booking_time = rng.choice(SLOTS)
+    for _ in range(3):
+        bot.user_booking_data[user_id] = {'date': booking_date, 'time': booking_time}
+        free = bot.get_available_cabins(user_id)
+        if not free:
+            outcome['no_cabins'] += 1
+            return
+        cabin = rng.choice(free)
+        started = time.perf_counter()
+        held = await bot.storage.place_hold(booking_date, booking_time, cabin, user_id)
+        latencies.append(time.perf_counter() - started)
+        if not held:
+            outcome['hold_lost'] += 1
+            continue
+        # Гість заповнює ім'я, нік і телефон
+        await asyncio.sleep(rng.random() * 0.01)
+        started = time.perf_counter()
+        try:
+            await bot.storage.add_booking({
+                'user_id': user_id, 'name': f"Гість {user_id}", 'nickname': '',
+                'date': booking_date, 'time': booking_time, 'guests': 2, 'cabin': cabin,
+                'contact': '+380000000000', 'status': 'Очікує підтвердження', 'chat_id': user_id,
+            })
+            outcome['booked'] += 1
+        except bot.SlotUnavailableError:
+            outcome['conflict'] += 1
+        finally:
+            latencies.append(time.perf_counter() - started)
+        return
+
+
+def verify():
+    minutes = "(substr({0}.time, 1, 2) * 60 + substr({0}.time, 4, 2))"
+    overlaps = bot.db.execute(
+        f"SELECT a.id, b.id FROM bookings a JOIN bookings b "
+        f"ON a.date = b.date AND a.cabin = b.cabin AND a.id < b.id "
+        f"AND {minutes.format('a')} < {minutes.format('b')} + b.duration "
+        f"AND {minutes.format('b')} < {minutes.format('a')} + a.duration "
+        f"WHERE a.status IN ('Очікує підтвердження', 'Підтверджено') AND b.status IN ('Очікує підтвердження', 'Підтверджено')"
+    ).fetchall()
+    assert not overlaps, f"бронювання, що перетинаються в часі: {overlaps}"
+    reference = bot.OccupancyIndex()
+    today = date.today().isoformat()
+    reference.load(bot.get_bookings_from_db(filters={'status': bot.ACTIVE_STATUSES, 'date_from': today}), today)
+    for slot in SLOTS:
+        assert reference.busy_mask(*slot) == bot.occupancy.busy_mask(*slot), f"індекс розійшовся з БД для {slot}"
+
+
+async def main(n):
+    rng = random.Random(7)
+    latencies = []
+    outcome = {'booked': 0, 'conflict': 0, 'hold_lost': 0, 'no_cabins': 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(guest(user_id, random.Random(rng.random()), latencies, outcome) for user_id in range(1, n + 1)))
+    elapsed = time.perf_counter() - started
+    await bot.db_writer.stop()
+    verify()
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000  # noqa: E731
+    print(f"гостей: {n}, за {elapsed:.2f} с")
+    print(f"результати: {outcome}")
+    print(f"затримка запису: p50 {p(0.5):.2f} мс, p95 {p(0.95):.2f} мс, p99 {p(0.99):.2f} мс")
+    print("бронювань, що перетинаються, немає, індекс зайнятості збігається з БД")
+
+
+if __name__ == '__main__':
+    guests = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_GUESTS
+    bot.logging.getLogger().setLevel(bot.logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.db = bot.Database(os.path.join(tmp, 'stress.db'))
+        bot.init_db()
+        bot.load_occupancy()
+        asyncio.run(main(guests))
+        bot.db.close()
@@ -0,0 +1,100 @@
+"""Стрес-тест паралельної обробки оновлень з порядком для кожного користувача.
+
+Сотні користувачів одночасно надсилають послідовності оновлень, а адмін -
+натискання кнопок. Обробник випадково «гальмує» (як повільна БД чи запит
+до Telegram). Перевіряється, що оновлення кожного користувача обробилися
+по черзі й без накладання, що одночасно оброблялося не більше
+UPDATE_WORKERS оновлень гостей, що адмін не чекав у загальній черзі за
+гостями і що оновлення без чату й користувача не чекали одне на одне.
+
+Запуск: python benchmarks/stress_update_ordering.py [користувачів] [оновлень на користувача]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Chat, Message, Update, User  # noqa: E402
+
+import bot  # noqa: E402
+
+DEFAULT_USERS = 200
+DEFAULT_UPDATES_PER_USER = 10
+KEYLESS_UPDATES = 50
+
+
+def make_update(update_id, user_id, text):
+    user = User(user_id, f"user{user_id}", False)
+    chat = Chat(user_id, Chat.PRIVATE)
+    return Update(update_id, message=Message(update_id, None, chat, from_user=user, text=text))
+
+
+async def main(users, per_user):
+    processor = bot.PerUserUpdateProcessor(bot.UPDATE_WORKERS)
+    rng = random.Random(3)
+    processed = {}
+    running = set()
+    overlaps = []
+    finished_at = {}
+    peak = {'guests': 0, 'keyless': 0}
+    keyless_running = 0
+
+    async def handle(update):
+        user_id = update.effective_user.id
+        if user_id in running:
+            overlaps.append(user_id)
+        running.add(user_id)
+        peak['guests'] = max(peak['guests'], len(running - {bot.ADMIN_USER_ID}))
+        await asyncio.sleep(rng.random() * 0.005)
+        processed.setdefault(user_id, []).append(int(update.message.text))
+        finished_at[user_id] = time.perf_counter()
+        running.discard(user_id)
+
+    async def handle_keyless():
+        nonlocal keyless_running
+        keyless_running += 1
+        peak['keyless'] = max(peak['keyless'], keyless_running)
+        await asyncio.sleep(0.005)
+        keyless_running -= 1
+
+    # Оновлення перемішані між користувачами, але в межах користувача йдуть по порядку
+    stream = []
+    for seq in range(per_user):
+        for user_id in range(1, users + 1):
+            stream.append((user_id, seq))
+        stream.append((bot.ADMIN_USER_ID, seq))
+
+    started = time.perf_counter()
+    tasks = []
+    for update_id, (user_id, seq) in enumerate(stream):
+        update = make_update(update_id, user_id, str(seq))
+        tasks.append(asyncio.create_task(processor.process_update(update, handle(update))))
+    for update_id in range(len(stream), len(stream) + KEYLESS_UPDATES):
+        tasks.append(asyncio.create_task(processor.process_update(Update(update_id), handle_keyless())))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    assert not overlaps, f"оновлення одного користувача оброблялися одночасно: {overlaps[:5]}"
+    for user_id, seqs in processed.items():
+        assert seqs == list(range(per_user)), f"порушено порядок для {user_id}: {seqs}"
+    assert not processor._locks, "замки користувачів не звільнилися"
+    assert peak['guests'] <= bot.UPDATE_WORKERS, f"одночасно оброблялося {peak['guests']} оновлень гостей"
+    assert peak['keyless'] > 1, "оновлення без чату й користувача оброблялися по одному"
+
+    admin_done = (finished_at.pop(bot.ADMIN_USER_ID) - started) * 1000
+    guests_done = sorted((t - started) * 1000 for t in finished_at.values())
+    print(f"оновлень: {len(stream)} від {users} користувачів і адміна за {elapsed:.2f} с "
+          f"({len(stream) / elapsed:.0f} оновлень/с, обробників: {bot.UPDATE_WORKERS})")
+    print(f"адмін обробив усі свої оновлення за {admin_done:.0f} мс, "
+          f"гості - медіана {guests_done[len(guests_done) // 2]:.0f} мс, максимум {guests_done[-1]:.0f} мс")
+    print(f"одночасно: гостей до {peak['guests']}, оновлень без чату й користувача до {peak['keyless']}")
+    print("порядок оновлень кожного користувача збережено, накладань немає")
+
+
+if __name__ == '__main__':
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_USERS
+    per_user = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_UPDATES_PER_USER
+    asyncio.run(main(users, per_user))
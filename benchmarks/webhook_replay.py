@@ -0,0 +1,76 @@
+"""Надсилає записані оновлення Telegram на локальний webhook бота і міряє затримку.
+
+Бот має бути запущений з BOT_MODE=webhook. Оновлення беруться з JSON-файлу
+(один об'єкт Update або список) чи JSON Lines. Скрипт повторює їх
+--repeat разів, підставляючи новий update_id, і друкує p50/p95/p99 часу
+від відправки POST до відповіді сервера.
+
+Для порівняння з polling ту саму послідовність дій виконують вручну в
+обох режимах; у режимі polling до цієї затримки додається інтервал
+довгого опитування getUpdates.
+
+Приклад:
+    python benchmarks/webhook_replay.py updates.jsonl --url http://127.0.0.1:8443/telegram --secret "$WEBHOOK_SECRET_TOKEN"
+"""
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    if content.startswith("{") and "\n" not in content:
+        return [json.loads(content)]
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def post(url, secret, update):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": secret},
+        method="POST",
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - started
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("updates", help="файл із записаними оновленнями")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", required=True, help="значення WEBHOOK_SECRET_TOKEN")
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates)
+    latencies, statuses = [], {}
+    update_id = int(time.time())
+    for _ in range(args.repeat):
+        for update in updates:
+            update_id += 1
+            status, latency = post(args.url, args.secret, {**update, "update_id": update_id})
+            statuses[status] = statuses.get(status, 0) + 1
+            latencies.append(latency)
+
+    latencies.sort()
+    print(f"запитів: {len(latencies)}, статуси відповідей: {statuses}")
+    print(f"p50 {percentile(latencies, 0.5):.2f} мс, p95 {percentile(latencies, 0.95):.2f} мс, p99 {percentile(latencies, 0.99):.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
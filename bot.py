@@ -2,15 +2,35 @@
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler,
-    ConversationHandler, ContextTypes, filters, CallbackQueryHandler
+    ConversationHandler, ContextTypes, filters, CallbackQueryHandler,
+    BasePersistence, PersistenceInput, BaseUpdateProcessor, ApplicationHandlerStop
 )
+from telegram.request import HTTPXRequest
 from datetime import datetime, date, timedelta
 import os
 from dotenv import load_dotenv
 import sqlite3
 import logging
 import asyncio
-from telegram.error import BadRequest
+import threading
+import time
+import json
+import heapq
+import itertools
+from collections import OrderedDict
+import functools
+import bisect
+import zlib
+import contextvars
+import cProfile
+import pstats
+import marshal
+import string
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from abc import ABC, abstractmethod
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+import httpx
 
 # Налаштовуємо логування для діагностики
 logging.basicConfig(
@@ -30,99 +50,1417 @@ TOKEN = "8351072049:AAHuWeKXsg2kIzQ0CGVzctq1xjIfLT9JHRU"
 # Дані адміністратора
 ADMIN_USER_ID = 6073809255
 ADMIN_CHAT_ID = "@gipnoze_lounge_chat" # Цей ID тепер використовується лише як довідковий
-ADMIN_PHONE = "+380956232134"
-INSTAGRAM_MENU_URL = "https://www.instagram.com/p/DHf0e6RssrX/?igsh=MXd4ZDJtdWc5cnRtNA=="  # Посилання на пост з меню
+
+# Адміністратори та їхні ролі: ADMINS="id:роль,id:роль". Власник (owner) має доступ до всього,
+# менеджер зміни (manager) - до бронювань. Без ADMINS єдиний адміністратор - ADMIN_USER_ID.
+ADMIN_ROLES = ("owner", "manager")
+
+def parse_admins(value):
+    """Розбирає рядок "id:роль,id:роль" у словник {id: роль}; роль за замовчуванням - manager."""
+    admins = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        user_id, _, role = item.partition(":")
+        role = role.strip() or "manager"
+        if role not in ADMIN_ROLES:
+            raise ValueError(f"Невідома роль адміністратора: {role}.")
+        admins[int(user_id)] = role
+    return admins
+
+ADMINS = parse_admins(os.getenv("ADMINS", "")) or {ADMIN_USER_ID: "owner"}
+# Скільки повідомлень адміністраторам редагується одночасно
+ADMIN_FANOUT_CONCURRENCY = int(os.getenv("ADMIN_FANOUT_CONCURRENCY", "8"))
+
+def is_admin(user_id, role=None):
+    """Чи є користувач адміністратором (з роллю role, якщо її задано)."""
+    user_role = ADMINS.get(user_id)
+    return user_role is not None and (role is None or user_role == role)
 
 # Перевірка наявності токена бота
 if not TOKEN:
     logging.critical("BOT_TOKEN не знайдено.")
     raise ValueError("BOT_TOKEN не знайдено.")
 
-# Назва файлу бази даних SQLite
+# Режим отримання оновлень: "polling" (за замовчуванням) або "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # публічна адреса, на яку Telegram надсилатиме оновлення
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+
+if BOT_MODE not in ("polling", "webhook"):
+    logging.critical(f"Невідомий BOT_MODE: {BOT_MODE}.")
+    raise ValueError(f"Невідомий BOT_MODE: {BOT_MODE}.")
+if BOT_MODE == "webhook" and not (WEBHOOK_URL and WEBHOOK_SECRET_TOKEN):
+    logging.critical("Для режиму webhook потрібні WEBHOOK_URL і WEBHOOK_SECRET_TOKEN.")
+    raise ValueError("Для режиму webhook потрібні WEBHOOK_URL і WEBHOOK_SECRET_TOKEN.")
+
+# Скільки оновлень обробляється одночасно (у різних користувачів) і скільки - від адміна
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "32"))
+ADMIN_UPDATE_WORKERS = int(os.getenv("ADMIN_UPDATE_WORKERS", "4"))
+# Скільки оновлень може бути прийнято одночасно, разом з тими, що чекають у черзі свого користувача
+UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", "4096"))
+
+# Метрики у форматі Prometheus на локальному HTTP-порту; вимкнені, поки METRICS_ENABLED не 1
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9105"))
+
+# Бот обробляє лише повідомлення і натискання інлайн-кнопок
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Назва файлу бази даних SQLite; DB_PATH дозволяє винести його, наприклад, на швидший диск
 DB_NAME = 'bookings.db'
+DB_PATH = os.getenv("DB_PATH", DB_NAME)
 
-# Генерація часових слотів з 17:00 до 22:30 включно, з кроком 30 хвилин
-time_slots = []
-for h in range(17, 23): # Години від 17 до 22
-    for m in (0, 30): # Хвилини 0 або 30
-        time_slots.append(f"{h:02d}:{m:02d}")
-
-CABINS = [
-    "Кабінка 1 (5-10 чол.)",
-    "Кабінка 2 (до 8 чол.)",
-    "Кабінка 3 (до 6 чол.)",
-    "VIP Xbox X (до 12 чол.)",
-    "VIP PS5 (до 12 чол.)",
-    "Диванчики на барі (до 6 чол.)",
-    "Барна стійка (6 місць)",
-    "Літня тераса - стіл 1",
-    "Літня тераса - стіл 2",
-    "Літня тераса - стіл 3",
-    "Літня тераса - стіл 4",
-    "Додаткове місце на 3 чол."
-]
+# Сховище даних: "sqlite" (за замовчуванням, один процес бота) або "shared-sqlite"
+# (кілька процесів, наприклад webhook-воркерів, з одним файлом БД; див. SharedSQLiteStorage)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+# Ідентифікатор процесу серед воркерів зі спільним сховищем; має бути сталим між перезапусками
+WORKER_ID = os.getenv("WORKER_ID", "")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))  # скільки чекати на блокування іншого з'єднання
+DB_LOCK_RETRIES = 5  # скільки разів повторити початок транзакції, якщо блокування не дочекались
+STORAGE_REFRESH_INTERVAL_SECONDS = 2  # як часто перевіряються зміни від інших процесів
 
-# Тимчасове зберігання даних бронювання для кожного користувача
-user_booking_data = {}
+# --- Callback-дані кнопок ---
 
-# --- Функції для роботи з базою даних ---
+CALLBACK_VERSION = "1"  # змінюється, коли формат аргументів стає несумісним; кнопки іншої версії відхиляються
+CALLBACK_DATA_LIMIT = 64  # байтів у callback_data інлайн-кнопки
+_BASE36_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
 
-def init_db():
-    """Ініціалізує базу даних, створюючи таблиці, якщо вони не існують."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        # Таблиця для бронювань
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bookings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                nickname TEXT,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                guests INTEGER NOT NULL,
-                cabin TEXT NOT NULL,
-                contact TEXT NOT NULL,
-                status TEXT NOT NULL,
-                chat_id INTEGER NOT NULL
+def _b36(n):
+    """Невід'ємне ціле -> рядок у системі числення з основою 36 (зворотне - int(s, 36))."""
+    digits = []
+    while True:
+        n, r = divmod(n, 36)
+        digits.append(_BASE36_DIGITS[r])
+        if not n:
+            return "".join(reversed(digits))
+
+@functools.lru_cache(maxsize=256)
+def cabin_key(name):
+    """Короткий ключ місця для кнопок: не залежить від порядку місць, тож переживає перезавантаження venue."""
+    return _b36(zlib.crc32(name.encode()) % 36 ** 4)
+
+
+class CallbackField:
+    """Один аргумент callback-даних: значення <-> короткий рядок без ':'."""
+    __slots__ = ('encode', 'decode')
+
+    def __init__(self, encode, decode):
+        self.encode = encode
+        self.decode = decode
+
+
+def _decode_minutes(text):
+    minutes = int(text, 36)
+    if not 0 <= minutes < 24 * 60:
+        raise ValueError(text)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def _encode_cabin_set(cabins):
+    mask = sum(1 << venue.cabin_index[cabin] for cabin in cabins)
+    return f"{_b36(mask)}.{venue.layout_tag}"
+
+def _decode_cabin_set(text):
+    # Маска - за позиціями місць, тож після зміни їх переліку кнопка застаріває
+    mask, tag = text.split(".")
+    if tag != venue.layout_tag:
+        raise ValueError(text)
+    mask = int(mask, 36)
+    return [name for i, name in enumerate(venue.cabin_names) if mask & (1 << i)]
+
+def _encode_date_filter(token):
+    if token in ("all", "week"):
+        return token[0]
+    return "d" + _b36(date.fromisoformat(token).toordinal())
+
+def _decode_date_filter(text):
+    if text == "a":
+        return "all"
+    if text == "w":
+        return "week"
+    if text[:1] != "d":
+        raise ValueError(text)
+    return date.fromordinal(int(text[1:], 36)).isoformat()
+
+def choice_field(*values):
+    """Одне з кількох значень, закодоване його позицією."""
+    return CallbackField(lambda value: str(values.index(value)), lambda text: values[int(text)])
+
+def optional_field(field):
+    """Поле, що може бути None (кодується порожнім рядком)."""
+    return CallbackField(
+        lambda value: "" if value is None else field.encode(value),
+        lambda text: None if text == "" else field.decode(text)
+    )
+
+INT_FIELD = CallbackField(_b36, lambda text: int(text, 36))
+DATE_FIELD = CallbackField(  # "рррр-мм-дд" як порядковий номер дня
+    lambda value: _b36(date.fromisoformat(value).toordinal()),
+    lambda text: date.fromordinal(int(text, 36)).isoformat()
+)
+TIME_FIELD = CallbackField(lambda value: _b36(slot_minutes(value)), _decode_minutes)  # "гг:хх" як хвилини від півночі
+CABIN_FIELD = CallbackField(cabin_key, lambda text: venue.cabin_by_key[text])
+CABIN_SET_FIELD = CallbackField(_encode_cabin_set, _decode_cabin_set)
+DATE_FILTER_FIELD = CallbackField(_encode_date_filter, _decode_date_filter)  # all, week або дата
+
+
+_CALLBACK_OPS = {}  # код -> CallbackOp
+
+
+class CallbackOp:
+    """Операція кнопки: однолітерний код і поля аргументів."""
+    __slots__ = ('code', 'fields', 'prefix')
+
+    def __init__(self, code, *fields):
+        if len(code) != 1 or code in _CALLBACK_OPS:
+            raise ValueError(f"Невірний або зайнятий код операції: {code}")
+        self.code = code
+        self.fields = fields
+        self.prefix = CALLBACK_VERSION + code
+        _CALLBACK_OPS[code] = self
+
+    def encode(self, *values):
+        if len(values) != len(self.fields):
+            raise ValueError(values)
+        data = ":".join([self.prefix, *(field.encode(value) for field, value in zip(self.fields, values))])
+        if len(data.encode()) > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"callback_data довше за {CALLBACK_DATA_LIMIT} байтів: {data}")
+        return data
+
+    def decode(self, args):
+        if len(args) != len(self.fields):
+            raise ValueError(args)
+        return tuple(field.decode(text) for field, text in zip(self.fields, args))
+
+
+CB_SAVED_CONTACTS = CallbackOp("k", choice_field("use", "new"))
+CB_DATE = CallbackOp("d", DATE_FIELD)
+CB_TIME = CallbackOp("t", TIME_FIELD)
+CB_CABIN = CallbackOp("c", CABIN_FIELD)
+CB_SAVE_CONTACT = CallbackOp("s", choice_field(False, True))
+CB_RATING = CallbackOp("r", choice_field(1, 2, 3, 4, 5))
+CB_ADMIN_DECISION = CallbackOp("a", choice_field("confirm", "reject"), INT_FIELD)  # дія, id бронювання
+CB_FORCE_CANCEL = CallbackOp("x", INT_FIELD, INT_FIELD, DATE_FILTER_FIELD)  # id, якір сторінки списку, фільтр
+CB_ADMIN_LIST = CallbackOp("l", choice_field("next", "prev"), INT_FIELD, DATE_FILTER_FIELD)  # напрям, якір, фільтр
+CB_BULK = CallbackOp(  # дія, дата, час, місця, межа початку для expire (unix-час)
+    "b", choice_field("confirm", "cancel", "expire"), optional_field(DATE_FIELD),
+    optional_field(TIME_FIELD), optional_field(CABIN_SET_FIELD), optional_field(INT_FIELD)
+)
+CB_BULK_CANCEL = CallbackOp("n")
+
+
+def _decode_legacy_callback(data):
+    """Кнопки дати і рішення адміна у форматі до версійних callback-даних.
+
+    Сповіщення про бронювання, надіслані до оновлення, лишаються в чатах
+    адміністраторів, і підтвердити чи відхилити бронювання можна лише з них.
+    Календар, надісланий гостю до оновлення, несе дату "дд.мм.рррр"
+    ("date_<дата>"); вона переводиться в "рррр-мм-дд", як у нових кнопках.
+    """
+    if data.startswith("date_"):
+        try:
+            return CB_DATE, (parse_date_token(data[len("date_"):]),)
+        except ValueError:
+            return None
+    for action in ("confirm", "reject"):
+        prefix = f"admin_{action}_"
+        if data.startswith(prefix) and data[len(prefix):].isdigit():
+            return CB_ADMIN_DECISION, (action, int(data[len(prefix):]))
+    return None
+
+@functools.lru_cache(maxsize=4096)
+def decode_callback_data(data, current_venue):
+    """callback_data -> (операція, аргументи) або None, якщо кнопка чужої версії чи вже не декодується.
+
+    Ті самі кнопки натискають багато разів, тож результат кешується.
+    Місця декодуються за налаштуваннями, тому вони - частина ключа:
+    після перезавантаження venue кеш не віддасть застарілих значень.
+    """
+    header, *args = data.split(":")
+    if len(header) != 2 or header[0] != CALLBACK_VERSION:
+        return _decode_legacy_callback(data)
+    op = _CALLBACK_OPS.get(header[1])
+    if op is None:
+        return None
+    try:
+        return op, op.decode(args)
+    except (ValueError, KeyError, IndexError):
+        return None
+
+
+class CallbackRouter:
+    """Диспетчеризація натискань кнопок за кодом операції.
+
+    callback_data декодується один раз (і кешується), а обробник
+    шукається у словнику за кодом операції, тож перевірка кожного
+    CallbackQueryHandler - O(1), без регулярних виразів. Аргументи
+    передаються обробнику в context.args. Кнопки старих версій бота
+    (крім календаря і рішень адміна в уже надісланих повідомленнях),
+    невідомі коди та аргументи, що вже не декодуються (наприклад, місце
+    прибрали з налаштувань), не приймає жоден обробник - їх отримує
+    reject_stale, зареєстрований останнім.
+    """
+
+    def __init__(self):
+        self._routes = {}  # код -> (операція, обробник)
+
+    def route(self, op):
+        """Декоратор: обробник натискань кнопок операції op."""
+        def decorator(handler):
+            if op.code in self._routes:
+                raise ValueError(f"Для коду {op.code} вже є обробник.")
+            self._routes[op.code] = (op, handler)
+            return handler
+        return decorator
+
+    def handler(self, *ops):
+        """CallbackQueryHandler для кнопок лише цих операцій (для станів розмови чи глобальних обробників)."""
+        accepted = frozenset(ops)
+
+        def matches(data):
+            decoded = decode_callback_data(data, venue) if isinstance(data, str) else None
+            return decoded is not None and decoded[0] in accepted
+
+        return CallbackQueryHandler(self.dispatch, pattern=matches)
+
+    async def dispatch(self, update, context):
+        decoded = decode_callback_data(update.callback_query.data, venue)
+        if decoded is None:
+            # Налаштування перезавантажили між перевіркою і викликом
+            return await self.reject_stale(update, context)
+        op, args = decoded
+        context.args = list(args)
+        return await self._routes[op.code][1](update, context)
+
+    @staticmethod
+    async def reject_stale(update, context):
+        """Відповідь на кнопку, яку вже неможливо виконати; стан розмови не змінюється."""
+        await update.callback_query.answer("Ця кнопка застаріла. Скористайтеся новішим повідомленням або почніть з /start.", show_alert=True)
+
+
+callbacks = CallbackRouter()
+
+# --- Налаштування закладу ---
+
+# Файл з налаштуваннями закладу (JSON); ключі, яких у ньому немає, беруться з DEFAULT_VENUE_CONFIG
+VENUE_CONFIG_PATH = os.getenv("VENUE_CONFIG", "venue.json")
+VENUE_RELOAD_INTERVAL_SECONDS = 10  # як часто перевіряється, чи змінився файл
+BOOKING_DURATION_MINUTES = 120  # типова тривалість бронювання; її отримали бронювання, створені до міграції 11
+
+DEFAULT_VENUE_CONFIG = {
+    "admin_phone": "+380956232134",
+    "instagram_url": "https://www.instagram.com/gipnoze_lounge?utm_source=ig_web_button_share_sheet&igsh=ZDNlZDc0MzIxNw==",
+    "instagram_menu_url": "https://www.instagram.com/p/DHf0e6RssrX/?igsh=MXd4ZDJtdWc5cnRtNA==",
+    "booking_days": 8,
+    "first_slot": "17:00",
+    "last_slot": "22:30",
+    "slot_minutes": 30,
+    "booking_duration_minutes": BOOKING_DURATION_MINUTES,
+    "cabins": [
+        {"name": "Кабінка 1 (5-10 чол.)", "min_guests": 5, "max_guests": 10},
+        {"name": "Кабінка 2 (до 8 чол.)", "min_guests": 1, "max_guests": 8},
+        {"name": "Кабінка 3 (до 6 чол.)", "min_guests": 1, "max_guests": 6},
+        {"name": "VIP Xbox X (до 12 чол.)", "min_guests": 1, "max_guests": 12},
+        {"name": "VIP PS5 (до 12 чол.)", "min_guests": 1, "max_guests": 12},
+        {"name": "Диванчики на барі (до 6 чол.)", "min_guests": 1, "max_guests": 6},
+        {"name": "Барна стійка (6 місць)", "min_guests": 1, "max_guests": 6},
+        {"name": "Літня тераса - стіл 1", "min_guests": 1, "max_guests": 6},
+        {"name": "Літня тераса - стіл 2", "min_guests": 1, "max_guests": 6},
+        {"name": "Літня тераса - стіл 3", "min_guests": 1, "max_guests": 6},
+        {"name": "Літня тераса - стіл 4", "min_guests": 1, "max_guests": 6},
+        {"name": "Додаткове місце на 3 чол.", "min_guests": 1, "max_guests": 3},
+    ],
+}
+
+
+class VenueConfigError(ValueError):
+    """Налаштування закладу мають невірний формат або значення."""
+
+
+def slot_minutes(booking_time):
+    """"гг:хх" -> хвилини від півночі."""
+    return int(booking_time[:2]) * 60 + int(booking_time[3:5])
+
+
+class Cabin:
+    """Місце в закладі: назва (вона ж ключ у БД), місткість і чи його зараз бронюють."""
+    __slots__ = ('name', 'min_guests', 'max_guests', 'enabled')
+
+    def __init__(self, name, min_guests, max_guests, enabled=True):
+        self.name = name
+        self.min_guests = min_guests
+        self.max_guests = max_guests
+        self.enabled = enabled
+
+    def fits(self, guests):
+        return self.min_guests <= guests <= self.max_guests
+
+
+class Venue:
+    """Перевірені налаштування закладу, скомпільовані в таблиці для гарячого шляху.
+
+    Після створення не змінюється: перезавантаження будує новий об'єкт
+    і підміняє глобальний venue одним присвоєнням, тож обробник, що вже
+    взяв посилання на venue, до кінця бачить узгоджені таблиці.
+    Вимкнені місця (enabled: false) лишаються в cabins і cabin_index,
+    щоб наявні бронювання на них відображались, але не пропонуються.
+    """
+
+    def __init__(self, config):
+        self.admin_phone = self._text(config, "admin_phone")
+        self.instagram_url = self._text(config, "instagram_url")
+        self.instagram_menu_url = self._text(config, "instagram_menu_url")
+        self.booking_days = self._int(config, "booking_days", 1, 31)
+        self.slot_minutes = self._int(config, "slot_minutes", 5, 240)
+        self.booking_duration = self._int(config, "booking_duration_minutes", self.slot_minutes, 24 * 60)
+
+        first, last = self._time(config, "first_slot"), self._time(config, "last_slot")
+        if first > last:
+            raise VenueConfigError("first_slot пізніше за last_slot.")
+        # Бронювання з останнього слоту має закінчитись до першого слоту наступного дня:
+        # перевірки перетину порівнюють лише бронювання однієї дати
+        if last + self.booking_duration > first + 24 * 60:
+            raise VenueConfigError("Бронювання з last_slot заходить на перший слот наступного дня.")
+        self.time_slots = tuple(f"{m // 60:02d}:{m % 60:02d}" for m in range(first, last + 1, self.slot_minutes))
+        self.slot_index = {slot: i for i, slot in enumerate(self.time_slots)}
+
+        cabins = config.get("cabins")
+        if not isinstance(cabins, list) or not cabins:
+            raise VenueConfigError("cabins має бути непорожнім списком.")
+        self.cabins = tuple(self._cabin(i, item) for i, item in enumerate(cabins))
+        self.cabin_names = tuple(cabin.name for cabin in self.cabins)
+        self.cabin_index = {name: i for i, name in enumerate(self.cabin_names)}
+        if len(self.cabin_index) != len(self.cabin_names):
+            raise VenueConfigError("Назви місць у cabins повторюються.")
+        self.cabin_by_key = {cabin_key(name): name for name in self.cabin_names}
+        if len(self.cabin_by_key) != len(self.cabin_names):
+            raise VenueConfigError("Ключі кнопок двох місць збіглися; змініть назву одного з них.")
+        if len(self.cabins) > 64:
+            raise VenueConfigError("Забагато місць: кнопки масових дій вміщують щонайбільше 64.")
+        self.layout_tag = _b36(zlib.crc32("\n".join(self.cabin_names).encode()) % 36 ** 4)
+        enabled = [cabin for cabin in self.cabins if cabin.enabled]
+        if not enabled:
+            raise VenueConfigError("Немає жодного доступного місця.")
+        self.enabled_mask = sum(1 << self.cabin_index[cabin.name] for cabin in enabled)
+        self.max_party_size = max(cabin.max_guests for cabin in enabled)
+
+        # Розмір компанії -> доступні місця, що її вміщують, від найменшого запасу місць
+        self._by_fit = [()]
+        for guests in range(1, self.max_party_size + 1):
+            fitting = sorted(
+                (cabin for cabin in enabled if cabin.fits(guests)),
+                key=lambda cabin: (cabin.max_guests - guests, self.cabin_index[cabin.name])
+            )
+            self._by_fit.append(tuple((self.cabin_index[cabin.name], cabin.name) for cabin in fitting))
+        self._free = {}  # маска зайнятих -> доступні вільні місця
+        self._overlapping = {}  # (час, тривалість) -> слоти, утримання з яких перетинаються
+        self._time_ranges = {}  # (час, тривалість) -> "гг:хх-гг:хх"
+        for slot in self.time_slots:
+            self.time_range(slot, self.booking_duration)
+
+        self.time_slots_keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton(slot, callback_data=CB_TIME.encode(slot)) for slot in self.time_slots[i:i + 4]]
+            for i in range(0, len(self.time_slots), 4)
+        ])
+
+    @staticmethod
+    def _text(config, key):
+        value = config.get(key)
+        if not isinstance(value, str) or not value.strip():
+            raise VenueConfigError(f"{key} має бути непорожнім рядком.")
+        return value
+
+    @staticmethod
+    def _int(config, key, low, high):
+        value = config.get(key)
+        if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+            raise VenueConfigError(f"{key} має бути цілим числом від {low} до {high}.")
+        return value
+
+    @staticmethod
+    def _time(config, key):
+        value = config.get(key)
+        try:
+            hours, minutes = value.split(":")
+            if len(hours) != 2 or len(minutes) != 2 or not (0 <= int(hours) < 24 and 0 <= int(minutes) < 60):
+                raise ValueError(value)
+        except (AttributeError, ValueError):
+            raise VenueConfigError(f"{key} має бути часом у форматі гг:хх.") from None
+        return slot_minutes(value)
+
+    @classmethod
+    def _cabin(cls, i, item):
+        if not isinstance(item, dict):
+            raise VenueConfigError(f"cabins[{i}] має бути об'єктом.")
+        name = cls._text(item, "name")
+        min_guests = cls._int(item, "min_guests", 1, 100)
+        max_guests = cls._int(item, "max_guests", min_guests, 100)
+        enabled = item.get("enabled", True)
+        if not isinstance(enabled, bool):
+            raise VenueConfigError(f"enabled у «{name}» має бути true або false.")
+        return Cabin(name, min_guests, max_guests, enabled)
+
+    def is_bookable(self, cabin):
+        index = self.cabin_index.get(cabin)
+        return index is not None and self.cabins[index].enabled
+
+    def cabins_by_fit(self, guests):
+        """[(індекс, назва)] доступних місць, що вміщують компанію, від найкращої посадки."""
+        return self._by_fit[guests] if 0 < guests < len(self._by_fit) else ()
+
+    def free_cabins(self, busy_mask):
+        """Доступні місця, не зайняті за маскою, у порядку налаштувань (кешується)."""
+        free = self._free.get(busy_mask)
+        if free is None:
+            if len(self._free) > 4096:
+                self._free.clear()
+            free = self._free[busy_mask] = tuple(
+                cabin.name for i, cabin in enumerate(self.cabins)
+                if self.enabled_mask & (1 << i) and not busy_mask & (1 << i)
             )
-        ''')
-        # Таблиця для збереження контактів користувачів
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                name TEXT,
-                contact TEXT
+        return free
+
+    def overlapping_slots(self, booking_time, duration):
+        """Слоти, утримання з яких (на типову тривалість) перетинаються з бронюванням."""
+        key = (booking_time, duration)
+        slots = self._overlapping.get(key)
+        if slots is None:
+            start = slot_minutes(booking_time)
+            slots = self._overlapping[key] = tuple(
+                t for t in self.time_slots
+                if slot_minutes(t) < start + duration and slot_minutes(t) + self.booking_duration > start
             )
-        ''')
-        # Таблиця для відгуків
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS reviews (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                rating INTEGER NOT NULL,
-                comment TEXT,
-                timestamp TEXT NOT NULL
+        return slots
+
+    def time_range(self, booking_time, duration):
+        """"гг:хх-гг:хх" - початок і кінець бронювання (кінець після півночі - за 24-годинним колом).
+
+        Для слотів з типовою тривалістю рядки готуються при створенні, решта кешується.
+        """
+        key = (booking_time, duration)
+        text = self._time_ranges.get(key)
+        if text is None:
+            if len(self._time_ranges) > 4096:
+                self._time_ranges.clear()
+            end = slot_minutes(booking_time) + duration
+            text = self._time_ranges[key] = f"{booking_time}-{end // 60 % 24:02d}:{end % 60:02d}"
+        return text
+
+    def summary(self):
+        enabled = sum(cabin.enabled for cabin in self.cabins)
+        return (
+            f"місць: {len(self.cabins)} (бронюються {enabled}), "
+            f"слоти {self.time_slots[0]}-{self.time_slots[-1]} по {self.slot_minutes} хв, "
+            f"бронювання на {self.booking_duration} хв, календар на {self.booking_days} днів"
+        )
+
+
+def load_venue_config(path=VENUE_CONFIG_PATH):
+    """Читає налаштування закладу з файлу поверх типових; без файлу - типові."""
+    config = dict(DEFAULT_VENUE_CONFIG)
+    try:
+        with open(path, encoding="utf-8") as f:
+            overrides = json.load(f)
+    except FileNotFoundError:
+        return config
+    except (OSError, ValueError) as e:
+        raise VenueConfigError(f"Не вдалося прочитати {path}: {e}") from None
+    if not isinstance(overrides, dict):
+        raise VenueConfigError(f"{path} має містити JSON-об'єкт.")
+    unknown = set(overrides) - set(DEFAULT_VENUE_CONFIG)
+    if unknown:
+        raise VenueConfigError(f"Невідомі ключі в {path}: {', '.join(sorted(unknown))}.")
+    config.update(overrides)
+    return config
+
+def _venue_config_mtime(path=VENUE_CONFIG_PATH):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+# Невірні налаштування при старті - критична помилка, як і відсутній токен
+_venue_mtime = _venue_config_mtime()
+venue = Venue(load_venue_config())
+
+def reload_venue(force=False):
+    """Перечитує налаштування закладу, якщо файл змінився (або force), і атомарно підміняє venue.
+
+    Повертає True, якщо налаштування оновлено. При помилці піднімає
+    VenueConfigError, а чинні налаштування лишаються без змін.
+    """
+    global venue, _venue_mtime
+    mtime = _venue_config_mtime()
+    if not force and mtime == _venue_mtime:
+        return False
+    # Невдалу версію файлу не перечитуємо на кожній перевірці - лише після нової зміни
+    _venue_mtime = mtime
+    venue = Venue(load_venue_config())
+    logging.info(f"Налаштування закладу оновлено: {venue.summary()}.")
+    return True
+
+# Статуси, за яких бронювання займає кабінку
+ACTIVE_STATUSES = ['Очікує підтвердження', 'Підтверджено']
+
+# --- Метрики ---
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Гістограма тривалостей з однією міткою, у форматі Prometheus.
+
+    Спостереження приходять і з циклу подій, і з потоків БД, тому
+    оновлення серій захищене замком.
+    """
+
+    def __init__(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}  # значення мітки -> [лічильники кошиків..., сума]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {value: list(counts) for value, counts in self._series.items()}
+        for value, counts in sorted(series.items()):
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += counts[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {counts[-1]}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Лічильник з однією міткою, у форматі Prometheus."""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f'{self.name}{{{self.label}="{value}"}} {count}' for value, count in values)
+        return lines
+
+
+class Metrics:
+    """Набір метрик бота. Значення gauge і лічильників з функцій обчислюються в момент запиту."""
+
+    def __init__(self):
+        self.handler_latency = Histogram(
+            "gipnoze_handler_duration_seconds", "Тривалість обробників оновлень.", "handler")
+        self.db_latency = Histogram(
+            "gipnoze_db_query_duration_seconds", "Тривалість функцій бази даних.", "function")
+        self.send_latency = Histogram(
+            "gipnoze_telegram_send_duration_seconds",
+            "Тривалість запитів sendMessage, editMessageText і sendDocument до Telegram - з черги і напряму з обробників.",
+            "result")
+        self.send_errors = Counter(
+            "gipnoze_telegram_send_errors_total",
+            "Помилки запитів sendMessage, editMessageText і sendDocument: HTTP-код відповіді або тип мережевої помилки.",
+            "error")
+        self._gauges = {}  # назва -> (опис, функція без аргументів)
+        self._counters = {}  # назва (з _total) -> (опис, функція без аргументів)
+
+    def gauge(self, name, help_text, func):
+        self._gauges[name] = (help_text, func)
+
+    def counter(self, name, help_text, func):
+        """Лічильник, значення якого веде інший об'єкт (наприклад, влучання кешу від старту)."""
+        if not name.endswith("_total"):
+            raise ValueError(f"Назва лічильника має закінчуватися на _total: {name}")
+        self._counters[name] = (help_text, func)
+
+    def render(self):
+        lines = []
+        for metric in (self.handler_latency, self.db_latency, self.send_latency, self.send_errors):
+            lines.extend(metric.render())
+        for kind, registry in (("gauge", self._gauges), ("counter", self._counters)):
+            for name, (help_text, func) in registry.items():
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {func()}"])
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def observe_handler(func):
+    """Міряє тривалість асинхронного обробника для метрик і для трасування під час профілювання."""
+    @functools.wraps(func)
+    async def wrapper(update, context):
+        trace = _current_trace.get()
+        if trace is None and not METRICS_ENABLED:
+            return await func(update, context)
+        started = time.perf_counter()
+        try:
+            return await func(update, context)
+        finally:
+            if METRICS_ENABLED:
+                metrics.handler_latency.observe(func.__name__, time.perf_counter() - started)
+            if trace is not None:
+                trace.span("handler", func.__name__, started)
+    return wrapper
+
+
+def observe_db(func):
+    """Міряє тривалість і кількість викликів функції БД. Без METRICS_ENABLED повертає її без змін."""
+    if not METRICS_ENABLED:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.db_latency.observe(func.__name__, time.perf_counter() - started)
+    return wrapper
+
+
+class MetricsServer:
+    """Мінімальний HTTP-сервер, що віддає метрики на GET /metrics."""
+
+    def __init__(self, host=None, port=None):
+        self.host = host or METRICS_LISTEN
+        self.port = port or METRICS_PORT
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logging.info(f"Метрики доступні на http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Заголовки запиту не потрібні, але їх треба дочитати до порожнього рядка
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", metrics.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
             )
-        ''')
-        conn.commit()
-        logging.info("База даних ініціалізована.")
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logging.warning(f"Помилка обробки запиту метрик: {e}")
+        finally:
+            writer.close()
+
+
+metrics_server = MetricsServer()
+
+# --- Профілювання на вимогу ---
+# Адмін вмикає його командою /profile на наступні N оновлень або T секунд.
+# Поки профілювання вимкнене, виклики проходять одну перевірку
+# _current_trace.get() і нічого не записують.
+
+PROFILE_DEFAULT_UPDATES = 100
+PROFILE_MAX_SECONDS = 10 * 60  # профілювання за кількістю оновлень теж не триває довше
+PROFILE_MAX_TRACES = 1000
+PROFILE_TOP_N = 15
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Трасування оновлення, що обробляється в поточному контексті asyncio
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class UpdateTrace:
+    """Відрізки часу (обробник, запит до БД, виклик Telegram API) одного оновлення."""
+    __slots__ = ('update_id', 'user_id', 'started', 'duration', 'spans')
+
+    def __init__(self, update_id, user_id):
+        self.update_id = update_id
+        self.user_id = user_id
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.spans = []  # (тип, назва, зсув від початку, тривалість)
+
+    def span(self, kind, name, started):
+        """Записує відрізок, що почався в started (time.perf_counter) і закінчився зараз."""
+        self.spans.append((kind, name, started - self.started, time.perf_counter() - started))
+
+    def to_dict(self):
+        return {
+            'update_id': self.update_id,
+            'user_id': self.user_id,
+            'duration_ms': round(self.duration * 1000, 3),
+            'spans': [
+                {'kind': kind, 'name': name, 'offset_ms': round(offset * 1000, 3), 'duration_ms': round(duration * 1000, 3)}
+                for kind, name, offset, duration in self.spans
+            ],
+        }
+
+
+class Profiler:
+    """cProfile і трасування оновлень на обмежений час.
+
+    Сесія закінчується після заданої кількості оновлень або за часом;
+    тоді адмін отримує звіт з найгарячішими функціями, файл профілю
+    (.prof, відкривається pstats/snakeviz) і трасування у JSON.
+    """
+
+    def __init__(self):
+        self.active = False
+        self._profile = None
+        self._traces = []
+        self._remaining = None
+        self._started_at = 0.0
+        self._timer = None
+        self._bot = None
+        self._chat_id = None
+
+    def start(self, bot, chat_id, updates=None, seconds=None):
+        """Вмикає профілювання. Повертає False, якщо сесія вже триває."""
+        if self.active:
+            return False
+        profile = cProfile.Profile()
+        profile.enable()
+        self._profile = profile
+        self._traces = []
+        self._remaining = updates
+        self._started_at = time.perf_counter()
+        self._bot = bot
+        self._chat_id = chat_id
+        self._timer = asyncio.get_running_loop().call_later(seconds or PROFILE_MAX_SECONDS, self._finish_soon)
+        self.active = True
+        return True
+
+    async def trace_update(self, update, coroutine):
+        """Обробляє оновлення, записуючи його трасування."""
+        user = update.effective_user if isinstance(update, Update) else None
+        trace = UpdateTrace(getattr(update, 'update_id', None), user.id if user else None)
+        token = _current_trace.set(trace)
+        try:
+            await coroutine
+        finally:
+            _current_trace.reset(token)
+            trace.duration = time.perf_counter() - trace.started
+            self._record(trace)
+
+    def _record(self, trace):
+        if not self.active:
+            return
+        if len(self._traces) < PROFILE_MAX_TRACES:
+            self._traces.append(trace)
+        if self._remaining is not None:
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._finish_soon()
+
+    def _finish_soon(self):
+        if self.active:
+            asyncio.get_running_loop().create_task(self.finish())
+
+    async def finish(self):
+        """Вимикає профілювання і надсилає звіт адміністратору."""
+        if not self.active:
+            return
+        self.active = False
+        self._profile.disable()
+        self._timer.cancel()
+        elapsed = time.perf_counter() - self._started_at
+        profile, traces, bot, chat_id = self._profile, self._traces, self._bot, self._chat_id
+        self._profile, self._traces, self._bot = None, [], None
+
+        stats = pstats.Stats(profile)
+        report = build_profile_report(stats, traces, elapsed)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        traces_json = json.dumps([trace.to_dict() for trace in traces], ensure_ascii=False, indent=1)
+        try:
+            await bot.send_message(chat_id=chat_id, text=report[:TELEGRAM_MESSAGE_LIMIT])
+            await bot.send_document(chat_id=chat_id, document=marshal.dumps(stats.stats), filename=f"profile-{stamp}.prof")
+            await bot.send_document(chat_id=chat_id, document=traces_json.encode("utf-8"), filename=f"traces-{stamp}.json")
+        except Exception as e:
+            logging.error(f"Не вдалося надіслати звіт профілювання: {e}")
+
+
+profiler = Profiler()
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def build_profile_report(stats, traces, elapsed, top_n=PROFILE_TOP_N):
+    """Текстовий звіт сесії профілювання: оновлення, відрізки і найгарячіші функції."""
+    lines = [f"📊 Профілювання: {len(traces)} оновлень за {elapsed:.1f} с"]
+    if traces:
+        durations = sorted(trace.duration for trace in traces)
+        lines.append(
+            f"Оновлення: p50 {_percentile(durations, 0.5) * 1000:.1f} мс, "
+            f"p95 {_percentile(durations, 0.95) * 1000:.1f} мс, max {durations[-1] * 1000:.1f} мс"
+        )
+
+        totals = {}  # (тип, назва) -> [кількість, сумарний час]
+        for trace in traces:
+            for kind, name, _, duration in trace.spans:
+                total = totals.setdefault((kind, name), [0, 0.0])
+                total[0] += 1
+                total[1] += duration
+        lines.extend(["", "Відрізки (сумарно):"])
+        for (kind, name), (count, total) in sorted(totals.items(), key=lambda item: -item[1][1])[:top_n]:
+            lines.append(f"{total * 1000:.1f} мс  {count}×  {kind} {name}")
+
+        lines.extend(["", "Найдовші оновлення:"])
+        for trace in sorted(traces, key=lambda t: -t.duration)[:3]:
+            spans = ", ".join(f"{name} {duration * 1000:.1f}" for _, name, _, duration in sorted(trace.spans, key=lambda s: s[2]))
+            lines.append(f"#{trace.update_id}: {trace.duration * 1000:.1f} мс ({spans})")
+
+    lines.extend(["", "Найгарячіші функції (власний / сумарний час):"])
+    hot = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:top_n]
+    for (filename, line, func_name), (_, calls, own, cumulative, _) in hot:
+        lines.append(f"{own * 1000:.1f} / {cumulative * 1000:.1f} мс  {calls}×  {func_name} ({os.path.basename(filename)}:{line})")
+    return "\n".join(lines)
+
+
+# Методи Telegram API, що надсилають чи редагують повідомлення: їх міряють метрики відправки
+TELEGRAM_SEND_METHODS = frozenset({"sendMessage", "editMessageText", "sendDocument"})
+
+
+class TracingHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest, що додає виклики Telegram API до трасування оновлення і до метрик відправки.
+
+    Міряється сам HTTP-запит, тож у метрики потрапляють і відправки з
+    черги, і відповіді та редагування прямо з обробників.
+    """
+
+    async def do_request(self, url, method, *args, **kwargs):
+        trace = _current_trace.get()
+        endpoint = url.rsplit("/", 1)[-1]
+        measured = METRICS_ENABLED and endpoint in TELEGRAM_SEND_METHODS
+        if trace is None and not measured:
+            return await super().do_request(url, method, *args, **kwargs)
+        started = time.perf_counter()
+        error = None
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            if code != 200:
+                error = str(code)
+            return code, payload
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            if measured:
+                metrics.send_latency.observe("ok" if error is None else "error", time.perf_counter() - started)
+                if error is not None:
+                    metrics.send_errors.inc(error)
+            if trace is not None:
+                trace.span("telegram", endpoint, started)
+
+# --- Функції для роботи з базою даних ---
+
+# Колонки бронювання у порядку, в якому їх повертають усі SELECT-запити
+BOOKING_COLUMNS = ('id', 'user_id', 'name', 'nickname', 'date', 'time', 'guests', 'cabin', 'contact', 'status', 'chat_id', 'duration')
+BOOKING_SELECT_SQL = "SELECT " + ", ".join(BOOKING_COLUMNS) + " FROM bookings"
+BOOKING_ARCHIVE_SELECT_SQL = "SELECT " + ", ".join(BOOKING_COLUMNS) + " FROM bookings_archive"
+# Для масових дій: бронювання і позначка нагадування останньою колонкою
+BULK_TARGET_SELECT_SQL = "SELECT " + ", ".join(BOOKING_COLUMNS + ('reminded_at',)) + " FROM bookings"
+
+# Перетин з інтервалом [початок, кінець) у хвилинах від півночі; параметри: дата, кабінка, кінець, початок.
+# Venue перевіряє, що бронювання з останнього слоту не заходить на перший слот наступного дня.
+_MINUTES_SQL = "(substr(time, 1, 2) * 60 + substr(time, 4, 2))"
+BOOKING_OVERLAP_SQL = (
+    "SELECT 1 FROM bookings WHERE date = ? AND cabin = ? AND status IN ('Очікує підтвердження', 'Підтверджено') "
+    f"AND {_MINUTES_SQL} < ? AND {_MINUTES_SQL} + duration > ?"
+)
+# Утримання ставляться на типову тривалість; параметри: дата, кабінка, кінець, тривалість утримання,
+# початок, user_id, поточний час
+HOLD_OVERLAP_SQL = (
+    f"SELECT 1 FROM slot_holds WHERE date = ? AND cabin = ? AND {_MINUTES_SQL} < ? "
+    f"AND {_MINUTES_SQL} + ? > ? AND user_id != ? AND expires_at > ?"
+)
+
+# Налаштування з'єднання: WAL дозволяє читати паралельно із записом,
+# synchronous=NORMAL у режимі WAL не робить fsync на кожен коміт
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}",
+)
+DB_STATEMENT_CACHE_SIZE = 256
+
+
+class Database:
+    """Менеджер довгоживучих з'єднань з SQLite.
+
+    Кожен потік отримує власне з'єднання, яке відкривається один раз і
+    використовується повторно. Підготовлені запити кешує сам sqlite3
+    (cached_statements), тому SQL-тексти тримаються в константах.
+
+    З immediate=True транзакції починаються з BEGIN IMMEDIATE: блокування
+    запису береться одразу, тож з'єднання іншого процесу чекає його
+    busy_timeout, а не отримує SQLITE_BUSY посеред транзакції, коли
+    читання вже зроблено. Якщо блокування так і не дочекались, початок
+    транзакції повторюється до lock_retries разів.
+    """
+
+    def __init__(self, path, immediate=False, lock_retries=0):
+        self.path = path
+        self.immediate = immediate
+        self.lock_retries = lock_retries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,  # транзакціями керуємо вручну в transaction()
+            cached_statements=DB_STATEMENT_CACHE_SIZE,
+        )
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @property
+    def connection(self):
+        """Повертає з'єднання поточного потоку, відкриваючи його за потреби."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.depth = 0
+            self._local.after_commit = []
+        return conn
+
+    def after_commit(self, callback, *args):
+        """Реєструє функцію, яку буде викликано після коміту поточної транзакції.
+
+        Якщо транзакцію (або точку збереження, в якій зареєстровано
+        функцію) відкочено, функцію не буде викликано.
+        """
+        if not getattr(self._local, 'depth', 0):
+            callback(*args)
+            return
+        self._local.after_commit.append((callback, args))
+
+    @contextmanager
+    def transaction(self):
+        """Контекстний менеджер транзакції.
+
+        Комітить при виході без помилок і відкочує при винятку. Вкладені
+        виклики входять у зовнішню транзакцію через SAVEPOINT.
+        """
+        conn = self.connection
+        if self._local.depth:
+            # Вкладена транзакція: окрема точка збереження, щоб помилка
+            # одного запису не відкочувала всю зовнішню транзакцію
+            savepoint = f"sp_{self._local.depth}"
+            pending = len(self._local.after_commit)
+            conn.execute(f"SAVEPOINT {savepoint}")
+            self._local.depth += 1
+            try:
+                yield conn
+            except BaseException:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+                del self._local.after_commit[pending:]
+                raise
+            else:
+                conn.execute(f"RELEASE {savepoint}")
+            finally:
+                self._local.depth -= 1
+            return
+
+        self._begin(conn)
+        self._local.depth = 1
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # І помилка в тілі, і невдалий COMMIT (SQLITE_BUSY, помилка диска, відкладене обмеження):
+            # з'єднання не має лишитися у відкритій транзакції, а обробники після коміту - спрацювати
+            self._local.after_commit = []
+            if conn.in_transaction:
+                try:
+                    conn.rollback()
+                except sqlite3.Error as e:
+                    logging.error(f"Помилка відкату транзакції: {e}")
+            raise
+        finally:
+            self._local.depth = 0
+        callbacks, self._local.after_commit = self._local.after_commit, []
+        for callback, args in callbacks:
+            try:
+                callback(*args)
+            except Exception as e:
+                logging.error(f"Помилка в обробнику після коміту {callback.__name__}: {e}")
+
+    def _begin(self, conn):
+        if not self.immediate:
+            conn.execute("BEGIN")
+            return
+        for attempt in range(self.lock_retries + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if attempt == self.lock_retries or "locked" not in str(e):
+                    raise
+                logging.warning(f"БД заблокована іншим процесом, повтор {attempt + 1} з {self.lock_retries}.")
+                time.sleep(0.05 * 2 ** attempt)
+
+    def execute(self, sql, params=()):
+        """Виконує одиночний запит поза явною транзакцією (для читання)."""
+        return self.connection.execute(sql, params)
+
+    def close(self):
+        """Закриває всі відкриті з'єднання."""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+db = Database(DB_PATH)
+
+
+def _row_to_booking(row):
+    """Перетворює рядок з таблиці bookings на словник."""
+    return dict(zip(BOOKING_COLUMNS, row))
+
+# --- Міграції схеми ---
+# Версія схеми зберігається в PRAGMA user_version. Нові міграції додаються
+# в кінець списку MIGRATIONS; вже застосовані міграції змінювати не можна.
+
+def _migration_initial_schema(conn):
+    """Початкова схема: таблиці бронювань, користувачів і відгуків."""
+    # Таблиця для бронювань
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            nickname TEXT,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            guests INTEGER NOT NULL,
+            cabin TEXT NOT NULL,
+            contact TEXT NOT NULL,
+            status TEXT NOT NULL,
+            chat_id INTEGER NOT NULL
+        )
+    ''')
+    # Таблиця для збереження контактів користувачів
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            name TEXT,
+            contact TEXT
+        )
+    ''')
+    # Таблиця для відгуків
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL,
+            comment TEXT,
+            timestamp TEXT NOT NULL
+        )
+    ''')
+
+def _migration_booking_indexes(conn):
+    """Індекси для перевірки доступності, списку адміна та історії користувача."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_date_time_status ON bookings (date, time, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings (status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_user_id ON bookings (user_id)")
+
+def _migration_slot_reservations(conn):
+    """Тимчасові утримання місць і унікальність активного бронювання на місце."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS slot_holds (
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            cabin TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (date, time, cabin)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_slot_holds_user_id ON slot_holds (user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_slot_holds_expires_at ON slot_holds (expires_at)")
+
+    conn.execute("ALTER TABLE bookings ADD COLUMN created_at REAL")
+    conn.execute("UPDATE bookings SET created_at = CAST(strftime('%s', 'now') AS REAL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_status_created_at ON bookings (status, created_at)")
+
+    # Подвійні бронювання, що могли виникнути раніше, залишаємо за першим гостем
+    duplicates = conn.execute('''
+        UPDATE bookings SET status = 'Відхилено'
+        WHERE status IN ('Очікує підтвердження', 'Підтверджено')
+          AND id NOT IN (
+              SELECT MIN(id) FROM bookings
+              WHERE status IN ('Очікує підтвердження', 'Підтверджено')
+              GROUP BY date, time, cabin
+          )
+    ''').rowcount
+    if duplicates:
+        logging.warning(f"Відхилено {duplicates} подвійних бронювань перед створенням унікального індексу.")
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_active_slot ON bookings (date, time, cabin)
+        WHERE status IN ('Очікує підтвердження', 'Підтверджено')
+    ''')
+
+def _migration_persistent_sessions(conn):
+    """Збереження станів розмов і незавершених бронювань між перезапусками."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state INTEGER NOT NULL,
+            PRIMARY KEY (name, key)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS booking_sessions (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_booking_sessions_updated_at ON booking_sessions (updated_at)")
+
+def _migration_outbox(conn):
+    """Черга вихідних повідомлень, що переживає перезапуск."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            reply_markup TEXT,
+            priority INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            last_error TEXT,
+            created_at REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, next_attempt_at)")
+
+def _migration_review_stats(conn):
+    """Сортовані мітки часу відгуків і щоденні агрегати оцінок."""
+    # "дд.мм.рррр гг:хх:сс" -> "рррр-мм-дд гг:хх:сс": такі рядки сортуються як дати
+    conn.execute('''
+        UPDATE reviews
+        SET timestamp = substr(timestamp, 7, 4) || '-' || substr(timestamp, 4, 2) || '-' || substr(timestamp, 1, 2) || substr(timestamp, 11)
+        WHERE timestamp LIKE '__.__.____%'
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_timestamp ON reviews (timestamp)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS review_daily_stats (
+            day TEXT PRIMARY KEY,
+            reviews INTEGER NOT NULL,
+            rating_sum INTEGER NOT NULL,
+            rating_1 INTEGER NOT NULL DEFAULT 0,
+            rating_2 INTEGER NOT NULL DEFAULT 0,
+            rating_3 INTEGER NOT NULL DEFAULT 0,
+            rating_4 INTEGER NOT NULL DEFAULT 0,
+            rating_5 INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO review_daily_stats (day, reviews, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+        SELECT substr(timestamp, 1, 10), COUNT(*), SUM(rating),
+               SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+        FROM reviews GROUP BY substr(timestamp, 1, 10)
+    ''')
+
+def _migration_iso_dates(conn):
+    """Дати бронювань і утримань у форматі "рррр-мм-дд", щоб діапазони дат читалися з індексу."""
+    iso = "substr({0}, 7, 4) || '-' || substr({0}, 4, 2) || '-' || substr({0}, 1, 2)"
+    conn.execute(f"UPDATE bookings SET date = {iso.format('date')} WHERE date LIKE '__.__.____'")
+    conn.execute(f"UPDATE slot_holds SET date = {iso.format('date')} WHERE date LIKE '__.__.____'")
+    old_date = "json_extract(data, '$.date')"
+    conn.execute(
+        f"UPDATE booking_sessions SET data = json_set(data, '$.date', {iso.format(old_date)}) "
+        f"WHERE {old_date} LIKE '__.__.____'"
+    )
+    # Майбутні й минулі бронювання гостя - діапазон за (user_id, date, time)
+    conn.execute("DROP INDEX IF EXISTS idx_bookings_user_id")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_user_id_date ON bookings (user_id, date, time)")
+
+def _migration_bookings_archive(conn):
+    """Архів минулих і завершених бронювань, щоб таблиця bookings лишалася малою."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bookings_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            nickname TEXT,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            guests INTEGER NOT NULL,
+            cabin TEXT NOT NULL,
+            contact TEXT NOT NULL,
+            status TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            created_at REAL,
+            archived_at REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_archive_user_id_date ON bookings_archive (user_id, date, time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_archive_date ON bookings_archive (date, time)")
+
+def _migration_booking_reminders(conn):
+    """Позначка надісланого нагадування, щоб після перезапуску воно не повторилося."""
+    conn.execute("ALTER TABLE bookings ADD COLUMN reminded_at REAL")
+
+def _migration_admin_messages(conn):
+    """Копії сповіщень про бронювання в чатах адміністраторів."""
+    conn.execute("ALTER TABLE outbox ADD COLUMN booking_id INTEGER")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS admin_messages (
+            booking_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            PRIMARY KEY (booking_id, chat_id)
+        ) WITHOUT ROWID
+    ''')
+
+def _migration_booking_duration(conn):
+    """Тривалість бронювання в хвилинах; наявні бронювання отримують типову."""
+    for table in ("bookings", "bookings_archive"):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN duration INTEGER NOT NULL DEFAULT {BOOKING_DURATION_MINUTES}")
+
+def _migration_outbox_owner(conn):
+    """Процес, якому належить повідомлення в черзі відправки (для кількох воркерів зі спільною БД)."""
+    conn.execute("ALTER TABLE outbox ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+    conn.execute("DROP INDEX IF EXISTS idx_outbox_status")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_owner_status ON outbox (owner, status, next_attempt_at)")
+
+def _migration_user_contact_updated_at(conn):
+    """Час оновлення контактів: за ним процеси зі спільною БД скидають застарілі записи кешу контактів."""
+    conn.execute("ALTER TABLE users ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users (updated_at)")
+
+# (версія, опис, функція міграції) у порядку застосування
+MIGRATIONS = [
+    (1, "початкова схема", _migration_initial_schema),
+    (2, "індекси бронювань", _migration_booking_indexes),
+    (3, "утримання місць", _migration_slot_reservations),
+    (4, "збереження розмов", _migration_persistent_sessions),
+    (5, "черга вихідних повідомлень", _migration_outbox),
+    (6, "статистика відгуків", _migration_review_stats),
+    (7, "дати у форматі ISO", _migration_iso_dates),
+    (8, "архів бронювань", _migration_bookings_archive),
+    (9, "нагадування про бронювання", _migration_booking_reminders),
+    (10, "сповіщення адміністраторів", _migration_admin_messages),
+    (11, "тривалість бронювань", _migration_booking_duration),
+    (12, "власник повідомлень у черзі", _migration_outbox_owner),
+    (13, "час оновлення контактів", _migration_user_contact_updated_at),
+]
+
+def get_schema_version():
+    """Повертає поточну версію схеми бази даних."""
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations(target_version=None):
+    """Застосовує по черзі всі міграції, новіші за поточну версію схеми.
+
+    Кожна міграція виконується в окремій транзакції разом з оновленням
+    версії, тому збій посередині не залишає схему в невизначеному стані.
+    """
+    current = get_schema_version()
+    for version, description, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        if target_version is not None and version > target_version:
+            break
+        with db.transaction() as conn:
+            # Інший процес зі спільною БД міг застосувати міграцію, поки цей чекав на блокування
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                current = version
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        logging.info(f"Застосовано міграцію {version}: {description}.")
+        current = version
+    return current
+
+def enable_incremental_vacuum():
+    """Вмикає auto_vacuum=INCREMENTAL, щоб місце після архівації можна було повертати частинами.
+
+    Для наявної бази режим застосовується лише після повного VACUUM,
+    який робиться один раз.
+    """
+    if db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    logging.info("Вмикаю інкрементальний VACUUM бази даних...")
+    db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    db.execute("VACUUM")
+
+def init_db():
+    """Ініціалізує базу даних, застосовуючи всі незастосовані міграції."""
+    try:
+        enable_incremental_vacuum()
+        version = run_migrations()
+        logging.info(f"База даних ініціалізована (версія схеми {version}).")
     except sqlite3.Error as e:
         logging.error(f"Помилка ініціалізації бази даних: {e}")
-    finally:
-        if conn:
-            conn.close()
 
-def get_bookings_from_db(filters=None):
-    """Отримує бронювання з бази даних з можливістю фільтрації."""
-    conn = None
+@observe_db
+def get_bookings_from_db(filters=None, include_archive=False):
+    """Отримує бронювання з бази даних з можливістю фільтрації.
+
+    Дати - рядки "рррр-мм-дд"; date_from і date_to задають діапазон
+    включно і читаються з індексу за датою. З include_archive до
+    результату додаються і перенесені в архів бронювання.
+    """
     bookings_list = []
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        query = "SELECT id, user_id, name, nickname, date, time, guests, cabin, contact, status, chat_id FROM bookings"
+        query = BOOKING_SELECT_SQL
         params = []
         where_clauses = []
 
@@ -131,16 +1469,25 @@ def get_bookings_from_db(filters=None):
                 where_clauses.append("user_id = ?")
                 params.append(filters['user_id'])
             if 'status' in filters:
+                # Для діапазону дат "+" вимикає індекс за статусом: без ANALYZE планувальник
+                # обирає його і перебирає всі активні бронювання замість днів діапазону
+                status = "+status" if 'date_from' in filters or 'date_to' in filters else "status"
                 if isinstance(filters['status'], list):
                     status_placeholders = ','.join(['?' for _ in filters['status']])
-                    where_clauses.append(f"status IN ({status_placeholders})")
+                    where_clauses.append(f"{status} IN ({status_placeholders})")
                     params.extend(filters['status'])
                 else:
-                    where_clauses.append("status = ?")
+                    where_clauses.append(f"{status} = ?")
                     params.append(filters['status'])
             if 'date' in filters:
                 where_clauses.append("date = ?")
                 params.append(filters['date'])
+            if 'date_from' in filters:
+                where_clauses.append("date >= ?")
+                params.append(filters['date_from'])
+            if 'date_to' in filters:
+                where_clauses.append("date <= ?")
+                params.append(filters['date_to'])
             if 'time' in filters:
                 where_clauses.append("time = ?")
                 params.append(filters['time'])
@@ -148,210 +1495,2259 @@ def get_bookings_from_db(filters=None):
                 where_clauses.append("cabin = ?")
                 params.append(filters['cabin'])
 
-        if where_clauses:
-            query += " WHERE " + " AND ".join(where_clauses)
-
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        query += where
+        if include_archive:
+            query += f" UNION ALL {BOOKING_ARCHIVE_SELECT_SQL}{where}"
+            params = params * 2
 
-        for row in rows:
-            booking = {
-                'id': row[0],
-                'user_id': row[1],
-                'name': row[2],
-                'nickname': row[3],
-                'date': row[4],
-                'time': row[5],
-                'guests': row[6],
-                'cabin': row[7],
-                'contact': row[8],
-                'status': row[9],
-                'chat_id': row[10]
-            }
-            bookings_list.append(booking)
+        rows = db.execute(query, params).fetchall()
+        bookings_list = [_row_to_booking(row) for row in rows]
     except sqlite3.Error as e:
         logging.error(f"Помилка отримання бронювань з бази даних: {e}")
-    finally:
-        if conn:
-            conn.close()
     return bookings_list
 
-def add_booking_to_db(booking_data):
-    """Додає нове бронювання до бази даних."""
-    conn = None
-    booking_id = None
+@observe_db
+def add_booking_to_db(booking_data):
+    """Додає нове бронювання до бази даних.
+
+    Вставка умовна: якщо на час бронювання місце утримує інший гість або
+    воно перетинається з активним бронюванням, піднімається
+    SlotUnavailableError.
+    """
+    booking_id = None
+    user_id = booking_data['user_id']
+    duration = booking_data.get('duration') or venue.booking_duration
+    slot = (booking_data['date'], booking_data['time'], booking_data['cabin'])
+    start = slot_minutes(booking_data['time'])
+    interval = (booking_data['date'], booking_data['cabin'], start + duration, start)
+    hold_interval = (booking_data['date'], booking_data['cabin'], start + duration, venue.booking_duration, start)
+    try:
+        with db.transaction() as conn:
+            try:
+                cursor = conn.execute(f'''
+                    INSERT INTO bookings (user_id, name, nickname, date, time, guests, cabin, contact, status, chat_id, created_at, duration)
+                    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+                    WHERE NOT EXISTS ({HOLD_OVERLAP_SQL})
+                    AND NOT EXISTS ({BOOKING_OVERLAP_SQL})
+                ''', (
+                    user_id,
+                    booking_data['name'],
+                    booking_data.get('nickname', ''),
+                    booking_data['date'],
+                    booking_data['time'],
+                    booking_data['guests'],
+                    booking_data['cabin'],
+                    booking_data['contact'],
+                    booking_data['status'],
+                    booking_data['chat_id'],
+                    time.time(),
+                    duration,
+                    *hold_interval, user_id, time.time(),
+                    *interval
+                ))
+            except sqlite3.IntegrityError:
+                raise SlotUnavailableError(*slot) from None
+            if cursor.rowcount == 0:
+                raise SlotUnavailableError(*slot)
+            booking_id = cursor.lastrowid
+            conn.execute("DELETE FROM slot_holds WHERE user_id = ?", (user_id,))
+            db.after_commit(slot_holds.release, user_id)
+            if booking_data['status'] in ACTIVE_STATUSES:
+                db.after_commit(occupancy.occupy, *slot, duration)
+        logging.info(f"Бронювання {booking_id} додано до БД.")
+    except sqlite3.Error as e:
+        booking_id = None
+        logging.error(f"Помилка додавання бронювання до бази даних: {e}")
+    return booking_id
+
+def _after_status_change(booking_id, booking_date, booking_time, cabin, duration, old_status, chat_id, reminded_at, new_status):
+    """Після коміту зміни статусу оновлює індекс зайнятості і розклад нагадувань.
+
+    Викликати всередині db.transaction().
+    """
+    was_active = old_status in ACTIVE_STATUSES
+    is_active = new_status in ACTIVE_STATUSES
+    if was_active and not is_active:
+        db.after_commit(occupancy.release, booking_date, booking_time, cabin, duration)
+    elif is_active and not was_active:
+        db.after_commit(occupancy.occupy, booking_date, booking_time, cabin, duration)
+    # Нагадування отримують лише підтверджені бронювання
+    if new_status == 'Підтверджено' and reminded_at is None:
+        db.after_commit(reminders.schedule, booking_id, chat_id, booking_date, booking_time, cabin)
+    elif old_status == 'Підтверджено' and new_status != 'Підтверджено':
+        db.after_commit(reminders.cancel, booking_id)
+
+@observe_db
+def update_booking_status_in_db(booking_id, new_status, expected_statuses=None):
+    """Оновлює статус бронювання в базі даних за ID.
+
+    Якщо задано expected_statuses, статус змінюється лише з одного з них
+    (щоб двоє адміністраторів не обробили одне бронювання двічі).
+    Повертає True, якщо статус змінено.
+    """
+    try:
+        with db.transaction() as conn:
+            row = conn.execute(
+                "SELECT date, time, cabin, duration, status, chat_id, reminded_at FROM bookings WHERE id = ?", (booking_id,)
+            ).fetchone()
+            if expected_statuses is not None and (row is None or row[4] not in expected_statuses):
+                return False
+            conn.execute("UPDATE bookings SET status = ? WHERE id = ?", (new_status, booking_id))
+            if row:
+                _after_status_change(booking_id, *row, new_status)
+        logging.info(f"Статус бронювання {booking_id} оновлено на '{new_status}'.")
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Помилка оновлення статусу бронювання {booking_id}: {e}")
+        return False
+
+@observe_db
+def get_booking_by_id(booking_id):
+    """Отримує одне бронювання за його ID, шукаючи і в архіві."""
+    row = None
+    try:
+        row = db.execute(BOOKING_SELECT_SQL + " WHERE id = ?", (booking_id,)).fetchone()
+        if row is None:
+            row = db.execute(BOOKING_ARCHIVE_SELECT_SQL + " WHERE id = ?", (booking_id,)).fetchone()
+    except sqlite3.Error as e:
+        logging.error(f"Помилка отримання бронювання за ID {booking_id}: {e}")
+
+    if row:
+        return _row_to_booking(row)
+    return None
+
+@observe_db
+def get_active_bookings_page(after_id=0, before_id=None, date_from=None, date_to=None, limit=5):
+    """Сторінка активних бронювань з keyset-пагінацією за id.
+
+    Для наступної сторінки передається after_id (останній показаний id),
+    для попередньої - before_id (перший показаний id); date_from і
+    date_to обмежують дати включно. Повертає (бронювання, чи є
+    попередня сторінка, чи є наступна сторінка).
+    """
+    # З діапазоном дат бронювання беруться з індексу дати і сортуються за id;
+    # "+" не дає планувальнику обрати індекс статусу чи перебір за id, який
+    # для одного дня проходить майже всю таблицю
+    status, id_ = ("+status", "+id") if date_from or date_to else ("status", "id")
+    where = f"{status} IN ('Очікує підтвердження', 'Підтверджено')"
+    params = []
+    if date_from:
+        where += " AND date >= ?"
+        params.append(date_from)
+    if date_to:
+        where += " AND date <= ?"
+        params.append(date_to)
+    try:
+        if before_id is not None:
+            rows = db.execute(
+                f"{BOOKING_SELECT_SQL} WHERE {where} AND {id_} < ? ORDER BY id DESC LIMIT ?",
+                (*params, before_id, limit)
+            ).fetchall()
+            rows.reverse()
+        else:
+            rows = db.execute(
+                f"{BOOKING_SELECT_SQL} WHERE {where} AND {id_} > ? ORDER BY id LIMIT ?",
+                (*params, after_id, limit)
+            ).fetchall()
+        if not rows:
+            return [], False, False
+        has_prev = db.execute(f"SELECT 1 FROM bookings WHERE {where} AND {id_} < ? LIMIT 1", (*params, rows[0][0])).fetchone()
+        has_next = db.execute(f"SELECT 1 FROM bookings WHERE {where} AND {id_} > ? LIMIT 1", (*params, rows[-1][0])).fetchone()
+        return [_row_to_booking(row) for row in rows], bool(has_prev), bool(has_next)
+    except sqlite3.Error as e:
+        logging.error(f"Помилка отримання сторінки бронювань: {e}")
+        return [], False, False
+
+@observe_db
+def get_user_bookings(user_id, upcoming=True, limit=10):
+    """Бронювання гостя від сьогодні вперед (upcoming) або минулі, найновіші першими.
+
+    Час "гг:хх" записаний з ведучим нулем, тож пара (date, time)
+    сортується як рядки і береться з індексу (user_id, date, time).
+    Минулі бронювання читаються також з архіву.
+    """
+    today = date.today().isoformat()
+    if upcoming:
+        sql = BOOKING_SELECT_SQL + " WHERE user_id = ? AND date >= ? ORDER BY date, time LIMIT ?"
+        params = (user_id, today, limit)
+    else:
+        sql = (
+            f"SELECT * FROM ({BOOKING_SELECT_SQL} WHERE user_id = ? AND date < ? "
+            f"UNION ALL {BOOKING_ARCHIVE_SELECT_SQL} WHERE user_id = ? AND date < ?) "
+            "ORDER BY date DESC, time DESC LIMIT ?"
+        )
+        params = (user_id, today, user_id, today, limit)
+    try:
+        return [_row_to_booking(row) for row in db.execute(sql, params).fetchall()]
+    except sqlite3.Error as e:
+        logging.error(f"Помилка отримання бронювань користувача {user_id}: {e}")
+        return []
+
+@observe_db
+def get_user_contact(user_id):
+    """Отримує збережені контакти користувача."""
+    try:
+        row = db.execute("SELECT name, contact FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return {'name': row[0], 'contact': row[1]} if row else None
+    except sqlite3.Error as e:
+        logging.error(f"Помилка отримання даних користувача {user_id}: {e}")
+    return None
+
+@observe_db
+def save_user_contact(user_id, name, contact):
+    """Зберігає або оновлює контактні дані користувача і, після коміту, кеш контактів."""
+    try:
+        with db.transaction() as conn:
+            conn.execute(
+                "REPLACE INTO users (user_id, name, contact, updated_at) VALUES (?, ?, ?, ?)",
+                (user_id, name, contact, time.time())
+            )
+            db.after_commit(contact_cache.put, user_id, {'name': name, 'contact': contact})
+        logging.info(f"Контактні дані для користувача {user_id} збережено.")
+    except sqlite3.Error as e:
+        logging.error(f"Помилка збереження даних користувача {user_id}: {e}")
+
+CONTACT_CACHE_MAX_ENTRIES = 5_000
+CONTACT_CACHE_TTL_SECONDS = 60 * 60
+CONTACT_CACHE_WARM_DAYS = 30  # при старті в кеш завантажуються гості, що бронювали за цей час
+
+class ContactCache:
+    """LRU-кеш збережених контактів гостей з TTL.
+
+    Зберігає і відсутність контактів (None), тож гість без збережених
+    даних теж не йде в БД щоразу. Записи оновлює save_user_contact після
+    коміту (write-through). Читання з БД, яке почалося до чийогось запису,
+    не може покласти в кеш старе значення: fill приймає лише значення,
+    прочитане при незмінному лічильнику записів.
+    """
+
+    def __init__(self, max_entries=CONTACT_CACHE_MAX_ENTRIES, ttl=CONTACT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (контакти або None, час закінчення)
+        self._writes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def generation(self):
+        """Лічильник записів; береться перед читанням з БД і передається у fill."""
+        return self._writes
+
+    def get(self, user_id):
+        """Повертає (знайдено, контакти або None) і рахує влучання та промахи."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return False, None
+
+    def _store(self, user_id, contact):
+        self._entries[user_id] = (contact, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, user_id, contact):
+        """Записує контакти, щойно збережені в БД."""
+        with self._lock:
+            self._writes += 1
+            self._store(user_id, contact)
+
+    def fill(self, user_id, contact, generation):
+        """Кладе прочитане з БД, якщо відтоді не було записів."""
+        with self._lock:
+            if generation == self._writes:
+                self._store(user_id, contact)
+
+    def invalidate(self, user_ids):
+        """Скидає записи, змінені в БД в обхід цього кешу (іншими процесами)."""
+        with self._lock:
+            self._writes += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def load(self, rows):
+        """Заповнює кеш рядками (user_id, ім'я або None, телефон), від найактивніших."""
+        with self._lock:
+            self._writes += 1
+            self._entries.clear()
+            for user_id, name, contact in reversed(rows[:self.max_entries]):
+                self._store(user_id, {'name': name, 'contact': contact} if contact is not None else None)
+
+
+contact_cache = ContactCache()
+
+def load_contact_cache():
+    """Прогріває кеш контактів гостями з незавершеними бронюваннями і тими, хто нещодавно бронював."""
+    try:
+        rows = db.execute(
+            "SELECT active.user_id, users.name, users.contact FROM ("
+            "    SELECT user_id, MAX(created_at) AS active_at FROM bookings WHERE created_at > ? GROUP BY user_id"
+            "    UNION ALL SELECT user_id, updated_at FROM booking_sessions"
+            ") AS active LEFT JOIN users ON users.user_id = active.user_id "
+            "GROUP BY active.user_id ORDER BY MAX(active.active_at) DESC LIMIT ?",
+            (time.time() - CONTACT_CACHE_WARM_DAYS * 24 * 60 * 60, contact_cache.max_entries)
+        ).fetchall()
+        contact_cache.load(rows)
+        logging.info(f"Кеш контактів прогріто: {len(rows)} гостей.")
+    except sqlite3.Error as e:
+        logging.error(f"Помилка прогрівання кешу контактів: {e}")
+
+# Мітки часу відгуків сортуються як рядки; перші 10 символів - день агрегату
+REVIEW_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+REVIEW_RATINGS = (1, 2, 3, 4, 5)
+REVIEW_STATS_DAYS = 7
+REVIEW_STATS_WEEKS = 8
+REVIEW_STATS_RECENT = 5
+
+@observe_db
+def save_review(user_id, rating, comment):
+    """Зберігає відгук у базі даних і в тій самій транзакції оновлює щоденні агрегати."""
+    if rating not in REVIEW_RATINGS:
+        logging.error(f"Невірна оцінка відгуку від користувача {user_id}: {rating}")
+        return
+    try:
+        timestamp = datetime.now().strftime(REVIEW_TIMESTAMP_FORMAT)
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO reviews (user_id, rating, comment, timestamp) VALUES (?, ?, ?, ?)", (user_id, rating, comment, timestamp))
+            conn.execute(f'''
+                INSERT INTO review_daily_stats (day, reviews, rating_sum, rating_{rating}) VALUES (?, 1, ?, 1)
+                ON CONFLICT (day) DO UPDATE
+                SET reviews = reviews + 1, rating_sum = rating_sum + excluded.rating_sum, rating_{rating} = rating_{rating} + 1
+            ''', (timestamp[:10], rating))
+        logging.info(f"Відгук від користувача {user_id} збережено.")
+    except sqlite3.Error as e:
+        logging.error(f"Помилка збереження відгуку від користувача {user_id}: {e}")
+
+@observe_db
+def get_review_stats(days=REVIEW_STATS_DAYS, weeks=REVIEW_STATS_WEEKS, recent=REVIEW_STATS_RECENT):
+    """Статистика відгуків з таблиці щоденних агрегатів і кілька останніх коментарів.
+
+    Повертає словник: total, average, distribution (оцінка -> кількість),
+    daily і weekly ([(день або понеділок тижня, кількість, середня)]),
+    recent ([(мітка часу, оцінка, коментар)]).
+    """
+    today = date.today()
+    try:
+        row = db.execute(
+            "SELECT SUM(reviews), SUM(rating_sum), SUM(rating_1), SUM(rating_2), SUM(rating_3), SUM(rating_4), SUM(rating_5) "
+            "FROM review_daily_stats"
+        ).fetchone()
+        daily = db.execute(
+            "SELECT day, reviews, CAST(rating_sum AS REAL) / reviews FROM review_daily_stats WHERE day >= ? ORDER BY day",
+            ((today - timedelta(days=days - 1)).isoformat(),)
+        ).fetchall()
+        # date(day, 'weekday 0', '-6 days') - понеділок тижня, до якого належить день
+        weekly = db.execute('''
+            SELECT date(day, 'weekday 0', '-6 days') AS week, SUM(reviews), CAST(SUM(rating_sum) AS REAL) / SUM(reviews)
+            FROM review_daily_stats WHERE day >= ? GROUP BY week ORDER BY week
+        ''', ((today - timedelta(days=today.weekday(), weeks=weeks - 1)).isoformat(),)).fetchall()
+        recent_rows = db.execute(
+            "SELECT timestamp, rating, comment FROM reviews ORDER BY timestamp DESC LIMIT ?", (recent,)
+        ).fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Помилка отримання статистики відгуків: {e}")
+        return None
+    total, rating_sum = row[0] or 0, row[1] or 0
+    return {
+        'total': total,
+        'average': rating_sum / total if total else None,
+        'distribution': {rating: count or 0 for rating, count in zip(REVIEW_RATINGS, row[2:])},
+        'daily': daily,
+        'weekly': weekly,
+        'recent': recent_rows,
+    }
+
+# --- Утримання місць ---
+
+HOLD_TTL_SECONDS = 10 * 60  # скільки місце утримується за гостем після вибору кабінки
+PENDING_BOOKING_TTL_SECONDS = 12 * 60 * 60  # скільки бронювання може чекати на підтвердження
+RESERVATION_SWEEP_INTERVAL_SECONDS = 60
+EXPIRED_BOOKING_STATUS = 'Скасовано (не підтверджено)'
+
+
+class SlotUnavailableError(Exception):
+    """Місце вже заброньоване або утримується іншим гостем."""
+
+    def __init__(self, booking_date, booking_time, cabin):
+        super().__init__(f"{cabin} на {booking_date} о {booking_time} вже зайнято")
+        self.date = booking_date
+        self.time = booking_time
+        self.cabin = cabin
+
+
+@observe_db
+def place_hold(booking_date, booking_time, cabin, user_id):
+    """Утримує місце за гостем на HOLD_TTL_SECONDS.
+
+    Повертає True, якщо утримання поставлено (або продовжено), і False,
+    якщо на час бронювання (типова тривалість від booking_time)
+    місце вже заброньоване чи утримується іншим гостем. Попереднє
+    утримання цього гостя знімається.
+    """
+    now = time.time()
+    expires_at = now + HOLD_TTL_SECONDS
+    start = slot_minutes(booking_time)
+    duration = venue.booking_duration
+    interval = (booking_date, cabin, start + duration, start)
+    try:
+        with db.transaction() as conn:
+            if conn.execute(BOOKING_OVERLAP_SQL, interval).fetchone():
+                return False
+            if conn.execute(HOLD_OVERLAP_SQL, (booking_date, cabin, start + duration, duration, start, user_id, now)).fetchone():
+                return False
+            conn.execute(
+                "DELETE FROM slot_holds WHERE user_id = ? AND NOT (date = ? AND time = ? AND cabin = ?)",
+                (user_id, booking_date, booking_time, cabin)
+            )
+            cursor = conn.execute('''
+                INSERT INTO slot_holds (date, time, cabin, user_id, expires_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (date, time, cabin) DO UPDATE
+                SET user_id = excluded.user_id, expires_at = excluded.expires_at
+                WHERE slot_holds.user_id = excluded.user_id OR slot_holds.expires_at <= ?
+            ''', (booking_date, booking_time, cabin, user_id, expires_at, now))
+            if cursor.rowcount == 0:
+                return False
+            db.after_commit(slot_holds.hold, user_id, booking_date, booking_time, cabin, expires_at)
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Помилка утримання місця {cabin} на {booking_date} {booking_time}: {e}")
+        return False
+
+@observe_db
+def release_hold(user_id):
+    """Знімає утримання місця, поставлене гостем."""
+    try:
+        with db.transaction() as conn:
+            conn.execute("DELETE FROM slot_holds WHERE user_id = ?", (user_id,))
+            db.after_commit(slot_holds.release, user_id)
+    except sqlite3.Error as e:
+        logging.error(f"Помилка зняття утримання для користувача {user_id}: {e}")
+
+@observe_db
+def sweep_expired_reservations():
+    """Одним пакетом видаляє прострочені утримання і скасовує непідтверджені бронювання.
+
+    Повертає список скасованих бронювань, щоб можна було повідомити гостей.
+    """
+    now = time.time()
+    expired_bookings = []
+    try:
+        with db.transaction() as conn:
+            holds_removed = conn.execute("DELETE FROM slot_holds WHERE expires_at <= ?", (now,)).rowcount
+            cutoff = now - PENDING_BOOKING_TTL_SECONDS
+            rows = conn.execute(
+                BOOKING_SELECT_SQL + " WHERE status = ? AND created_at <= ?",
+                ('Очікує підтвердження', cutoff)
+            ).fetchall()
+            expired_bookings = [_row_to_booking(row) for row in rows]
+            if expired_bookings:
+                conn.executemany(
+                    "UPDATE bookings SET status = ? WHERE id = ?",
+                    [(EXPIRED_BOOKING_STATUS, b['id']) for b in expired_bookings]
+                )
+            for b in expired_bookings:
+                b['status'] = EXPIRED_BOOKING_STATUS
+                db.after_commit(occupancy.release, b['date'], b['time'], b['cabin'], b['duration'])
+            db.after_commit(slot_holds.purge, now)
+        if holds_removed or expired_bookings:
+            logging.info(f"Прибрано {holds_removed} прострочених утримань і {len(expired_bookings)} непідтверджених бронювань.")
+    except sqlite3.Error as e:
+        logging.error(f"Помилка очищення прострочених утримань: {e}")
+        return []
+    return expired_bookings
+
+
+# --- Масові дії адміністратора ---
+
+# дія -> (статуси, з яких змінюється бронювання, новий статус)
+BULK_ACTIONS = {
+    'confirm': (['Очікує підтвердження'], 'Підтверджено'),
+    'cancel': (ACTIVE_STATUSES, 'Скасовано (адміном)'),
+    'expire': (['Очікує підтвердження'], EXPIRED_BOOKING_STATUS),
+}
+BULK_NOTIFY_CONCURRENCY = 64  # одночасних постановок у чергу відправки; записувач зберігає їх пачками
+
+
+def _select_bulk_targets(conn, action, criteria):
+    """Рядки (бронювання, reminded_at), яких стосується масова дія.
+
+    criteria - словник з необов'язковими date_from, date_to, time,
+    cabins і started_before. started_before відбирає бронювання, що
+    почалися до цього моменту (epoch); в SQL для них обмежується лише
+    верхня межа дати.
+    """
+    from_statuses, _ = BULK_ACTIONS[action]
+    date_from, date_to = criteria.get('date_from'), criteria.get('date_to')
+    booking_time, cabins = criteria.get('time'), criteria.get('cabins')
+    started_before = criteria.get('started_before')
+    conditions = [f"status IN ({','.join('?' for _ in from_statuses)})"]
+    params = list(from_statuses)
+    if started_before is not None:
+        date_to = min(date_to or '9999-12-31', date.fromtimestamp(started_before).isoformat())
+    for condition, value in (("date >= ?", date_from), ("date <= ?", date_to), ("time = ?", booking_time)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    if cabins:
+        conditions.append(f"cabin IN ({','.join('?' for _ in cabins)})")
+        params.extend(cabins)
+    rows = conn.execute(
+        f"{BULK_TARGET_SELECT_SQL} WHERE {' AND '.join(conditions)} ORDER BY date, time, id",
+        params
+    ).fetchall()
+    targets = [(_row_to_booking(row[:-1]), row[-1]) for row in rows]
+    if started_before is not None:
+        targets = [t for t in targets if booking_start_timestamp(t[0]['date'], t[0]['time']) <= started_before]
+    return targets
+
+@observe_db
+def preview_bulk_action(action, criteria):
+    """Бронювання, які змінить масова дія, без змін у БД."""
+    return [booking for booking, _ in _select_bulk_targets(db.connection, action, criteria)]
+
+@observe_db
+def apply_bulk_action(action, criteria):
+    """Виконує масову дію однією транзакцією. Повертає змінені бронювання (з новим статусом)."""
+    _, new_status = BULK_ACTIONS[action]
+    try:
+        with db.transaction() as conn:
+            targets = _select_bulk_targets(conn, action, criteria)
+            conn.executemany(
+                "UPDATE bookings SET status = ? WHERE id = ?",
+                [(new_status, booking['id']) for booking, _ in targets]
+            )
+            for booking, reminded_at in targets:
+                _after_status_change(
+                    booking['id'], booking['date'], booking['time'], booking['cabin'], booking['duration'],
+                    booking['status'], booking['chat_id'], reminded_at, new_status
+                )
+                booking['status'] = new_status
+        if targets:
+            logging.info(f"Масова дія '{action}': статус '{new_status}' для {len(targets)} бронювань.")
+        return [booking for booking, _ in targets]
+    except sqlite3.Error as e:
+        logging.error(f"Помилка масової дії '{action}': {e}")
+        return None
+
+
+# --- Архів бронювань ---
+
+# Статуси, з яких бронювання вже не переходить в інші
+TERMINAL_STATUSES = ['Відхилено', 'Скасовано (адміном)', EXPIRED_BOOKING_STATUS]
+ARCHIVE_INTERVAL_SECONDS = 60 * 60
+ARCHIVE_BATCH_SIZE = 500  # рядків за одну транзакцію, щоб не затримувати записи гостей
+ARCHIVE_MAX_BATCHES = 20  # пачок за один запуск; решта перейде наступного разу
+ARCHIVE_TERMINAL_AFTER_SECONDS = 24 * 60 * 60  # завершені бронювання ще добу лишаються в робочій таблиці
+ARCHIVE_VACUUM_PAGES = 2000
+
+
+@observe_db
+def archive_bookings_batch(limit=ARCHIVE_BATCH_SIZE):
+    """Переносить в архів пачку минулих і давно завершених бронювань. Повертає кількість перенесених.
+
+    Минулі - з датою раніше сьогоднішньої (з індексу за датою),
+    завершені - зі статусом з TERMINAL_STATUSES, створені понад
+    ARCHIVE_TERMINAL_AFTER_SECONDS тому (з індексу (status, created_at)).
+    """
+    now = time.time()
+    today = date.today().isoformat()
+    status_placeholders = ','.join('?' for _ in TERMINAL_STATUSES)
+    try:
+        with db.transaction() as conn:
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM bookings WHERE date < ? LIMIT ?", (today, limit)
+            )]
+            if len(ids) < limit:
+                ids += [row[0] for row in conn.execute(
+                    f"SELECT id FROM bookings WHERE status IN ({status_placeholders}) AND created_at <= ? AND date >= ? LIMIT ?",
+                    (*TERMINAL_STATUSES, now - ARCHIVE_TERMINAL_AFTER_SECONDS, today, limit - len(ids))
+                )]
+            if not ids:
+                return 0
+            id_placeholders = ','.join('?' for _ in ids)
+            # Минулі активні бронювання теж прибираються з індексу зайнятості
+            for booking_date, booking_time, cabin, duration, status in conn.execute(
+                f"SELECT date, time, cabin, duration, status FROM bookings WHERE id IN ({id_placeholders})", ids
+            ):
+                if status in ACTIVE_STATUSES:
+                    db.after_commit(occupancy.release, booking_date, booking_time, cabin, duration)
+            conn.execute(
+                f"INSERT OR REPLACE INTO bookings_archive ({', '.join(BOOKING_COLUMNS)}, created_at, archived_at) "
+                f"SELECT {', '.join(BOOKING_COLUMNS)}, created_at, ? FROM bookings WHERE id IN ({id_placeholders})",
+                (now, *ids)
+            )
+            conn.execute(f"DELETE FROM bookings WHERE id IN ({id_placeholders})", ids)
+            conn.execute(f"DELETE FROM admin_messages WHERE booking_id IN ({id_placeholders})", ids)
+        return len(ids)
+    except sqlite3.Error as e:
+        logging.error(f"Помилка архівації бронювань: {e}")
+        return 0
+
+def incremental_vacuum(pages=ARCHIVE_VACUUM_PAGES):
+    """Повертає файловій системі до pages вільних сторінок.
+
+    sqlite3.execute виконує лише один крок цієї прагми (одну сторінку),
+    тому вона йде через executescript. executescript комітить відкриту
+    транзакцію, тож викликати лише поза db.transaction().
+    """
+    db.connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+
+
+class SlotHolds:
+    """Дзеркало таблиці slot_holds у пам'яті для швидкої фільтрації доступних місць.
+
+    Джерелом істини залишається БД: рішення про утримання і бронювання
+    приймаються в транзакціях, а дзеркало оновлюється після коміту.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_user = {}
+        self._by_slot = {}
+
+    def load(self, rows):
+        with self._lock:
+            self._by_user.clear()
+            self._by_slot.clear()
+            for booking_date, booking_time, cabin, user_id, expires_at in rows:
+                self._hold(user_id, booking_date, booking_time, cabin, expires_at)
+
+    def _hold(self, user_id, booking_date, booking_time, cabin, expires_at):
+        self._release(user_id)
+        self._by_user[user_id] = (booking_date, booking_time, cabin)
+        self._by_slot.setdefault((booking_date, booking_time), {})[cabin] = (user_id, expires_at)
+
+    def _release(self, user_id):
+        held = self._by_user.pop(user_id, None)
+        if held is None:
+            return
+        booking_date, booking_time, cabin = held
+        cabins = self._by_slot.get((booking_date, booking_time))
+        if cabins and cabins.get(cabin, (None,))[0] == user_id:
+            del cabins[cabin]
+            if not cabins:
+                del self._by_slot[(booking_date, booking_time)]
+
+    def hold(self, user_id, booking_date, booking_time, cabin, expires_at):
+        with self._lock:
+            self._hold(user_id, booking_date, booking_time, cabin, expires_at)
+
+    def release(self, user_id):
+        with self._lock:
+            self._release(user_id)
+
+    def purge(self, now):
+        with self._lock:
+            for slot, cabins in list(self._by_slot.items()):
+                for cabin, (user_id, expires_at) in list(cabins.items()):
+                    if expires_at <= now:
+                        self._release(user_id)
+
+    def held_by_others(self, booking_date, booking_time, user_id, duration=None):
+        """Множина кабінок, утримання інших гостей на які перетинається з бронюванням з booking_time."""
+        now = time.time()
+        held = set()
+        for hold_time in venue.overlapping_slots(booking_time, duration or venue.booking_duration):
+            cabins = self._by_slot.get((booking_date, hold_time))
+            if cabins:
+                held.update(cabin for cabin, (holder, expires_at) in list(cabins.items()) if holder != user_id and expires_at > now)
+        return held
+
+
+slot_holds = SlotHolds()
+
+def load_slot_holds():
+    """Завантажує чинні утримання з БД у пам'ять."""
+    try:
+        rows = db.execute(
+            "SELECT date, time, cabin, user_id, expires_at FROM slot_holds WHERE expires_at > ?", (time.time(),)
+        ).fetchall()
+        slot_holds.load(rows)
+    except sqlite3.Error as e:
+        logging.error(f"Помилка завантаження утримань місць: {e}")
+
+# --- Асинхронний доступ до бази даних ---
+
+# Читання виконується у невеликому пулі потоків (WAL дозволяє паралельне читання),
+# усі записи - в одному потоці-записувачі, щоб не блокувати цикл подій asyncio
+DB_READ_WORKERS = 4
+DB_WRITE_BATCH_SIZE = 64
+
+db_read_executor = ThreadPoolExecutor(max_workers=DB_READ_WORKERS, thread_name_prefix="db-read")
+db_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+
+async def run_db_read(func, *args):
+    """Виконує синхронну функцію читання з БД у пулі потоків читання."""
+    loop = asyncio.get_running_loop()
+    trace = _current_trace.get()
+    if trace is None:
+        return await loop.run_in_executor(db_read_executor, functools.partial(func, *args))
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(db_read_executor, functools.partial(func, *args))
+    finally:
+        trace.span("db", func.__name__, started)
+
+
+class DatabaseWriter:
+    """Черга записів з одним записувачем.
+
+    Записи, що надійшли одночасно, об'єднуються в одну транзакцію
+    (кожен - у власній точці збереження), тож під навантаженням
+    робиться один коміт на пачку замість коміту на кожен запис.
+    """
+
+    def __init__(self, max_batch=DB_WRITE_BATCH_SIZE):
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, func, *args):
+        """Ставить функцію запису в чергу і чекає на її результат."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        trace = _current_trace.get()
+        if trace is None:
+            await self._queue.put((func, args, future))
+            return await future
+        # У трасування потрапляє і час очікування в черзі записувача
+        started = time.perf_counter()
+        try:
+            await self._queue.put((func, args, future))
+            return await future
+        finally:
+            trace.span("db", func.__name__, started)
+
+    @staticmethod
+    def _apply_batch(batch):
+        results = []
+        try:
+            with db.transaction():
+                for func, args, _ in batch:
+                    try:
+                        results.append((func(*args), None))
+                    except Exception as e:
+                        results.append((None, e))
+        except sqlite3.Error as e:
+            # Коміт пачки не вдався - повідомляємо про помилку всім записам
+            logging.error(f"Помилка коміту пачки записів у БД: {e}")
+            return [(None, e)] * len(batch)
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            results = await loop.run_in_executor(db_write_executor, self._apply_batch, batch)
+            for (_, _, future), (result, error) in zip(batch, results):
+                self._queue.task_done()
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    async def stop(self):
+        """Дочікується запису всіх поставлених у чергу змін і зупиняє записувача."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+db_writer = DatabaseWriter()
+
+# --- Сховище даних ---
+
+class Storage(ABC):
+    """Інтерфейс сховища бронювань, гостей і відгуків.
+
+    Обробники і фонові завдання звертаються до даних лише через ці
+    асинхронні методи. Реалізації: SQLiteStorage (за замовчуванням) і
+    SharedSQLiteStorage для кількох процесів зі спільною БД. Методи без
+    типової поведінки абстрактні, тож реалізацію, якій бракує методу,
+    не вдасться навіть створити.
+    """
+
+    name = None
+
+    @abstractmethod
+    def open(self):
+        """Готує сховище при старті процесу: схема, індекси в пам'яті, сесії."""
+        raise NotImplementedError
+
+    async def refresh(self):
+        """Підхоплює зміни, зроблені іншими процесами; повертає True, якщо вони були."""
+        return False
+
+    # Бронювання
+
+    @abstractmethod
+    async def get_bookings(self, filters=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_booking(self, booking_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_active_bookings_page(self, after_id=0, before_id=None, date_from=None, date_to=None, limit=5):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_user_bookings(self, user_id, upcoming=True, limit=10):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_booking(self, booking_data):
+        """Додає бронювання і повертає його id; SlotUnavailableError, якщо місце вже зайняте."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_booking_status(self, booking_id, new_status, expected_statuses=None):
+        """Змінює статус; з expected_statuses - лише якщо поточний статус серед них. Повертає bool."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_admin_messages(self, booking_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def preview_bulk_action(self, action, criteria):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def apply_bulk_action(self, action, criteria):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def place_hold(self, booking_date, booking_time, cabin, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def release_hold(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def sweep_expired_reservations(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def archive_bookings(self):
+        raise NotImplementedError
+
+    # Гості
+
+    @abstractmethod
+    async def get_user_contact(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_user_contact(self, user_id, name, contact):
+        raise NotImplementedError
+
+    # Відгуки
+
+    @abstractmethod
+    async def save_review(self, user_id, rating, comment):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_review_stats(self):
+        raise NotImplementedError
+
+
+class SQLiteStorage(Storage):
+    """Сховище за замовчуванням: файл SQLite, з яким працює один процес бота.
+
+    Читання йде в пулі потоків, записи - через db_writer пачками в
+    одній транзакції.
+    """
+
+    name = "sqlite"
+
+    def open(self):
+        init_db()
+        load_occupancy()
+        load_slot_holds()
+        load_booking_sessions()
+        load_contact_cache()
+
+    async def get_bookings(self, filters=None):
+        return await run_db_read(get_bookings_from_db, filters)
+
+    async def get_booking(self, booking_id):
+        return await run_db_read(get_booking_by_id, booking_id)
+
+    async def get_active_bookings_page(self, after_id=0, before_id=None, date_from=None, date_to=None, limit=5):
+        return await run_db_read(get_active_bookings_page, after_id, before_id, date_from, date_to, limit)
+
+    async def get_user_bookings(self, user_id, upcoming=True, limit=10):
+        return await run_db_read(get_user_bookings, user_id, upcoming, limit)
+
+    async def add_booking(self, booking_data):
+        return await db_writer.submit(add_booking_to_db, booking_data)
+
+    async def update_booking_status(self, booking_id, new_status, expected_statuses=None):
+        return await db_writer.submit(update_booking_status_in_db, booking_id, new_status, expected_statuses)
+
+    async def get_admin_messages(self, booking_ids):
+        return await run_db_read(get_admin_messages, booking_ids)
+
+    async def preview_bulk_action(self, action, criteria):
+        return await run_db_read(preview_bulk_action, action, criteria)
+
+    async def apply_bulk_action(self, action, criteria):
+        return await db_writer.submit(apply_bulk_action, action, criteria)
+
+    async def place_hold(self, booking_date, booking_time, cabin, user_id):
+        return await db_writer.submit(place_hold, booking_date, booking_time, cabin, user_id)
+
+    async def release_hold(self, user_id):
+        return await db_writer.submit(release_hold, user_id)
+
+    async def sweep_expired_reservations(self):
+        return await db_writer.submit(sweep_expired_reservations)
+
+    async def archive_bookings(self):
+        """Архівує пачками не більше ARCHIVE_MAX_BATCHES * ARCHIVE_BATCH_SIZE бронювань і звільняє місце у файлі БД."""
+        archived = 0
+        for _ in range(ARCHIVE_MAX_BATCHES):
+            moved = await db_writer.submit(archive_bookings_batch)
+            archived += moved
+            if moved < ARCHIVE_BATCH_SIZE:
+                break
+        if archived:
+            # У потоці записувача, між пачками записів - поза будь-якою транзакцією
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(db_write_executor, incremental_vacuum)
+            except sqlite3.Error as e:
+                logging.error(f"Помилка інкрементального VACUUM: {e}")
+        return archived
+
+    async def get_user_contact(self, user_id):
+        found, contact = contact_cache.get(user_id)
+        if found:
+            return contact
+        generation = contact_cache.generation
+        contact = await run_db_read(get_user_contact, user_id)
+        contact_cache.fill(user_id, contact, generation)
+        return contact
+
+    async def save_user_contact(self, user_id, name, contact):
+        return await db_writer.submit(save_user_contact, user_id, name, contact)
+
+    async def save_review(self, user_id, rating, comment):
+        return await db_writer.submit(save_review, user_id, rating, comment)
+
+    async def get_review_stats(self):
+        return await run_db_read(get_review_stats)
+
+
+class SharedSQLiteStorage(SQLiteStorage):
+    """Файл SQLite, спільний для кількох процесів бота (наприклад, webhook-воркерів на одній машині).
+
+    - Транзакції починаються з BEGIN IMMEDIATE з очікуванням
+      DB_BUSY_TIMEOUT_MS і повтором (див. Database), тож записи процесів
+      серіалізуються блокуванням SQLite без помилок SQLITE_BUSY.
+    - Перевірки перетину бронювань і утримань робляться в SQL у тій самій
+      транзакції, що й запис, тому вони коректні між процесами; індекси
+      в пам'яті лише пришвидшують підбір місць і перечитуються, коли
+      PRAGMA data_version показує коміти інших процесів.
+    - Нагадування надсилає той процес, що першим позначив його в БД.
+    - Контакти, які зберіг інший процес, скидаються з кешу контактів за
+      users.updated_at; вікно в DB_BUSY_TIMEOUT_MS покриває транзакції,
+      закомічені пізніше, ніж у них записано час.
+    - Повідомлення черги відправки належать процесу з WORKER_ID, і після
+      перезапуску він дочитує лише свої, тож WORKER_ID має бути різним
+      і сталим для кожного воркера.
+
+    Розмова гостя і його незавершене бронювання живуть у пам'яті
+    процесу, тож балансувальник має надсилати оновлення одного
+    користувача в той самий воркер (наприклад, за user_id).
+    """
+
+    name = "shared-sqlite"
+
+    def __init__(self):
+        self._data_version = None
+        self._contacts_checked_at = 0
+
+    def open(self):
+        db.immediate = True
+        db.lock_retries = DB_LOCK_RETRIES
+        self._contacts_checked_at = time.time()
+        super().open()
+
+    def _invalidate_contacts(self):
+        checked_at = time.time()
+        rows = db.execute(
+            "SELECT user_id FROM users WHERE updated_at > ?", (self._contacts_checked_at - DB_BUSY_TIMEOUT_MS / 1000,)
+        ).fetchall()
+        contact_cache.invalidate([row[0] for row in rows])
+        self._contacts_checked_at = checked_at
+
+    def _refresh_indexes(self):
+        # Виконується в потоці записувача: data_version його з'єднання не змінюють власні коміти,
+        # а між пачками немає відкритої транзакції і невиконаних after_commit
+        # Перша перевірка теж перечитує індекси: між open() і нею могли писати інші процеси
+        version = db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        load_occupancy()
+        load_slot_holds()
+        self._invalidate_contacts()
+        return True
+
+    async def refresh(self):
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(db_write_executor, self._refresh_indexes):
+            return False
+        await reminders.reload()
+        return True
+
+
+STORAGE_BACKENDS = {backend.name: backend for backend in (SQLiteStorage, SharedSQLiteStorage)}
+
+if STORAGE_BACKEND not in STORAGE_BACKENDS:
+    logging.critical(f"Невідомий STORAGE_BACKEND: {STORAGE_BACKEND}.")
+    raise ValueError(f"Невідомий STORAGE_BACKEND: {STORAGE_BACKEND}.")
+storage = STORAGE_BACKENDS[STORAGE_BACKEND]()
+
+# --- Черга вихідних повідомлень ---
+
+# Обмеження Telegram: близько 30 повідомлень на секунду загалом,
+# не частіше одного на секунду в особистий чат і 20 на хвилину в групу
+OUTBOX_GLOBAL_RATE = 30
+OUTBOX_PRIVATE_CHAT_RATE = 1
+OUTBOX_GROUP_CHAT_RATE = 20 / 60
+OUTBOX_MAX_IN_FLIGHT = 8
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_MAX_BACKOFF_SECONDS = 300
+
+# Класи пріоритету: менше значення відправляється раніше
+PRIORITY_ADMIN = 0
+PRIORITY_GUEST = 1
+
+
+@observe_db
+def outbox_insert(chat_id, text, reply_markup, priority, created_at, booking_id=None):
+    """Зберігає повідомлення в черзі відправки. Повертає його id."""
+    try:
+        with db.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (chat_id, text, reply_markup, priority, next_attempt_at, created_at, booking_id, owner) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (chat_id, text, reply_markup, priority, created_at, created_at, booking_id, WORKER_ID)
+            )
+            return cursor.lastrowid
+    except sqlite3.Error as e:
+        logging.error(f"Помилка збереження повідомлення для {chat_id} у черзі: {e}")
+        return None
+
+@observe_db
+def outbox_mark_sent(message_id, booking_id=None, chat_id=None, telegram_message_id=None):
+    """Видаляє доставлене повідомлення з черги.
+
+    Для сповіщень адміністраторам про бронювання запам'ятовує id
+    повідомлення в Telegram, щоб потім відредагувати цю копію.
+    """
+    try:
+        with db.transaction() as conn:
+            if message_id is not None:
+                conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+            if booking_id is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO admin_messages (booking_id, chat_id, message_id) VALUES (?, ?, ?)",
+                    (booking_id, chat_id, telegram_message_id)
+                )
+    except sqlite3.Error as e:
+        logging.error(f"Помилка видалення повідомлення {message_id} з черги: {e}")
+
+@observe_db
+def outbox_reschedule(message_id, attempts, next_attempt_at, error):
+    """Записує невдалу спробу і час наступної."""
+    try:
+        with db.transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, next_attempt_at, error, message_id)
+            )
+    except sqlite3.Error as e:
+        logging.error(f"Помилка оновлення повідомлення {message_id} у черзі: {e}")
+
+@observe_db
+def outbox_mark_failed(message_id, error):
+    """Позначає повідомлення як остаточно недоставлене."""
+    try:
+        with db.transaction() as conn:
+            conn.execute("UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?", (error, message_id))
+    except sqlite3.Error as e:
+        logging.error(f"Помилка оновлення повідомлення {message_id} у черзі: {e}")
+
+def load_pending_outbox():
+    """Повертає недоставлені повідомлення цього процесу, що лишилися з попереднього запуску."""
+    return db.execute(
+        "SELECT id, chat_id, text, reply_markup, priority, attempts, next_attempt_at, booking_id "
+        "FROM outbox WHERE owner = ? AND status = 'pending' ORDER BY id",
+        (WORKER_ID,)
+    ).fetchall()
+
+@observe_db
+def get_admin_messages(booking_ids):
+    """Повертає [(booking_id, chat_id, message_id)] копій сповіщень про бронювання в чатах адміністраторів."""
+    booking_ids = list(booking_ids)
+    if not booking_ids:
+        return []
+    return db.execute(
+        f"SELECT booking_id, chat_id, message_id FROM admin_messages WHERE booking_id IN ({','.join('?' for _ in booking_ids)})",
+        booking_ids
+    ).fetchall()
+
+
+class TokenBucket:
+    """Відро токенів: rate токенів на секунду, не більше capacity в запасі."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Скільки секунд лишилося до появи токена (0, якщо він вже є)."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def block(self, seconds):
+        """Забороняє відправку на seconds секунд (після RetryAfter від Telegram)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and time.monotonic() >= self.blocked_until
+
+
+class OutboxMessage:
+    __slots__ = ('id', 'chat_id', 'text', 'reply_markup', 'priority', 'attempts', 'next_attempt_at', 'booking_id')
+
+    def __init__(self, id, chat_id, text, reply_markup, priority, attempts=0, next_attempt_at=0.0, booking_id=None):
+        self.id = id
+        self.chat_id = chat_id
+        self.text = text
+        self.reply_markup = reply_markup
+        self.priority = priority
+        self.attempts = attempts
+        self.next_attempt_at = next_attempt_at
+        self.booking_id = booking_id
+
+
+class Outbox:
+    """Доставка вихідних повідомлень з обмеженням швидкості, пріоритетами і повторами.
+
+    Обробники лише ставлять повідомлення в чергу (воно одразу
+    зберігається в таблиці outbox) і не чекають на Telegram. Окреме
+    завдання відправляє готові повідомлення в порядку пріоритету,
+    дотримуючись загального ліміту і лімітів на кожен чат.
+
+    Кожне повідомлення доставляється не більше одного разу. Після помилки
+    мережі чи таймауту з'єднання запит точно не дійшов до Telegram, тож
+    його повторюють. Якщо ж Telegram не відповів на вже надісланий запит,
+    повідомлення могло бути доставлене. Його позначають невдалим і не
+    повторюють, щоб гість чи адміністратор не отримав його двічі.
+    """
+
+    def __init__(self, max_in_flight=OUTBOX_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._ready = []    # (пріоритет, порядковий номер, повідомлення)
+        self._delayed = []  # (час наступної спроби, порядковий номер, повідомлення)
+        self._seq = itertools.count()
+        self._global_bucket = TokenBucket(OUTBOX_GLOBAL_RATE, OUTBOX_GLOBAL_RATE)
+        self._chat_buckets = {}
+        self._in_flight = set()
+        self._bot = None
+        self._task = None
+        self._wakeup = None
+        self._slots = None
+
+    def __len__(self):
+        return len(self._ready) + len(self._delayed) + len(self._in_flight)
+
+    async def start(self, bot):
+        """Запускає відправку і підхоплює недоставлене з попереднього запуску."""
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        try:
+            rows = await run_db_read(load_pending_outbox)
+        except sqlite3.Error as e:
+            logging.error(f"Помилка завантаження черги повідомлень: {e}")
+            rows = []
+        # Повідомлення, поставлені в чергу до запуску, вже є і в пам'яті, і в БД
+        queued = {message.id for _, _, message in self._ready + self._delayed}
+        for message_id, chat_id, text, reply_markup, priority, attempts, next_attempt_at, booking_id in rows:
+            if message_id in queued:
+                continue
+            self._push(OutboxMessage(message_id, chat_id, text, reply_markup, priority, attempts, next_attempt_at, booking_id))
+        if rows:
+            logging.info(f"У черзі відправки відновлено {len(rows)} повідомлень.")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Зупиняє відправку. Недоставлене лишається в таблиці outbox."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._in_flight:
+            await asyncio.wait(self._in_flight, timeout=5)
+
+    async def send(self, chat_id, text, reply_markup=None, priority=PRIORITY_GUEST, booking_id=None):
+        """Ставить повідомлення в чергу відправки.
+
+        booking_id позначає сповіщення адміністратору про бронювання: після
+        доставки id повідомлення зберігається в admin_messages.
+        """
+        markup_json = reply_markup.to_json() if reply_markup is not None else None
+        now = time.time()
+        message_id = await db_writer.submit(outbox_insert, chat_id, text, markup_json, priority, now, booking_id)
+        self._push(OutboxMessage(message_id, chat_id, text, markup_json, priority, 0, now, booking_id))
+
+    def _push(self, message):
+        if message.next_attempt_at > time.time():
+            heapq.heappush(self._delayed, (message.next_attempt_at, next(self._seq), message))
+        else:
+            heapq.heappush(self._ready, (message.priority, next(self._seq), message))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10_000:
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.idle}
+            rate = OUTBOX_GROUP_CHAT_RATE if isinstance(chat_id, str) or chat_id < 0 else OUTBOX_PRIVATE_CHAT_RATE
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, 1)
+        return bucket
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, message = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (message.priority, next(self._seq), message))
+
+            if not self._ready:
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, message = heapq.heappop(self._ready)
+            chat_wait = self._chat_bucket(message.chat_id).wait_time()
+            if chat_wait > 0:
+                # Цей чат вичерпав ліміт - повідомлення чекає, інші чати йдуть далі
+                message.next_attempt_at = now + chat_wait
+                heapq.heappush(self._delayed, (message.next_attempt_at, next(self._seq), message))
+                continue
+
+            global_wait = self._global_bucket.wait_time()
+            if global_wait > 0:
+                heapq.heappush(self._ready, (message.priority, next(self._seq), message))
+                await asyncio.sleep(global_wait)
+                continue
+
+            self._global_bucket.consume()
+            self._chat_bucket(message.chat_id).consume()
+            await self._slots.acquire()
+            task = asyncio.get_running_loop().create_task(self._deliver(message))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _deliver(self, message):
+        try:
+            reply_markup = None
+            if message.reply_markup:
+                reply_markup = InlineKeyboardMarkup.de_json(json.loads(message.reply_markup), self._bot)
+            sent = await self._bot.send_message(chat_id=message.chat_id, text=message.text, reply_markup=reply_markup)
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+            logging.warning(f"Telegram просить зачекати {retry_after} с перед відправкою в чат {message.chat_id}.")
+            self._chat_bucket(message.chat_id).block(retry_after)
+            await self._retry_later(message, retry_after, str(e))
+        except BadRequest as e:
+            await self._fail(message, str(e))
+        except TimedOut as e:
+            if isinstance(e.__cause__, (httpx.ConnectTimeout, httpx.PoolTimeout)):
+                await self._retry_network_error(message, e)
+            else:
+                await self._fail(message, f"Telegram не відповів, повідомлення могло бути доставлене: {e}")
+        except NetworkError as e:
+            await self._retry_network_error(message, e)
+        except Exception as e:
+            await self._fail(message, str(e))
+        else:
+            if message.booking_id is not None:
+                await db_writer.submit(outbox_mark_sent, message.id, message.booking_id, message.chat_id, sent.message_id)
+            elif message.id is not None:
+                await db_writer.submit(outbox_mark_sent, message.id)
+        finally:
+            self._slots.release()
+
+    async def _retry_network_error(self, message, error):
+        message.attempts += 1
+        if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+            await self._fail(message, str(error))
+        else:
+            backoff = min(OUTBOX_MAX_BACKOFF_SECONDS, 2 ** message.attempts)
+            logging.warning(f"Помилка мережі при відправці в чат {message.chat_id}, повтор через {backoff} с: {error}")
+            await self._retry_later(message, backoff, str(error))
+
+    async def _retry_later(self, message, delay, error):
+        message.next_attempt_at = time.time() + delay
+        if message.id is not None:
+            await db_writer.submit(outbox_reschedule, message.id, message.attempts, message.next_attempt_at, error)
+        self._push(message)
+
+    async def _fail(self, message, error):
+        logging.error(f"Не вдалося доставити повідомлення в чат {message.chat_id}: {error}")
+        if message.id is not None:
+            await db_writer.submit(outbox_mark_failed, message.id, error)
+
+
+outbox = Outbox()
+
+# --- Сповіщення адміністраторів ---
+
+async def gather_bounded(coroutines, limit):
+    """Виконує корутини одночасно, не більше limit водночас."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+async def notify_admins(text, reply_markup=None, booking_id=None):
+    """Ставить сповіщення в чергу відправки кожному адміністратору.
+
+    Постановки йдуть одночасно, тож записувач зберігає їх однією
+    транзакцією; доставку паралелить і обмежує сама черга.
+    """
+    await gather_bounded(
+        (outbox.send(chat_id, text, reply_markup=reply_markup, priority=PRIORITY_ADMIN, booking_id=booking_id)
+         for chat_id in ADMINS),
+        ADMIN_FANOUT_CONCURRENCY
+    )
+
+async def sync_admin_copies(bot, texts, skip=None):
+    """Замінює текст і прибирає кнопки в усіх копіях сповіщень про бронювання.
+
+    texts - {id бронювання: новий текст}; skip - (chat_id, message_id)
+    копії, яку вже відредагував обробник. Редагування йдуть напряму, не
+    через чергу: на кожне бронювання по копії в чаті кожного адміністратора.
+    """
+    copies = [
+        (texts[booking_id], chat_id, message_id)
+        for booking_id, chat_id, message_id in await storage.get_admin_messages(texts)
+        if (chat_id, message_id) != skip
+    ]
+
+    async def edit(text, chat_id, message_id):
+        try:
+            await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+        except BadRequest as e:
+            if "not modified" not in str(e):
+                logging.warning(f"Не вдалося оновити сповіщення {message_id} у чаті {chat_id}: {e}")
+        except NetworkError as e:
+            logging.warning(f"Не вдалося оновити сповіщення {message_id} у чаті {chat_id}: {e}")
+
+    await gather_bounded((edit(*copy) for copy in copies), ADMIN_FANOUT_CONCURRENCY)
+
+async def notify_guests(bookings, make_text):
+    """Ставить у чергу відправки повідомлення гостям змінених бронювань."""
+    await gather_bounded(
+        (outbox.send(booking['chat_id'], make_text(booking)) for booking in bookings),
+        BULK_NOTIFY_CONCURRENCY
+    )
+
+# --- Нагадування про бронювання ---
+
+REMINDER_LEAD_SECONDS = 2 * 60 * 60  # за скільки до початку бронювання надсилається нагадування
+
+
+def booking_start_timestamp(booking_date, booking_time):
+    """Час початку бронювання (місцевий час сервера) у секундах epoch."""
+    return datetime.strptime(f"{booking_date} {booking_time}", "%Y-%m-%d %H:%M").timestamp()
+
+@observe_db
+def load_pending_reminders():
+    """Підтверджені бронювання від сьогодні, про які ще не нагадали (один запит за індексом дати)."""
+    return db.execute(
+        "SELECT id, chat_id, date, time, cabin FROM bookings "
+        "WHERE date >= ? AND +status = 'Підтверджено' AND reminded_at IS NULL",
+        (date.today().isoformat(),)
+    ).fetchall()
+
+@observe_db
+def claim_booking_reminders(booking_ids, reminded_at):
+    """Позначає нагадування надісланими і повертає id, які позначив саме цей виклик.
+
+    Бронювання, про яке вже нагадав інший процес зі спільною БД (або яке
+    тим часом перестало бути підтвердженим), не повертається, тож
+    нагадування надсилає лише один процес.
+    """
+    claimed = []
+    try:
+        with db.transaction() as conn:
+            for booking_id in booking_ids:
+                cursor = conn.execute(
+                    "UPDATE bookings SET reminded_at = ? "
+                    "WHERE id = ? AND reminded_at IS NULL AND status = 'Підтверджено'",
+                    (reminded_at, booking_id)
+                )
+                if cursor.rowcount:
+                    claimed.append(booking_id)
+    except sqlite3.Error as e:
+        logging.error(f"Помилка позначення нагадувань для бронювань {booking_ids}: {e}")
+        return []
+    return claimed
+
+
+class ReminderScheduler:
+    """Нагадування гостям за REMINDER_LEAD_SECONDS до початку підтвердженого бронювання.
+
+    Розклад будується одним запитом при старті і далі живе в пам'яті:
+    купа (час нагадування, id бронювання) і одне завдання, що спить до
+    найближчого нагадування. Зміни статусу приходять після коміту з
+    потоку записувача, тому розклад захищений замком, а завдання
+    будиться через call_soon_threadsafe. Скасовані й перенесені записи
+    лишаються в купі і пропускаються при вийманні.
+    """
+
+    def __init__(self, lead_seconds=REMINDER_LEAD_SECONDS):
+        self.lead_seconds = lead_seconds
+        self._lock = threading.Lock()
+        self._heap = []     # (час нагадування, id бронювання)
+        self._pending = {}  # id бронювання -> (час нагадування, chat_id, дата, час, кабінка)
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def start(self):
+        """Завантажує розклад з БД і запускає відправку."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        await self.reload()
+        logging.info(f"Заплановано {len(self._pending)} нагадувань.")
+        self._task = self._loop.create_task(self._run())
+
+    async def reload(self):
+        """Перебудовує розклад з БД (після змін, зроблених іншими процесами)."""
+        try:
+            rows = await run_db_read(load_pending_reminders)
+        except sqlite3.Error as e:
+            logging.error(f"Помилка завантаження нагадувань: {e}")
+            return
+        with self._lock:
+            self._heap.clear()
+            self._pending.clear()
+        for row in rows:
+            self.schedule(*row)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def schedule(self, booking_id, chat_id, booking_date, booking_time, cabin):
+        """Планує (або переносить) нагадування. Бронювання, що вже почалися, пропускаються."""
+        starts_at = booking_start_timestamp(booking_date, booking_time)
+        if starts_at <= time.time():
+            return
+        due_at = starts_at - self.lead_seconds
+        with self._lock:
+            self._pending[booking_id] = (due_at, chat_id, booking_date, booking_time, cabin)
+            heapq.heappush(self._heap, (due_at, booking_id))
+            earliest = self._heap[0][1] == booking_id
+        if earliest:
+            self._wake()
+
+    def cancel(self, booking_id):
+        with self._lock:
+            self._pending.pop(booking_id, None)
+
+    def _wake(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _pop_due(self, now):
+        """Виймає нагадування, час яких настав; повертає їх і секунди до наступного."""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_at, booking_id = heapq.heappop(self._heap)
+                entry = self._pending.get(booking_id)
+                if entry is None or entry[0] != due_at:
+                    continue  # скасоване або перенесене
+                del self._pending[booking_id]
+                due.append((booking_id, *entry[1:]))
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+        return due, timeout
+
+    async def _run(self):
+        while True:
+            due, timeout = self._pop_due(time.time())
+            due = [entry for entry in due if booking_start_timestamp(entry[2], entry[3]) > time.time()]
+            # Спершу позначаємо в БД, потім ставимо в чергу: повідомлення в черзі переживає перезапуск,
+            # а нагадування, яке вже взяв інший процес, тут не надсилається
+            claimed = set(await db_writer.submit(claim_booking_reminders, [entry[0] for entry in due], time.time())) if due else ()
+            for booking_id, chat_id, booking_date, booking_time, cabin in due:
+                if booking_id not in claimed:
+                    continue
+                await outbox.send(
+                    chat_id,
+                    f"⏰ Нагадуємо: ваше бронювання {format_date(booking_date)} о {booking_time} ({cabin}). Чекаємо на вас!\n"
+                    f"Якщо плани змінилися, зателефонуйте нам: {venue.admin_phone}"
+                )
+            if due:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+reminders = ReminderScheduler()
+
+# --- Індекс зайнятості кабінок ---
+
+class OccupancyIndex:
+    """Зайнятість кабінок у пам'яті: інтервальний індекс бронювань.
+
+    На кожну пару (дата, кабінка) - відсортований список інтервалів
+    (початок, кінець) у хвилинах від півночі. Жоден інтервал не довший
+    за найдовше бронювання, тож перетини з [start, end) шукаються двома
+    бісекціями серед інтервалів, що почалися в (start - найдовше, end).
+    Кабінки ключуються назвою, а не позицією в налаштуваннях, тож індекс
+    переживає перезавантаження venue без перебудови. Завантажується з БД
+    один раз при старті і далі оновлюється після кожного коміту, що
+    змінює активні бронювання, тож перевірка доступності не звертається
+    до бази. Минулі дні в індексі не зберігаються: їх уже не бронюють.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_date = {}  # дата -> {назва кабінки: [(початок, кінець), ...]}
+        self._max_duration = BOOKING_DURATION_MINUTES
+        self._first_date = ''  # дати до цієї ("рррр-мм-дд") минули і не індексуються
+
+    def load(self, bookings, first_date=''):
+        """Перебудовує індекс зі списку активних бронювань на дати від first_date."""
+        with self._lock:
+            self._by_date.clear()
+            self._first_date = first_date
+            for b in bookings:
+                self._occupy(b['date'], b['time'], b['cabin'], b.get('duration') or venue.booking_duration)
+
+    def drop_before(self, first_date):
+        """Прибирає з індексу дні до first_date, що вже минули."""
+        with self._lock:
+            self._first_date = max(self._first_date, first_date)
+            for booking_date in [d for d in self._by_date if d < self._first_date]:
+                del self._by_date[booking_date]
+
+    def _occupy(self, booking_date, booking_time, cabin, duration):
+        if booking_date < self._first_date:
+            return
+        start = slot_minutes(booking_time)
+        self._max_duration = max(self._max_duration, duration)
+        bisect.insort(self._by_date.setdefault(booking_date, {}).setdefault(cabin, []), (start, start + duration))
+
+    def occupy(self, booking_date, booking_time, cabin, duration=None):
+        with self._lock:
+            self._occupy(booking_date, booking_time, cabin, duration or venue.booking_duration)
+
+    def release(self, booking_date, booking_time, cabin, duration=None):
+        start = slot_minutes(booking_time)
+        interval = (start, start + (duration or venue.booking_duration))
+        with self._lock:
+            cabins = self._by_date.get(booking_date)
+            intervals = cabins.get(cabin) if cabins else None
+            if not intervals:
+                return
+            i = bisect.bisect_left(intervals, interval)
+            if i == len(intervals) or intervals[i] != interval:
+                return
+            del intervals[i]
+            if not intervals:
+                del cabins[cabin]
+                if not cabins:
+                    del self._by_date[booking_date]
+
+    def _overlaps(self, intervals, start, end):
+        lo = bisect.bisect_right(intervals, (start - self._max_duration, end))
+        hi = bisect.bisect_left(intervals, (end,))
+        return any(interval_end > start for _, interval_end in intervals[lo:hi])
+
+    def busy_mask(self, booking_date, booking_time, duration=None, cabin_index=None):
+        """Бітова маска кабінок (за позиціями в cabin_index), зайнятих хоча б частину часу [booking_time, +duration)."""
+        cabins = self._by_date.get(booking_date)
+        if not cabins:
+            return 0
+        if cabin_index is None:
+            cabin_index = venue.cabin_index
+        start = slot_minutes(booking_time)
+        end = start + (duration or venue.booking_duration)
+        mask = 0
+        for cabin, intervals in list(cabins.items()):
+            idx = cabin_index.get(cabin)
+            if idx is not None and self._overlaps(intervals, start, end):
+                mask |= 1 << idx
+        return mask
+
+    def is_free(self, booking_date, booking_time, cabin, duration=None):
+        intervals = self._by_date.get(booking_date, {}).get(cabin)
+        start = slot_minutes(booking_time)
+        return not intervals or not self._overlaps(intervals, start, start + (duration or venue.booking_duration))
+
+    def available_cabins(self, booking_date, booking_time, duration=None):
+        """Доступні вільні кабінки на дату і час у порядку налаштувань."""
+        current = venue
+        return list(current.free_cabins(self.busy_mask(booking_date, booking_time, duration, current.cabin_index)))
+
+
+occupancy = OccupancyIndex()
+
+def load_occupancy():
+    """Завантажує індекс зайнятості з активних бронювань у БД від сьогодні."""
+    today = date.today().isoformat()
+    occupancy.load(get_bookings_from_db(filters={'status': ACTIVE_STATUSES, 'date_from': today}), today)
+    logging.info("Індекс зайнятості кабінок завантажено.")
+
+# --- Сесії бронювання та збереження розмов ---
+
+SESSION_TTL_SECONDS = 6 * 60 * 60  # після цього незавершене бронювання вважається покинутим
+SESSION_MAX_ENTRIES = 10_000  # ліміт сесій у пам'яті, найдавніші витісняються
+SESSION_FLUSH_INTERVAL_SECONDS = 10  # як часто зміни сесій і розмов пишуться в БД
+
+
+class SessionStore:
+    """Дані незавершених бронювань з TTL і LRU-витісненням.
+
+    Поводиться як словник user_id -> дані бронювання. Кожне звернення
+    продовжує TTL і позначає сесію зміненою; змінені сесії пачкою
+    записуються в БД раз на SESSION_FLUSH_INTERVAL_SECONDS. Сесії,
+    витіснені за TTL чи лімітом, окремо позначаються витісненими: разом з
+    ними з БД прибирається і збережений стан розмови гостя.
+    """
+
+    def __init__(self, ttl=SESSION_TTL_SECONDS, max_entries=SESSION_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user_id -> [дані, час закінчення]
+        self._dirty = set()
+        self._deleted = set()
+        self._evicted = set()
+
+    def _entry(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        now = time.time()
+        if entry[1] <= now:
+            self._drop(user_id, evicted=True)
+            return None
+        entry[1] = now + self.ttl
+        self._entries.move_to_end(user_id)
+        self._dirty.add(user_id)
+        return entry
+
+    def _drop(self, user_id, evicted=False):
+        self._entries.pop(user_id, None)
+        self._dirty.discard(user_id)
+        self._deleted.add(user_id)
+        if evicted:
+            self._evicted.add(user_id)
+
+    def __getitem__(self, user_id):
+        entry = self._entry(user_id)
+        if entry is None:
+            raise KeyError(user_id)
+        return entry[0]
+
+    def __setitem__(self, user_id, data):
+        self._entries[user_id] = [data, time.time() + self.ttl]
+        self._entries.move_to_end(user_id)
+        self._dirty.add(user_id)
+        self._deleted.discard(user_id)
+        self._evicted.discard(user_id)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)), evicted=True)
+
+    def __contains__(self, user_id):
+        return self._entry(user_id) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id, default=None):
+        entry = self._entry(user_id)
+        return default if entry is None else entry[0]
+
+    def pop(self, user_id, default=None):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return default
+        self._drop(user_id)
+        return entry[0]
+
+    def purge_expired(self):
+        """Видаляє сесії з минулим TTL. Повертає кількість видалених."""
+        now = time.time()
+        expired = [user_id for user_id, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for user_id in expired:
+            self._drop(user_id, evicted=True)
+        return len(expired)
+
+    def load(self, rows):
+        """Відновлює сесії з рядків (user_id, дані, час останнього оновлення)."""
+        self._entries.clear()
+        for user_id, data, updated_at in rows:
+            self._entries[user_id] = [data, updated_at + self.ttl]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def take_changes(self):
+        """Забирає накопичені зміни для запису в БД: (оновлення, видалення, витіснення)."""
+        now = time.time()
+        upserts = [
+            (user_id, json.dumps(self._entries[user_id][0], ensure_ascii=False), now)
+            for user_id in self._dirty if user_id in self._entries
+        ]
+        deletes = [(user_id,) for user_id in self._deleted]
+        evictions = [(user_id,) for user_id in self._evicted]
+        self._dirty.clear()
+        self._deleted.clear()
+        self._evicted.clear()
+        return upserts, deletes, evictions
+
+
+# Тимчасове зберігання даних бронювання для кожного користувача
+user_booking_data = SessionStore()
+
+def load_booking_sessions():
+    """Завантажує незавершені бронювання, що пережили перезапуск."""
+    cutoff = time.time() - SESSION_TTL_SECONDS
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO bookings (user_id, name, nickname, date, time, guests, cabin, contact, status, chat_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            booking_data['user_id'],
-            booking_data['name'],
-            booking_data.get('nickname', ''),
-            booking_data['date'],
-            booking_data['time'],
-            booking_data['guests'],
-            booking_data['cabin'],
-            booking_data['contact'],
-            booking_data['status'],
-            booking_data['chat_id']
-        ))
-        booking_id = cursor.lastrowid
-        conn.commit()
-        logging.info(f"Бронювання {booking_id} додано до БД.")
+        with db.transaction() as conn:
+            conn.execute("DELETE FROM booking_sessions WHERE updated_at <= ?", (cutoff,))
+            rows = conn.execute(
+                "SELECT user_id, data, updated_at FROM booking_sessions ORDER BY updated_at DESC LIMIT ?",
+                (SESSION_MAX_ENTRIES,)
+            ).fetchall()
+        user_booking_data.load((user_id, json.loads(data), updated_at) for user_id, data, updated_at in reversed(rows))
+        logging.info(f"Відновлено {len(rows)} незавершених бронювань.")
     except sqlite3.Error as e:
-        logging.error(f"Помилка додавання бронювання до бази даних: {e}")
-    finally:
-        if conn:
-            conn.close()
-    return booking_id
+        logging.error(f"Помилка завантаження незавершених бронювань: {e}")
 
-def update_booking_status_in_db(booking_id, new_status):
-    """Оновлює статус бронювання в базі даних за ID."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE bookings SET status = ? WHERE id = ?
-        ''', (new_status, booking_id))
-        conn.commit()
-        logging.info(f"Статус бронювання {booking_id} оновлено на '{new_status}'.")
-    except sqlite3.Error as e:
-        logging.error(f"Помилка оновлення статусу бронювання {booking_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+@observe_db
+def save_session_state(upserts, deletes, conversations, evictions=()):
+    """Записує зміни сесій бронювання і станів розмов однією транзакцією.
 
-def get_booking_by_id(booking_id):
-    """Отримує одне бронювання за його ID."""
-    conn = None
-    row = None
+    conversations - (назва, ключ, стан або None для видалення). Разом вони
+    потрапляють у БД або разом губляться, тож після збою розмова не
+    опиниться на кроці, дані для якого не збереглися. Для витіснених
+    сесій (evictions) видаляються і стани розмов гостя; нові стани з
+    conversations пишуться після цього, тож крок, зроблений гостем уже
+    після витіснення, зберігається.
+    """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, user_id, name, nickname, date, time, guests, cabin, contact, status, chat_id FROM bookings WHERE id = ?
-        ''', (booking_id,))
-        row = cursor.fetchone()
+        with db.transaction() as conn:
+            if upserts:
+                conn.executemany("REPLACE INTO booking_sessions (user_id, data, updated_at) VALUES (?, ?, ?)", upserts)
+            if deletes:
+                conn.executemany("DELETE FROM booking_sessions WHERE user_id = ?", deletes)
+            if evictions:
+                # Ключ розмови - (chat_id, user_id)
+                conn.executemany("DELETE FROM conversations WHERE json_extract(key, '$[1]') = ?", evictions)
+            for name, key, new_state in conversations:
+                key = json.dumps(list(key))
+                if new_state is None:
+                    conn.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, key))
+                else:
+                    conn.execute("REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)", (name, key, new_state))
     except sqlite3.Error as e:
-        logging.error(f"Помилка отримання бронювання за ID {booking_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+        logging.error(f"Помилка збереження сесій і станів розмов: {e}")
 
-    if row:
-        return {
-            'id': row[0],
-            'user_id': row[1],
-            'name': row[2],
-            'nickname': row[3],
-            'date': row[4],
-            'time': row[5],
-            'guests': row[6],
-            'cabin': row[7],
-            'contact': row[8],
-            'status': row[9],
-            'chat_id': row[10]
-        }
-    return None
+async def flush_session_state(persistence=None):
+    """Записує в БД сесії і стани розмов, змінені після попереднього запису."""
+    upserts, deletes, evictions = user_booking_data.take_changes()
+    conversations = persistence.take_changes() if persistence is not None else []
+    if upserts or deletes or conversations:
+        await db_writer.submit(save_session_state, upserts, deletes, conversations, evictions)
 
-def get_user_contact(user_id):
-    """Отримує збережені контакти користувача."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, contact FROM users WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        return {'name': row[0], 'contact': row[1]} if row else None
-    except sqlite3.Error as e:
-        logging.error(f"Помилка отримання даних користувача {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
-    return None
+def load_conversations(name):
+    """Повертає збережені стани розмов ConversationHandler з назвою name."""
+    rows = db.execute("SELECT key, state FROM conversations WHERE name = ?", (name,)).fetchall()
+    return {tuple(json.loads(key)): state for key, state in rows}
 
-def save_user_contact(user_id, name, contact):
-    """Зберігає або оновлює контактні дані користувача."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute("REPLACE INTO users (user_id, name, contact) VALUES (?, ?, ?)", (user_id, name, contact))
-        conn.commit()
-        logging.info(f"Контактні дані для користувача {user_id} збережено.")
-    except sqlite3.Error as e:
-        logging.error(f"Помилка збереження даних користувача {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
 
-def save_review(user_id, rating, comment):
-    """Зберігає відгук у базі даних."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        timestamp = datetime.now().strftime("%d.%m.%Y %H:%M:%S")
-        cursor.execute("INSERT INTO reviews (user_id, rating, comment, timestamp) VALUES (?, ?, ?, ?)", (user_id, rating, comment, timestamp))
-        conn.commit()
-        logging.info(f"Відгук від користувача {user_id} збережено.")
-    except sqlite3.Error as e:
-        logging.error(f"Помилка збереження відгуку від користувача {user_id}: {e}")
-    finally:
-        if conn:
-            conn.close()
+class SQLitePersistence(BasePersistence):
+    """Збереження станів ConversationHandler у SQLite через інтерфейс python-telegram-bot.
+
+    Application сама накопичує змінені стани і передає їх раз на
+    update_interval; тут вони лише збираються і пишуться в БД разом зі
+    змінами SessionStore (flush_session_state), однією транзакцією.
+    user_data/chat_data/bot_data не зберігаються - дані бронювання і
+    відгуку живуть у SessionStore.
+    """
+
+    def __init__(self, update_interval=SESSION_FLUSH_INTERVAL_SECONDS):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._active_conversations = {}  # назва -> ключі незавершених розмов
+        self._changes = {}  # (назва, ключ) -> новий стан, ще не записаний у БД
+
+    def active_conversations(self):
+        """Кількість незавершених розмов станом на останній запис у БД."""
+        return sum(len(keys) for keys in self._active_conversations.values())
+
+    async def get_conversations(self, name):
+        conversations = await run_db_read(load_conversations, name)
+        self._active_conversations[name] = set(conversations)
+        return conversations
+
+    async def update_conversation(self, name, key, new_state):
+        keys = self._active_conversations.setdefault(name, set())
+        if new_state is None:
+            keys.discard(key)
+        else:
+            keys.add(key)
+        self._changes[(name, key)] = new_state
+
+    def take_changes(self):
+        """Забирає накопичені зміни станів: [(назва, ключ, стан), ...]."""
+        changes, self._changes = self._changes, {}
+        return [(name, key, new_state) for (name, key), new_state in changes.items()]
+
+    async def flush(self):
+        await flush_session_state(self)
+
+    async def get_user_data(self):
+        return {}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_user_data(self, user_id, data):
+        pass
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def drop_user_data(self, user_id):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
 
 # --- Допоміжні функції ---
 
+# Дати зберігаються як "рррр-мм-дд", а гостям і адміну показуються як "дд.мм.рррр"
+
+@functools.lru_cache(maxsize=1024)
+def format_date(iso_day):
+    """"рррр-мм-дд" -> "дд.мм.рррр" (кешується: у повідомленнях повторюються кілька найближчих дат)."""
+    return f"{iso_day[8:10]}.{iso_day[5:7]}.{iso_day[:4]}"
+
+def parse_date_token(text):
+    """Дата з команди адміна чи старої кнопки у "рррр-мм-дд"; приймається також "дд.мм.рррр".
+
+    ValueError, якщо це не дата: у bookings, утримання й індекс зайнятості
+    потрапляють лише дати "рррр-мм-дд", інакше діапазонні запити їх не знайдуть.
+    """
+    if len(text) == 10 and text[2] == '.' and text[5] == '.':
+        text = f"{text[6:]}-{text[3:5]}-{text[:2]}"
+    return date.fromisoformat(text).isoformat()
+
+def compile_template(template, *fields):
+    """Компілює шаблон з полями {назва} у функцію, що приймає ці поля по порядку.
+
+    Шаблон розбирається і компілюється в f-рядок один раз, при імпорті:
+    str.format розбирає шаблон на кожен виклик і з кирилицею в тексті
+    вчетверо повільніший.
+    """
+    used = {name for _, name, _, _ in string.Formatter().parse(template) if name is not None}
+    if not used <= set(fields):
+        raise ValueError(f"Невідомі поля шаблону: {sorted(used - set(fields))}")
+    return eval(compile(f"lambda {', '.join(fields)}: f{template!r}", "<template>", "eval"))
+
+BOOKING_MSG_TEMPLATE = compile_template(
+    "📅 Нове бронювання:\n"
+    "Ім'я: {name}\n"
+    "Нік: {nickname}\n"
+    "Дата: {date}\n"
+    "Час: {time_range}\n"
+    "Гостей: {guests}\n"
+    "Місце: {cabin}\n"
+    "Телефон: {contact}\n"
+    "Статус: {status}",
+    "name", "nickname", "date", "time_range", "guests", "cabin", "contact", "status"
+)
+
+ADMIN_CONFIRMED_TEMPLATE = compile_template(
+    "✅ Бронювання підтверджено:\n\n"
+    "Ім'я: {name}\n"
+    "Нік: {nickname}\n"
+    "Телефон: {contact}\n"
+    "Дата: {date}\n"
+    "Час: {time_range}\n"
+    "Кабінка: {cabin}\n"
+    "Гостей: {guests}",
+    "name", "nickname", "contact", "date", "time_range", "cabin", "guests"
+)
+
+ADMIN_LIST_ITEM_TEMPLATE = compile_template(
+    "\n🔢 #{id}\n"
+    "📅 Дата: {date}\n"
+    "⏰ Час: {time_range}\n"
+    "🏠 Кабінка: {cabin}\n"
+    "👤 {name} ({contact})\n"
+    "👤 Нік: {nickname}\n"
+    "👥 Гостей: {guests}\n"
+    "📌 Статус: {status}",
+    "id", "date", "time_range", "cabin", "name", "contact", "nickname", "guests", "status"
+)
+
+def format_time_range(booking):
+    """"гг:хх-гг:хх" - початок і кінець бронювання."""
+    current = venue
+    return current.time_range(booking['time'], booking.get('duration') or current.booking_duration)
+
 def format_booking_msg(booking):
     """Форматує інформацію про бронювання для відправки."""
+    return BOOKING_MSG_TEMPLATE(
+        booking['name'], booking.get('nickname', 'не вказано'), format_date(booking['date']), format_time_range(booking),
+        booking['guests'], booking['cabin'], booking['contact'], booking['status']
+    )
+
+def format_admin_confirmed_msg(booking):
+    """Повідомлення адміністратору про підтверджене бронювання."""
+    return ADMIN_CONFIRMED_TEMPLATE(
+        booking['name'], booking.get('nickname', 'не вказано'), booking['contact'], format_date(booking['date']),
+        format_time_range(booking), booking['cabin'], booking['guests']
+    )
+
+def format_admin_list_item(b):
+    """Один запис в адмін-списку бронювань."""
+    return ADMIN_LIST_ITEM_TEMPLATE(
+        b['id'], format_date(b['date']), format_time_range(b), b['cabin'], b['name'], b['contact'],
+        b['nickname'], b['guests'], b['status']
+    )
+
+def format_user_bookings(upcoming, past):
+    """Відповідь на /bookings: найближчі бронювання гостя і кілька минулих."""
+    lines = ["Ваші найближчі бронювання:" if upcoming else "Найближчих бронювань немає."]
+    lines.extend(
+        f"📅 {format_date(b['date'])} о {b['time']} - {b['cabin']}, гостей: {b['guests']} ({b['status']})" for b in upcoming
+    )
+    if past:
+        lines.extend(["", "Минулі:"])
+        lines.extend(f"{format_date(b['date'])} о {b['time']} - {b['cabin']} ({b['status']})" for b in past)
+    return "\n".join(lines)
+
+def _short_day(iso_day):
+    """"рррр-мм-дд" -> "дд.мм"."""
+    return f"{iso_day[8:10]}.{iso_day[5:7]}"
+
+def format_review_stats(stats):
+    """Звіт /stats: середня оцінка, розподіл, динаміка по днях і тижнях, останні коментарі."""
+    if not stats['total']:
+        return "Відгуків поки немає."
+    lines = [f"⭐ Відгуків: {stats['total']}, середня оцінка {stats['average']:.2f}", ""]
+    for rating in reversed(REVIEW_RATINGS):
+        count = stats['distribution'][rating]
+        share = count / stats['total']
+        lines.append(f"{rating}★ {'█' * round(share * 10):<10} {count} ({share:.0%})")
+
+    lines.extend(["", f"По днях (останні {REVIEW_STATS_DAYS}):"])
+    lines.extend(f"{_short_day(day)}: {count} відг., сер. {avg:.2f}" for day, count, avg in stats['daily'])
+    if not stats['daily']:
+        lines.append("немає відгуків")
+
+    lines.extend(["", f"По тижнях (останні {REVIEW_STATS_WEEKS}):"])
+    lines.extend(f"з {_short_day(week)}: {count} відг., сер. {avg:.2f}" for week, count, avg in stats['weekly'])
+    if not stats['weekly']:
+        lines.append("немає відгуків")
+
+    if stats['recent']:
+        lines.extend(["", "Останні відгуки:"])
+        for timestamp, rating, comment in stats['recent']:
+            comment = comment if len(comment or "") <= 200 else comment[:200] + "…"
+            lines.append(f"{_short_day(timestamp)} {timestamp[11:16]} {rating}★ {comment}")
+    return "\n".join(lines)
+
+# дія -> (емодзі, що стане з бронюваннями)
+BULK_ACTION_LABELS = {
+    'confirm': ("✅", "підтверджено"),
+    'cancel': ("🚫", "скасовано"),
+    'expire': ("⌛", "скасовано (не підтверджено)"),
+}
+
+def format_bulk_usage():
+    """Довідка /bulk з нумерацією місць."""
+    cabins = "\n".join(f"{i}. {cabin.name}" for i, cabin in enumerate(venue.cabins, 1))
     return (
-        f"📅 Нове бронювання:\n"
-        f"Ім'я: {booking['name']}\n"
-        f"Нік: {booking.get('nickname', 'не вказано')}\n"
-        f"Дата: {booking['date']}\n"
-        f"Час: {booking['time']}\n"
-        f"Гостей: {booking['guests']}\n"
-        f"Місце: {booking['cabin']}\n"
-        f"Телефон: {booking['contact']}\n"
-        f"Статус: {booking['status']}"
+        "Масові дії:\n"
+        "/bulk confirm <дата> - підтвердити всі бронювання на дату, що очікують\n"
+        "/bulk cancel <дата> [час] [номери місць через кому] - скасувати бронювання на дату, час і/або місця\n"
+        "/bulk expire - скасувати непідтверджені бронювання, час яких вже минув\n"
+        "Дата - рррр-мм-дд або дд.мм.рррр, наприклад: /bulk cancel 2026-07-12 8,9,10,11\n\n"
+        f"Місця:\n{cabins}"
     )
 
+def format_bulk_summary(action, bookings, done):
+    """Перелік бронювань масової дії: до виконання (done=False) або звіт після."""
+    emoji, label = BULK_ACTION_LABELS[action]
+    if not bookings:
+        return "Немає бронювань, яких стосується ця дія."
+    title = f"{emoji} {label.capitalize()} бронювань: {len(bookings)}" if done else f"Буде {label} бронювань: {len(bookings)}"
+    lines = [title, ""]
+    lines.extend(f"#{b['id']} {format_date(b['date'])} {b['time']} {b['cabin']} - {b['name']}" for b in bookings)
+    return "\n".join(lines)
+
+# Статичні клавіатури будуються один раз при імпорті
+MAIN_KEYBOARD = ReplyKeyboardMarkup(
+    [
+        ["📅 Забронювати столик", "📸 Instagram"],
+        ["📖 Меню", "⭐ Залишити відгук"],
+        ["👀 Переглянути бронювання (адміну)", "📞 Зв'язатися з адміном"]
+    ],
+    resize_keyboard=True
+)
+
 def get_main_keyboard():
     """Повертає головну клавіатуру."""
-    return ReplyKeyboardMarkup(
-        [
-            ["📅 Забронювати столик", "📸 Instagram"],
-            ["📖 Меню", "⭐ Залишити відгук"],
-            ["👀 Переглянути бронювання (адміну)", "📞 Зв'язатися з адміном"]
-        ],
-        resize_keyboard=True
-    )
+    return MAIN_KEYBOARD
+
+RATING_KEYBOARD = InlineKeyboardMarkup(
+    [[InlineKeyboardButton(str(rating), callback_data=CB_RATING.encode(rating))] for rating in REVIEW_RATINGS]
+)
+
+def rating_keyboard():
+    """Повертає клавіатуру оцінки відгуку."""
+    return RATING_KEYBOARD
+
+def get_available_cabins(user_id):
+    """Вільні на весь час бронювання кабінки, без утримуваних іншими гостями.
+
+    Якщо кількість гостей вже відома, лишаються лише кабінки, що їх
+    вміщують, від найкращої посадки до найгіршої.
+    """
+    booking = user_booking_data[user_id]
+    current = venue  # одна версія налаштувань на весь підбір, навіть якщо їх перезавантажать посередині
+    duration = booking.get('duration') or current.booking_duration
+    busy = occupancy.busy_mask(booking['date'], booking['time'], duration, current.cabin_index)
+    held = slot_holds.held_by_others(booking['date'], booking['time'], user_id, duration)
+    guests = booking.get('guests')
+    if guests is None:
+        available = current.free_cabins(busy)
+    else:
+        available = [cabin for idx, cabin in current.cabins_by_fit(guests) if not busy & (1 << idx)]
+    return [cabin for cabin in available if cabin not in held] if held else list(available)
+
+def generate_cabins_keyboard(cabins):
+    """Генерує інлайн-клавіатуру з переліком кабінок."""
+    return _cabins_keyboard(tuple(cabins))
+
+@functools.lru_cache(maxsize=256)
+def _cabins_keyboard(cabins):
+    return InlineKeyboardMarkup([[InlineKeyboardButton(cabin, callback_data=CB_CABIN.encode(cabin))] for cabin in cabins])
+
+ADMIN_PAGE_SIZE = 5
+
+def admin_date_range(date_token):
+    """(date_from, date_to) для фільтра адмін-списку: all, week (сьогодні і 6 днів наперед) або один день."""
+    if date_token == "all":
+        return None, None
+    if date_token == "week":
+        today = date.today()
+        return today.isoformat(), (today + timedelta(days=6)).isoformat()
+    return date_token, date_token
+
+def render_admin_bookings_page(bookings, has_prev, has_next, date_token="all", notice=None):
+    """Текст і клавіатура однієї сторінки адмін-списку активних бронювань."""
+    date_from, date_to = admin_date_range(date_token)
+    if date_from is None:
+        title, empty = "Активні бронювання:", "Активних бронювань немає."
+    elif date_from == date_to:
+        title, empty = f"Активні бронювання на {format_date(date_from)}:", "Активних бронювань на цю дату немає."
+    else:
+        title = f"Активні бронювання на {_short_day(date_from)}–{_short_day(date_to)}:"
+        empty = "Активних бронювань на ці дні немає."
+    lines = [notice, ""] if notice else []
+    if not bookings:
+        lines.append(empty)
+    else:
+        lines.append(title)
+        lines.extend(format_admin_list_item(b) for b in bookings)
 
-def generate_calendar_keyboard():
-    """Генерує інлайн-клавіатуру з датами на 8 днів вперед."""
     keyboard = []
+    if bookings:
+        # Після скасування сторінка перебудовується від того ж місця
+        anchor = bookings[0]['id'] - 1
+        keyboard = [
+            [InlineKeyboardButton(f"❌ Скасувати #{b['id']}", callback_data=CB_FORCE_CANCEL.encode(b['id'], anchor, date_token))]
+            for b in bookings
+        ]
+        nav = []
+        if has_prev:
+            nav.append(InlineKeyboardButton("⬅️ Назад", callback_data=CB_ADMIN_LIST.encode("prev", bookings[0]['id'], date_token)))
+        if has_next:
+            nav.append(InlineKeyboardButton("Далі ➡️", callback_data=CB_ADMIN_LIST.encode("next", bookings[-1]['id'], date_token)))
+        if nav:
+            keyboard.append(nav)
+
+    # Фільтри за датою: усі дати, найближчий тиждень або один із днів, доступних для бронювання
+    keyboard.extend(_get_daily_keyboards().admin_filter_rows)
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+
+class _DailyKeyboards:
+    """Клавіатури, що залежать від поточної дати; перебудовуються раз на добу і при зміні налаштувань."""
+
+    def __init__(self, today, current):
+        self.day = today
+        self.venue = current
+        days = [today + timedelta(days=i) for i in range(current.booking_days)]
+        self.calendar = InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"{day.strftime('%d.%m')} ({day.strftime('%a')})", callback_data=CB_DATE.encode(day.isoformat()))]
+            for day in days
+        ])
+        filter_rows = [[
+            InlineKeyboardButton("📋 Усі дати", callback_data=CB_ADMIN_LIST.encode("next", 0, "all")),
+            InlineKeyboardButton("📆 7 днів", callback_data=CB_ADMIN_LIST.encode("next", 0, "week")),
+        ]]
+        for i in range(0, len(days), 4):
+            filter_rows.append([
+                InlineKeyboardButton(day.strftime('%d.%m'), callback_data=CB_ADMIN_LIST.encode("next", 0, day.isoformat()))
+                for day in days[i:i + 4]
+            ])
+        self.admin_filter_rows = tuple(tuple(row) for row in filter_rows)
+
+
+_daily_keyboards = None
+
+def _get_daily_keyboards():
+    global _daily_keyboards
     today = date.today()
-    for i in range(8):
-        day = today + timedelta(days=i)
-        keyboard.append([InlineKeyboardButton(f"{day.strftime('%d.%m')} ({day.strftime('%a')})", callback_data=f"date_{day.strftime('%d.%m.%Y')}")])
-    
-    return InlineKeyboardMarkup(keyboard)
+    if _daily_keyboards is None or _daily_keyboards.day != today or _daily_keyboards.venue is not venue:
+        _daily_keyboards = _DailyKeyboards(today, venue)
+    return _daily_keyboards
+
+def generate_calendar_keyboard():
+    """Повертає інлайн-клавіатуру з датами на venue.booking_days днів вперед (кешується до півночі)."""
+    return _get_daily_keyboards().calendar
 
 # --- Функції обробників ---
 
+async def reply_session_lost(message):
+    """Сесію бронювання витіснено або втрачено: повертає гостя до головного меню."""
+    await message.reply_text("Дані бронювання втрачені. Будь ласка, почніть знову.", reply_markup=get_main_keyboard())
+    return CHOOSING_MAIN_ACTION
+
+@observe_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник команди /start."""
     await update.message.reply_text(
-        "Привіт! Я бот для бронювання в кальянній.\nЩо бажаєш зробити?\n\nДля питань: " + ADMIN_PHONE,
+        "Привіт! Я бот для бронювання в кальянній.\nЩо бажаєш зробити?\n\nДля питань: " + venue.admin_phone,
         reply_markup=get_main_keyboard()
     )
     return CHOOSING_MAIN_ACTION
 
+@observe_handler
 async def handle_main_menu_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник вибору з головного меню (ReplyKeyboardMarkup)."""
     text = update.message.text
@@ -359,11 +3755,11 @@ async def handle_main_menu_choice(update: Update, context: ContextTypes.DEFAULT_
 
     if text == "📅 Забронювати столик":
         user_booking_data[user_id] = {} # Ініціалізуємо дані для нового бронювання
-        user_contact = get_user_contact(user_id)
+        user_contact = await storage.get_user_contact(user_id)
         if user_contact:
             keyboard = [
-                [InlineKeyboardButton("✅ Використати збережені дані", callback_data="use_saved_contacts")],
-                [InlineKeyboardButton("📝 Ввести нові дані", callback_data="enter_new_contacts")]
+                [InlineKeyboardButton("✅ Використати збережені дані", callback_data=CB_SAVED_CONTACTS.encode("use"))],
+                [InlineKeyboardButton("📝 Ввести нові дані", callback_data=CB_SAVED_CONTACTS.encode("new"))]
             ]
             await update.message.reply_text(
                 f"Я бачу, у вас вже є збережені дані:\nІм'я: {user_contact['name']}\nТелефон: {user_contact['contact']}\n"
@@ -376,30 +3772,11 @@ async def handle_main_menu_choice(update: Update, context: ContextTypes.DEFAULT_
             return BOOKING_DATE
 
     elif text == "👀 Переглянути бронювання (адміну)":
-        if user_id == ADMIN_USER_ID:
-            # Нова опція для адміна: перегляд усіх активних бронювань
-            all_active_bookings = get_bookings_from_db(filters={'status': ['Очікує підтвердження', 'Підтверджено']})
-            
-            if not all_active_bookings:
-                await update.message.reply_text("Активних бронювань немає.", reply_markup=get_main_keyboard())
-            else:
-                await update.message.reply_text("Активні бронювання:")
-                for i, b in enumerate(all_active_bookings, 1):
-                    keyboard = [
-                        [InlineKeyboardButton("❌ Скасувати", callback_data=f"admin_force_cancel_{b['id']}")]
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-                    await update.message.reply_text(
-                        f"🔢 #{i}\n"
-                        f"📅 Дата: {b['date']}\n"
-                        f"⏰ Час: {b['time']}\n"
-                        f"🏠 Кабінка: {b['cabin']}\n"
-                        f"👤 {b['name']} ({b['contact']})\n"
-                        f"👤 Нік: {b['nickname']}\n"
-                        f"👥 Гостей: {b['guests']}\n"
-                        f"📌 Статус: {b['status']}",
-                        reply_markup=reply_markup
-                    )
+        if is_admin(user_id):
+            # Перегляд активних бронювань однією сторінкою, яка редагується на місці
+            page = await storage.get_active_bookings_page(limit=ADMIN_PAGE_SIZE)
+            text, reply_markup = render_admin_bookings_page(*page)
+            await update.message.reply_text(text, reply_markup=reply_markup)
             await update.message.reply_text("Щось ще?", reply_markup=get_main_keyboard())
             return CHOOSING_MAIN_ACTION
         else:
@@ -407,145 +3784,189 @@ async def handle_main_menu_choice(update: Update, context: ContextTypes.DEFAULT_
             return CHOOSING_MAIN_ACTION
 
     elif text == "📸 Instagram":
-        instagram_url = "https://www.instagram.com/gipnoze_lounge?utm_source=ig_web_button_share_sheet&igsh=ZDNlZDc0MzIxNw=="
-        await update.message.reply_text(f"Перейти на нашу сторінку Instagram: {instagram_url}", reply_markup=get_main_keyboard())
+        await update.message.reply_text(f"Перейти на нашу сторінку Instagram: {venue.instagram_url}", reply_markup=get_main_keyboard())
         return CHOOSING_MAIN_ACTION
     
     elif text == "📖 Меню":
-        await update.message.reply_text(f"Переглянути наше меню: {INSTAGRAM_MENU_URL}", reply_markup=get_main_keyboard())
+        await update.message.reply_text(f"Переглянути наше меню: {venue.instagram_menu_url}", reply_markup=get_main_keyboard())
         return CHOOSING_MAIN_ACTION
     
     elif text == "⭐ Залишити відгук":
-        keyboard = [[InlineKeyboardButton(str(i), callback_data=f"rating_{i}")] for i in range(1, 6)]
-        await update.message.reply_text("Як би ви оцінили наш сервіс? (1 - погано, 5 - чудово)", reply_markup=InlineKeyboardMarkup(keyboard))
+        await update.message.reply_text("Як би ви оцінили наш сервіс? (1 - погано, 5 - чудово)", reply_markup=rating_keyboard())
         return ASK_REVIEW_RATING
 
     elif text == "📞 Зв'язатися з адміном":
-        await update.message.reply_text(f"Номер телефону адміністратора: {ADMIN_PHONE}", reply_markup=get_main_keyboard())
+        await update.message.reply_text(f"Номер телефону адміністратора: {venue.admin_phone}", reply_markup=get_main_keyboard())
         return CHOOSING_MAIN_ACTION
     else:
         await update.message.reply_text("Будь ласка, оберіть дію з клавіатури.", reply_markup=get_main_keyboard())
         return CHOOSING_MAIN_ACTION
 
+@callbacks.route(CB_SAVED_CONTACTS)
+@observe_handler
 async def check_saved_contacts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник вибору щодо збережених контактів."""
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
 
-    if query.data == "use_saved_contacts":
-        user_contact = get_user_contact(user_id)
-        user_booking_data[user_id]['name'] = user_contact['name']
-        user_booking_data[user_id]['contact'] = user_contact['contact']
+    booking = user_booking_data.get(user_id)
+    if booking is None:
+        return await reply_session_lost(query.message)
+
+    if context.args[0] == "use":
+        user_contact = await storage.get_user_contact(user_id)
+        if user_contact is None:
+            # Контакти видалили, поки гість вирішував
+            await query.edit_message_text("Збережених даних уже немає, їх доведеться ввести ще раз.\nОберіть дату бронювання:", reply_markup=generate_calendar_keyboard())
+            return BOOKING_DATE
+        booking['name'] = user_contact['name']
+        booking['contact'] = user_contact['contact']
         await query.edit_message_text("Добре, я використав ваші збережені дані.")
         await query.message.reply_text("Тепер оберіть дату бронювання:", reply_markup=generate_calendar_keyboard())
-    elif query.data == "enter_new_contacts":
+    else:
         await query.edit_message_text("Оберіть дату бронювання:", reply_markup=generate_calendar_keyboard())
     
     return BOOKING_DATE
 
+@callbacks.route(CB_DATE)
+@observe_handler
 async def book_date_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник вибору дати бронювання."""
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    
-    date_text = query.data.split("_")[1]
-    user_booking_data[user_id]['date'] = date_text
+    booking = user_booking_data.get(user_id)
+    if booking is None:
+        return await reply_session_lost(query.message)
 
-    keyboard = []
-    for i in range(0, len(time_slots), 4):
-        row = []
-        for slot in time_slots[i:i+4]:
-            row.append(InlineKeyboardButton(slot, callback_data=f"time_{slot}"))
-        keyboard.append(row)
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text("Оберіть час:", reply_markup=reply_markup)
+    booking['date'] = parse_date_token(context.args[0])
+
+    await query.edit_message_text("Оберіть час:", reply_markup=venue.time_slots_keyboard)
     return BOOKING_TIME
 
+@callbacks.route(CB_TIME)
+@observe_handler
 async def book_time_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник вибору часу бронювання."""
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
-    
-    selected_time = query.data.split("_")[1]
-    user_booking_data[user_id]['time'] = selected_time
-    await query.edit_message_text(f"Ви обрали {user_booking_data[user_id]['date']} о {selected_time}.\nСкільки вас буде чоловік?")
+    booking = user_booking_data.get(user_id)
+    if not booking or 'date' not in booking:
+        return await reply_session_lost(query.message)
+
+    selected_time = context.args[0]
+    if selected_time not in venue.slot_index:
+        # Клавіатуру показали до перезавантаження налаштувань, і цього слоту вже немає
+        await query.edit_message_text("Цей час більше недоступний. Оберіть, будь ласка, інший:", reply_markup=venue.time_slots_keyboard)
+        return BOOKING_TIME
+    booking['time'] = selected_time
+    await query.edit_message_text(f"Ви обрали {format_date(booking['date'])} о {selected_time}.\nСкільки вас буде чоловік?")
     return BOOKING_GUESTS
 
+@observe_handler
 async def book_guests_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник введення кількості гостей."""
     user_id = update.message.from_user.id
+    booking = user_booking_data.get(user_id)
+    if not booking or 'time' not in booking:
+        return await reply_session_lost(update.message)
+
     guests_text = update.message.text
     try:
         num_guests = int(guests_text)
         if num_guests <= 0:
             await update.message.reply_text("Кількість гостей має бути позитивним числом. Будь ласка, введіть коректну кількість.")
             return BOOKING_GUESTS
-        user_booking_data[user_id]['guests'] = num_guests
+        if num_guests > venue.max_party_size:
+            await update.message.reply_text(
+                f"Наші місця розраховані щонайбільше на {venue.max_party_size} гостей. "
+                f"Для більшої компанії, будь ласка, зателефонуйте нам: {venue.admin_phone}"
+            )
+            return BOOKING_GUESTS
+        booking['guests'] = num_guests
     except (ValueError, TypeError):
         await update.message.reply_text("Невірний формат. Будь ласка, введіть кількість гостей числом.")
         return BOOKING_GUESTS
 
-    date = user_booking_data[user_id]['date']
-    time = user_booking_data[user_id]['time']
-    busy = [b['cabin'] for b in get_bookings_from_db(filters={'date': date, 'time': time, 'status': ['Очікує підтвердження', 'Підтверджено']})]
-    available_cabins = [cabin for cabin in CABINS if cabin not in busy]
+    available_cabins = get_available_cabins(user_id)
 
     if not available_cabins:
-        await update.message.reply_text("На жаль, на цей час усі кабінки зайняті. Будь ласка, спробуйте інший час або дату.")
+        await update.message.reply_text("На жаль, на цей час усі місця для вашої компанії зайняті. Будь ласка, спробуйте інший час або дату.")
         await update.message.reply_text("Повертаю вас до головного меню.", reply_markup=get_main_keyboard())
         return CHOOSING_MAIN_ACTION
     
-    keyboard = [[InlineKeyboardButton(cabin, callback_data=f"cabin_{cabin}")] for cabin in available_cabins]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text("Оберіть місце або зону:", reply_markup=reply_markup)
+    await update.message.reply_text("Оберіть місце або зону:", reply_markup=generate_cabins_keyboard(available_cabins))
     return BOOKING_CABIN
 
+@callbacks.route(CB_CABIN)
+@observe_handler
 async def book_cabin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник вибору кабінки."""
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
     
-    selected_cabin = query.data.split("cabin_")[1]
-    user_booking_data[user_id]['cabin'] = selected_cabin
+    selected_cabin = context.args[0]
+    booking = user_booking_data.get(user_id)
+    if not booking or 'guests' not in booking:
+        return await reply_session_lost(query.message)
+    # Місце могли вимкнути в налаштуваннях, поки гість обирав
+    if not venue.is_bookable(selected_cabin) or not await storage.place_hold(booking['date'], booking['time'], selected_cabin, user_id):
+        available_cabins = get_available_cabins(user_id)
+        if not available_cabins:
+            await query.edit_message_text("На жаль, поки ви обирали, усі кабінки на цей час зайняли. Будь ласка, спробуйте інший час або дату.")
+            await query.message.reply_text("Повертаю вас до головного меню.", reply_markup=get_main_keyboard())
+            return CHOOSING_MAIN_ACTION
+        await query.edit_message_text("Це місце щойно зайняли. Оберіть, будь ласка, інше:", reply_markup=generate_cabins_keyboard(available_cabins))
+        return BOOKING_CABIN
+
+    booking['cabin'] = selected_cabin
     await query.edit_message_text("Як вас звати?")
     return BOOKING_NAME
 
+@observe_handler
 async def book_name_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник введення імені."""
     user_id = update.message.from_user.id
-    user_booking_data[user_id]['name'] = update.message.text
+    booking = user_booking_data.get(user_id)
+    if booking is None:
+        return await reply_session_lost(update.message)
+    booking['name'] = update.message.text
     await update.message.reply_text("Введіть ваш нікнейм у Telegram або Instagram для зв'язку:")
     return BOOKING_NICKNAME
 
+@observe_handler
 async def book_nickname_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник введення нікнейма."""
     user_id = update.message.from_user.id
-    user_booking_data[user_id]['nickname'] = update.message.text
+    booking = user_booking_data.get(user_id)
+    if booking is None:
+        return await reply_session_lost(update.message)
+    booking['nickname'] = update.message.text
     await update.message.reply_text("Ваш номер телефону? (наприклад, +380991234567)")
     return BOOKING_PHONE
 
+@observe_handler
 async def book_phone_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник введення телефону та запиту про збереження контактів."""
     user_id = update.message.from_user.id
     user_data = user_booking_data.get(user_id)
     if not user_data or 'name' not in user_data:
-        await update.message.reply_text("Дані бронювання втрачені. Будь ласка, почніть знову.", reply_markup=get_main_keyboard())
-        return CHOOSING_MAIN_ACTION
+        return await reply_session_lost(update.message)
 
     user_data['contact'] = update.message.text
     
     keyboard = [
-        [InlineKeyboardButton("✅ Так, зберегти", callback_data="save_contact_yes")],
-        [InlineKeyboardButton("❌ Ні, не зберігати", callback_data="save_contact_no")]
+        [InlineKeyboardButton("✅ Так, зберегти", callback_data=CB_SAVE_CONTACT.encode(True))],
+        [InlineKeyboardButton("❌ Ні, не зберігати", callback_data=CB_SAVE_CONTACT.encode(False))]
     ]
     await update.message.reply_text("Хочете зберегти ці контактні дані для наступних бронювань?", reply_markup=InlineKeyboardMarkup(keyboard))
     return ASK_SAVE_CONTACT
 
+@callbacks.route(CB_SAVE_CONTACT)
+@observe_handler
 async def save_contact_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник вибору щодо збереження контактів після бронювання."""
     query = update.callback_query
@@ -554,11 +3975,10 @@ async def save_contact_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     user_data = user_booking_data.get(user_id)
 
     if not user_data:
-        await query.message.reply_text("Дані бронювання втрачені. Будь ласка, почніть знову.", reply_markup=get_main_keyboard())
-        return CHOOSING_MAIN_ACTION
+        return await reply_session_lost(query.message)
     
-    if query.data == "save_contact_yes":
-        save_user_contact(user_id, user_data['name'], user_data['contact'])
+    if context.args[0]:
+        await storage.save_user_contact(user_id, user_data['name'], user_data['contact'])
         await query.edit_message_text("Ваші контакти збережено!")
     else:
         await query.edit_message_text("Ваші контакти не було збережено.")
@@ -573,59 +3993,54 @@ async def save_contact_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         'cabin': user_data['cabin'],
         'contact': user_data['contact'],
         'status': 'Очікує підтвердження',
-        'chat_id': update.effective_chat.id
+        'chat_id': update.effective_chat.id,
+        'duration': user_data.get('duration') or venue.booking_duration
     }
     
-    booking_id = add_booking_to_db(booking_to_save)
+    try:
+        booking_id = await storage.add_booking(booking_to_save)
+    except SlotUnavailableError:
+        await query.message.reply_text(
+            "На жаль, поки ви заповнювали дані, це місце вже забронювали. Будь ласка, оберіть інший час або місце.",
+            reply_markup=get_main_keyboard()
+        )
+        return CHOOSING_MAIN_ACTION
+
     if booking_id:
         booking_to_save['id'] = booking_id
         await query.message.reply_text("✅ Дякуємо! Ми отримали твоє бронювання.")
         await query.message.reply_text("📬 Чекаємо на підтвердження адміністратором.")
         keyboard = [
             [
-                InlineKeyboardButton("✅ Підтвердити", callback_data=f"admin_confirm_{booking_id}"),
-                InlineKeyboardButton("❌ Відхилити", callback_data=f"admin_reject_{booking_id}")
+                InlineKeyboardButton("✅ Підтвердити", callback_data=CB_ADMIN_DECISION.encode("confirm", booking_id)),
+                InlineKeyboardButton("❌ Відхилити", callback_data=CB_ADMIN_DECISION.encode("reject", booking_id))
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        # Відправляємо повідомлення про нове бронювання тільки адміністратору в особистий чат
-        try:
-            await context.bot.send_message(chat_id=ADMIN_USER_ID, text=format_booking_msg(booking_to_save), reply_markup=reply_markup)
-        except Exception as e:
-            logging.error(f"Помилка при відправці повідомлення адміну ({ADMIN_USER_ID}): {e}")
-            await query.message.reply_text(f"Виникла помилка при відправці повідомлення адміністратору. Будь ласка, зв'яжіться з нами за номером {ADMIN_PHONE}.")
+        # Сповіщення про нове бронювання - кожному адміністратору в особистий чат
+        await notify_admins(format_booking_msg(booking_to_save), reply_markup=reply_markup, booking_id=booking_id)
     else:
         await query.message.reply_text("Виникла помилка при збереженні бронювання. Будь ласка, спробуйте ще раз.")
 
     await query.message.reply_text("Щось ще?", reply_markup=get_main_keyboard())
     return CHOOSING_MAIN_ACTION
 
+@callbacks.route(CB_ADMIN_DECISION)
+@observe_handler
 async def admin_booking_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник callback-запитів від адміністратора (підтвердження/відхилення)."""
     query = update.callback_query
     await query.answer()
 
-    data = query.data
-    parts = data.split("_")
-    if len(parts) != 3 or parts[0] != "admin":
-        await query.edit_message_text("Невірний формат запиту. Спробуйте ще раз або зверніться до розробника.")
-        return
-
-    action_type = parts[1]
-    try:
-        booking_id = int(parts[2])
-    except (ValueError, IndexError):
-        await query.edit_message_text("Невірний ID бронювання.")
-        return
-
-    booking = get_booking_by_id(booking_id)
+    action_type, booking_id = context.args
+    booking = await storage.get_booking(booking_id)
 
     if not booking:
         await query.edit_message_text("Бронювання не знайдено або вже видалено.")
         return
 
-    if query.from_user.id != ADMIN_USER_ID:
+    if not is_admin(query.from_user.id):
         await query.edit_message_text("Ви не маєте прав для виконання цієї дії.")
         return
 
@@ -633,117 +4048,331 @@ async def admin_booking_callback(update: Update, context: ContextTypes.DEFAULT_T
         await query.edit_message_text(f"Ця бронь вже '{booking['status']}'.")
         return
 
+    new_status = "Підтверджено" if action_type == "confirm" else "Відхилено"
+    # Інший адміністратор міг обробити бронювання, поки цей читав його
+    if not await storage.update_booking_status(booking_id, new_status, expected_statuses=['Очікує підтвердження']):
+        booking = await storage.get_booking(booking_id)
+        await query.edit_message_text(f"Ця бронь вже '{booking['status'] if booking else 'видалена'}'.")
+        return
+    booking['status'] = new_status
+
     if action_type == "confirm":
-        update_booking_status_in_db(booking_id, "Підтверджено")
-        booking['status'] = "Підтверджено"
+        # Надсилаємо повідомлення про підтвердження безпосередньо адміністратору
+        await outbox.send(query.from_user.id, format_admin_confirmed_msg(booking), priority=PRIORITY_ADMIN)
+        await outbox.send(booking['chat_id'], "✅ Ваше бронювання підтверджено!")
+        text = f"✅ Підтверджено:\n\n{format_booking_msg(booking)}"
+    else:
+        await outbox.send(booking['chat_id'], "❌ Ваше бронювання було відхилено.")
+        text = f"❌ Відхилено:\n\n{format_booking_msg(booking)}"
 
-        try:
-            # Надсилаємо повідомлення про підтвердження безпосередньо адміністратору
-            await context.bot.send_message(
-                chat_id=ADMIN_USER_ID,
-                text=(
-                    f"✅ Бронювання підтверджено:\n\n"
-                    f"Ім'я: {booking['name']}\n"
-                    f"Нік: {booking.get('nickname', 'не вказано')}\n"
-                    f"Телефон: {booking['contact']}\n"
-                    f"Дата: {booking['date']}\n"
-                    f"Час: {booking['time']}\n"
-                    f"Кабінка: {booking['cabin']}\n"
-                    f"Гостей: {booking['guests']}"
-                )
-            )
-            logging.info(f"Повідомлення про підтвердження успішно надіслано адміністратору: {ADMIN_USER_ID}")
-        except Exception as e:
-            logging.error(f"ПОМИЛКА: Не вдалося надіслати повідомлення адміністратору {ADMIN_USER_ID}: {e}")
+    await query.edit_message_text(text)
+    # Копії в інших адміністраторів втрачають кнопки, щоб ніхто не діяв за застарілим повідомленням
+    await sync_admin_copies(
+        context.bot, {booking_id: f"{text}\n\n👤 {query.from_user.full_name}"},
+        skip=(query.message.chat_id, query.message.message_id)
+    )
 
-        try:
-            await context.bot.send_message(chat_id=booking['chat_id'], text="✅ Ваше бронювання підтверджено!")
-        except Exception as e:
-            logging.error(f"Помилка при відправці повідомлення користувачу {booking['chat_id']} про підтвердження: {e}")
+@callbacks.route(CB_FORCE_CANCEL)
+@observe_handler
+async def admin_force_cancel_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обробник для примусового скасування бронювання адміністратором з адмін-списку."""
+    query = update.callback_query
+    await query.answer()
 
-        await query.edit_message_text(f"✅ Підтверджено:\n\n{format_booking_msg(booking)}")
+    if not is_admin(query.from_user.id):
+        await query.edit_message_text("Ви не маєте прав для виконання цієї дії.")
+        return
 
-    elif action_type == "reject":
-        update_booking_status_in_db(booking_id, "Відхилено")
-        booking['status'] = "Відхилено"
+    booking_id, page_anchor, date_token = context.args
 
-        try:
-            await context.bot.send_message(chat_id=booking['chat_id'], text="❌ Ваше бронювання було відхилено.")
-        except Exception as e:
-            logging.error(f"Помилка при відправці повідомлення користувачу {booking['chat_id']} про відхилення: {e}")
+    booking_to_cancel = await storage.get_booking(booking_id)
+
+    if not booking_to_cancel:
+        await query.edit_message_text("Бронювання не знайдено або вже видалено.")
+        return
 
-        await query.edit_message_text(f"❌ Відхилено:\n\n{format_booking_msg(booking)}")
+    cancelled = booking_to_cancel['status'] in ACTIVE_STATUSES and await storage.update_booking_status(
+        booking_id, 'Скасовано (адміном)', expected_statuses=ACTIVE_STATUSES
+    )
+    if cancelled:
+        booking_to_cancel['status'] = 'Скасовано (адміном)'
 
-async def admin_force_cancel_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обробник для примусового скасування бронювання адміністратором."""
+        notice = f"✅ Бронювання на {format_date(booking_to_cancel['date'])} о {booking_to_cancel['time']} для {booking_to_cancel['name']} скасовано адміністратором."
+        # Оновлюємо ту саму сторінку списку, з якої скасували бронювання
+        date_from, date_to = admin_date_range(date_token)
+        page = await storage.get_active_bookings_page(after_id=page_anchor, date_from=date_from, date_to=date_to, limit=ADMIN_PAGE_SIZE)
+        text, reply_markup = render_admin_bookings_page(*page, date_token=date_token, notice=notice)
+        await query.edit_message_text(text, reply_markup=reply_markup)
+
+        await outbox.send(
+            booking_to_cancel['chat_id'],
+            f"❌ Ваше бронювання на {format_date(booking_to_cancel['date'])} о {booking_to_cancel['time']} (Кабінка: {booking_to_cancel['cabin']}) було скасовано адміністратором."
+        )
+        await sync_admin_copies(
+            context.bot, {booking_id: f"🚫 Скасовано:\n\n{format_booking_msg(booking_to_cancel)}\n\n👤 {query.from_user.full_name}"}
+        )
+    else:
+        # Статус міг змінитися, поки адміністратор натискав кнопку
+        booking_to_cancel = await storage.get_booking(booking_id) or booking_to_cancel
+        await query.edit_message_text(f"Це бронювання вже було {booking_to_cancel['status']}.")
+
+@callbacks.route(CB_ADMIN_LIST)
+@observe_handler
+async def admin_list_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обробник гортання та фільтрів адмін-списку бронювань."""
     query = update.callback_query
     await query.answer()
 
-    user_id = query.from_user.id
-    data = query.data
-    
-    if user_id != ADMIN_USER_ID:
+    if not is_admin(query.from_user.id):
         await query.edit_message_text("Ви не маєте прав для виконання цієї дії.")
         return
 
-    action, _, idx_str = data.split("_", 2)
+    direction, anchor, date_token = context.args
+    date_from, date_to = admin_date_range(date_token)
+    if direction == "prev":
+        page = await storage.get_active_bookings_page(before_id=anchor, date_from=date_from, date_to=date_to, limit=ADMIN_PAGE_SIZE)
+    else:
+        page = await storage.get_active_bookings_page(after_id=anchor, date_from=date_from, date_to=date_to, limit=ADMIN_PAGE_SIZE)
+    text, reply_markup = render_admin_bookings_page(*page, date_token=date_token)
     try:
-        booking_id = int(idx_str)
-    except (ValueError, IndexError):
-        await query.edit_message_text("Невірний ID бронювання.")
-        return
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        # Повторне натискання на той самий фільтр не змінює повідомлення
+        if "not modified" not in str(e):
+            raise
 
-    booking_to_cancel = get_booking_by_id(booking_id)
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда адміністратора /profile [N | Ts | stop]: профілювання наступних N оновлень або T секунд."""
+    if not is_admin(update.effective_user.id, "owner"):
+        await update.message.reply_text("Ця функція тільки для адміністратора.")
+        raise ApplicationHandlerStop
 
-    if not booking_to_cancel:
-        await query.edit_message_text("Бронювання не знайдено або вже видалено.")
+    arg = context.args[0].lower() if context.args else str(PROFILE_DEFAULT_UPDATES)
+    if arg == "stop":
+        if profiler.active:
+            await profiler.finish()
+        else:
+            await update.message.reply_text("Профілювання зараз не ввімкнене.")
+        raise ApplicationHandlerStop
+
+    updates = seconds = None
+    try:
+        if arg.endswith("s"):
+            seconds = min(float(arg[:-1]), PROFILE_MAX_SECONDS)
+        else:
+            updates = int(arg)
+        if (seconds or updates or 0) <= 0:
+            raise ValueError(arg)
+    except ValueError:
+        await update.message.reply_text("Використання: /profile [кількість оновлень | секунди, напр. 30s | stop]")
+        raise ApplicationHandlerStop
+
+    if not profiler.start(context.bot, update.effective_chat.id, updates=updates, seconds=seconds):
+        await update.message.reply_text("Профілювання вже триває. Зупинити: /profile stop")
+    elif updates:
+        await update.message.reply_text(f"Профілюю наступні {updates} оновлень (не довше {PROFILE_MAX_SECONDS // 60} хв).")
+    else:
+        await update.message.reply_text(f"Профілюю {seconds:g} с.")
+    raise ApplicationHandlerStop
+
+USER_BOOKINGS_UPCOMING_LIMIT = 10
+USER_BOOKINGS_PAST_LIMIT = 5
+
+@observe_handler
+async def my_bookings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /bookings: найближчі й останні минулі бронювання гостя. Стан розмови не змінюється."""
+    user_id = update.effective_user.id
+    upcoming = await storage.get_user_bookings(user_id, upcoming=True, limit=USER_BOOKINGS_UPCOMING_LIMIT)
+    past = await storage.get_user_bookings(user_id, upcoming=False, limit=USER_BOOKINGS_PAST_LIMIT)
+    await update.message.reply_text(format_user_bookings(upcoming, past))
+    raise ApplicationHandlerStop
+
+def parse_bulk_args(args):
+    """Розбирає аргументи /bulk у (дія, дата, час, назви місць). ValueError, якщо вони невірні."""
+    if not args or args[0] not in BULK_ACTIONS:
+        raise ValueError("невідома дія")
+    action, rest = args[0], args[1:]
+    if action == 'expire':
+        if rest:
+            raise ValueError("зайві аргументи")
+        return action, None, None, None
+    if not rest:
+        raise ValueError("не вказано дату")
+    booking_date = parse_date_token(rest[0])
+    if action == 'confirm':
+        if len(rest) > 1:
+            raise ValueError("зайві аргументи")
+        return action, booking_date, None, None
+    booking_time = cabins = None
+    for token in rest[1:]:
+        if token in venue.slot_index and booking_time is None:
+            booking_time = token
+        elif cabins is None:
+            numbers = sorted({int(number) for number in token.split(",") if number})
+            if not numbers or not all(1 <= number <= len(venue.cabins) for number in numbers):
+                raise ValueError("невірні номери місць")
+            cabins = [venue.cabin_names[number - 1] for number in numbers]
+        else:
+            raise ValueError("зайві аргументи")
+    return action, booking_date, booking_time, cabins
+
+def bulk_criteria(action, booking_date, booking_time, cabins, started_before=None):
+    """Умови відбору бронювань для apply_bulk_action з розібраних аргументів.
+
+    Для expire started_before - час перегляду: виконання відбирає ті самі
+    бронювання, а не ще й ті, що почалися, поки адміністратор думав.
+    """
+    if action not in BULK_ACTIONS:
+        raise ValueError(action)
+    if action == 'expire':
+        if started_before is None:
+            raise ValueError("started_before")
+        return {'started_before': started_before}
+    criteria = {'date_from': booking_date, 'date_to': booking_date}
+    if action == 'cancel':
+        criteria['time'] = booking_time
+        criteria['cabins'] = cabins
+    return criteria
+
+def bulk_guest_text(action, booking):
+    when = f"{format_date(booking['date'])} о {booking['time']}"
+    if action == 'confirm':
+        return f"✅ Ваше бронювання на {when} підтверджено!"
+    if action == 'cancel':
+        return f"❌ Ваше бронювання на {when} (Кабінка: {booking['cabin']}) було скасовано адміністратором."
+    return f"⌛ Ваше бронювання на {when} не було вчасно підтверджено і скасоване. Телефон для зв'язку: {venue.admin_phone}."
+
+@observe_handler
+async def bulk_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда адміністратора /bulk: масові дії з бронюваннями, з підтвердженням кнопкою."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Ця функція тільки для адміністратора.")
+        raise ApplicationHandlerStop
+
+    try:
+        args = parse_bulk_args([arg.lower() for arg in context.args or []])
+    except ValueError:
+        await update.message.reply_text(format_bulk_usage())
+        raise ApplicationHandlerStop
+
+    action = args[0]
+    args = (*args, int(time.time()) if action == 'expire' else None)
+    bookings = await storage.preview_bulk_action(action, bulk_criteria(*args))
+    reply_markup = None
+    if bookings:
+        # Аргументи в callback-даних, щоб дія виконалась саме з тими умовами, що й перегляд
+        reply_markup = InlineKeyboardMarkup([[
+            InlineKeyboardButton("Виконати", callback_data=CB_BULK.encode(*args)),
+            InlineKeyboardButton("Відміна", callback_data=CB_BULK_CANCEL.encode()),
+        ]])
+    await update.message.reply_text(format_bulk_summary(action, bookings, done=False)[:TELEGRAM_MESSAGE_LIMIT], reply_markup=reply_markup)
+    raise ApplicationHandlerStop
+
+@callbacks.route(CB_BULK_CANCEL)
+@observe_handler
+async def bulk_cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Відміна масової дії кнопкою під переглядом."""
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text("Масову дію скасовано.")
+
+@callbacks.route(CB_BULK)
+@observe_handler
+async def bulk_action_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Виконує масову дію, підтверджену кнопкою: одна транзакція, повідомлення гостям і адміністраторам."""
+    query = update.callback_query
+    await query.answer()
+
+    if not is_admin(query.from_user.id):
+        await query.edit_message_text("Ви не маєте прав для виконання цієї дії.")
         return
 
-    if booking_to_cancel['status'] in ['Очікує підтвердження', 'Підтверджено']:
-        update_booking_status_in_db(booking_id, 'Скасовано (адміном)')
-        booking_to_cancel['status'] = 'Скасовано (адміном)'
+    action = context.args[0]
+    bookings = await storage.apply_bulk_action(action, bulk_criteria(*context.args))
+    if bookings is None:
+        await query.edit_message_text("Не вдалося виконати масову дію. Спробуйте пізніше.")
+        return
+    await query.edit_message_text(format_bulk_summary(action, bookings, done=True)[:TELEGRAM_MESSAGE_LIMIT])
 
-        await query.edit_message_text(f"✅ Бронювання на {booking_to_cancel['date']} о {booking_to_cancel['time']} для {booking_to_cancel['name']} скасовано адміністратором.")
+    emoji, label = BULK_ACTION_LABELS[action]
+    await asyncio.gather(
+        notify_guests(bookings, functools.partial(bulk_guest_text, action)),
+        sync_admin_copies(context.bot, {
+            b['id']: f"{emoji} {label.capitalize()}:\n\n{format_booking_msg(b)}\n\n👤 {query.from_user.full_name} (масова дія)"
+            for b in bookings
+        }),
+    )
 
-        try:
-            await context.bot.send_message(
-                chat_id=booking_to_cancel['chat_id'],
-                text=f"❌ Ваше бронювання на {booking_to_cancel['date']} о {booking_to_cancel['time']} (Кабінка: {booking_to_cancel['cabin']}) було скасовано адміністратором."
-            )
-        except Exception as e:
-            logging.error(f"Помилка при відправці повідомлення користувачу про скасування: {e}")
+@observe_handler
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда адміністратора /stats: статистика відгуків."""
+    if not is_admin(update.effective_user.id, "owner"):
+        await update.message.reply_text("Ця функція тільки для адміністратора.")
+        raise ApplicationHandlerStop
+
+    stats = await storage.get_review_stats()
+    if stats is None:
+        await update.message.reply_text("Не вдалося отримати статистику відгуків. Спробуйте пізніше.")
     else:
-        await query.edit_message_text(f"Це бронювання вже було {booking_to_cancel['status']}.")
+        await update.message.reply_text(format_review_stats(stats)[:TELEGRAM_MESSAGE_LIMIT])
+    raise ApplicationHandlerStop
+
+@observe_handler
+async def reload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда власника /reload: перечитує налаштування закладу без перезапуску."""
+    if not is_admin(update.effective_user.id, "owner"):
+        await update.message.reply_text("Ця функція тільки для адміністратора.")
+        raise ApplicationHandlerStop
 
+    try:
+        reload_venue(force=True)
+    except VenueConfigError as e:
+        await update.message.reply_text(f"❌ Налаштування не оновлено, лишаються попередні.\n{e}")
+    else:
+        await update.message.reply_text(f"✅ Налаштування оновлено: {venue.summary()}.")
+    raise ApplicationHandlerStop
+
+@callbacks.route(CB_RATING)
+@observe_handler
 async def ask_review_rating_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник вибору рейтингу відгуку."""
     query = update.callback_query
     await query.answer()
 
-    rating = int(query.data.split("_")[1])
-    context.user_data['review_rating'] = rating
-    
+    # Оцінка зберігається в SessionStore разом зі станом розмови і переживає перезапуск
+    user_booking_data[query.from_user.id] = {'review_rating': context.args[0]}
+
     await query.edit_message_text("Дякуємо за ваш рейтинг! Напишіть, будь ласка, ваш відгук (або /cancel, щоб скасувати).")
     return ASK_REVIEW_TEXT
 
+@observe_handler
 async def ask_review_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник введення тексту відгуку."""
     user_id = update.message.from_user.id
-    rating = context.user_data.get('review_rating')
+    rating = (user_booking_data.get(user_id) or {}).get('review_rating')
     comment = update.message.text
-    
-    save_review(user_id, rating, comment)
-    
+
+    if rating is None:
+        await update.message.reply_text(
+            "Вибачте, вашу оцінку не збережено. Оцініть, будь ласка, ще раз (1 - погано, 5 - чудово):",
+            reply_markup=rating_keyboard()
+        )
+        return ASK_REVIEW_RATING
+
+    await storage.save_review(user_id, rating, comment)
+    user_booking_data.pop(user_id, None)
+
     await update.message.reply_text("✅ Дякуємо за ваш відгук! Ми цінуємо вашу думку.", reply_markup=get_main_keyboard())
-    context.user_data.pop('review_rating', None) # Очищаємо дані
     return CHOOSING_MAIN_ACTION
 
+@observe_handler
 async def cancel_review(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Скасовує процес залишення відгуку."""
-    context.user_data.pop('review_rating', None)
+    user_booking_data.pop(update.message.from_user.id, None)
     await update.message.reply_text("Скасовано. Повертаюся до головного меню.", reply_markup=get_main_keyboard())
     return CHOOSING_MAIN_ACTION
     
+@observe_handler
 async def unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник невідомих команд."""
     await context.bot.send_message(
@@ -751,14 +4380,158 @@ async def unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
         text="Вибачте, я не розумію цієї команди. Будь ласка, скористайтесь меню."
     )
 
-async def main():
-    """Основна асинхронна функція для запуску бота."""
-    init_db()
-    
+async def sweep_reservations_job(context: ContextTypes.DEFAULT_TYPE):
+    """Фонове завдання: прибирає прострочені утримання і непідтверджені бронювання."""
+    expired = await storage.sweep_expired_reservations()
+    await notify_guests(
+        expired,
+        lambda booking: f"⌛ Ваше бронювання на {format_date(booking['date'])} о {booking['time']} не було вчасно підтверджено і скасоване. Будь ласка, зв'яжіться з нами за номером {venue.admin_phone}."
+    )
+    if expired:
+        await sync_admin_copies(context.bot, {b['id']: f"⌛ Не підтверджено вчасно:\n\n{format_booking_msg(b)}" for b in expired})
+
+async def archive_bookings_job(context: ContextTypes.DEFAULT_TYPE):
+    """Фонове завдання: переносить минулі й завершені бронювання в архів і прибирає минулі дні з індексу зайнятості."""
+    occupancy.drop_before(date.today().isoformat())
+    archived = await storage.archive_bookings()
+    if archived:
+        logging.info(f"В архів перенесено {archived} бронювань.")
+
+async def venue_reload_job(context: ContextTypes.DEFAULT_TYPE):
+    """Фонове завдання: підхоплює зміни файлу налаштувань закладу."""
+    try:
+        reload_venue()
+    except VenueConfigError as e:
+        logging.error(f"Налаштування закладу не оновлено, лишаються попередні: {e}")
+
+async def storage_refresh_job(context: ContextTypes.DEFAULT_TYPE):
+    """Фонове завдання: підхоплює бронювання й утримання, записані іншими процесами."""
+    if await storage.refresh():
+        logging.debug("Індекси в пам'яті перечитано після змін інших процесів.")
+
+async def flush_sessions_job(context: ContextTypes.DEFAULT_TYPE):
+    """Фонове завдання: прибирає покинуті сесії і пачкою пише зміни сесій і станів розмов у БД."""
+    user_booking_data.purge_expired()
+    # Забираємо в Application стани розмов, змінені з останнього разу, щоб записати їх разом із сесіями
+    await context.application.update_persistence()
+    await flush_session_state(context.application.persistence)
+
+async def on_startup(application):
+    """Запускає фонову відправку повідомлень і, якщо ввімкнено, сервер метрик."""
+    await outbox.start(application.bot)
+    await reminders.start()
+    if METRICS_ENABLED:
+        metrics.gauge("gipnoze_active_conversations", "Незавершені розмови ConversationHandler.",
+                      application.persistence.active_conversations)
+        metrics.gauge("gipnoze_booking_sessions", "Незавершені бронювання в пам'яті.", lambda: len(user_booking_data))
+        metrics.gauge("gipnoze_pending_reminders", "Заплановані нагадування про бронювання.", lambda: len(reminders))
+        metrics.gauge("gipnoze_contact_cache_entries", "Гості в кеші контактів.", lambda: len(contact_cache))
+        metrics.counter("gipnoze_contact_cache_hits_total", "Влучання в кеш контактів від старту.", lambda: contact_cache.hits)
+        metrics.counter("gipnoze_contact_cache_misses_total", "Промахи кешу контактів від старту.", lambda: contact_cache.misses)
+        await metrics_server.start()
+
+async def on_shutdown(application):
+    """Зупиняє відправку і дописує чергу змін у БД перед зупинкою бота."""
+    await metrics_server.stop()
+    await reminders.stop()
+    await outbox.stop()
+    await db_writer.stop()
+    db_read_executor.shutdown(wait=True)
+    db_write_executor.shutdown(wait=True)
+    db.close()
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Паралельна обробка оновлень зі збереженням порядку для кожного користувача.
+
+    Оновлення різних користувачів обробляються одночасно (до
+    max_concurrent_updates), а оновлення одного чату й користувача - строго
+    по черзі, тож стани ConversationHandler і дані бронювання не
+    перемішуються. Оновлення адміністратора мають окрему смугу і не
+    чекають у черзі за гостями. Оновлення без чату й користувача ні з чим
+    не впорядковуються.
+
+    Семафор базового класу лише обмежує кількість прийнятих оновлень
+    (max_pending_updates), зокрема тих, що чекають своєї черги; скільки
+    з них обробляється одночасно, задають власні семафори смуг.
+    """
+
+    def __init__(self, max_concurrent_updates, admin_concurrent_updates=ADMIN_UPDATE_WORKERS, max_pending_updates=UPDATE_MAX_PENDING):
+        super().__init__(max(max_pending_updates, max_concurrent_updates + admin_concurrent_updates))
+        self._guest_semaphore = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._admin_semaphore = asyncio.BoundedSemaphore(admin_concurrent_updates)
+        self._locks = {}  # ключ -> [замок, кількість оновлень, що його чекають]
+
+    @staticmethod
+    def _key(update):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        user = update.effective_user if isinstance(update, Update) else None
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat else None, user.id if user else None)
+
+    @staticmethod
+    def _is_admin(update):
+        user = update.effective_user if isinstance(update, Update) else None
+        return user is not None and user.id in ADMINS
+
+    async def do_process_update(self, update, coroutine):
+        semaphore = self._admin_semaphore if self._is_admin(update) else self._guest_semaphore
+        key = self._key(update)
+        if key is None:
+            async with semaphore:
+                await self._run(update, coroutine)
+            return
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # Спершу черга користувача, потім ліміт смуги: користувач із
+            # десятком оновлень у черзі займає лише одне місце обробника
+            async with entry[0]:
+                async with semaphore:
+                    await self._run(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    @staticmethod
+    async def _run(update, coroutine):
+        if profiler.active:
+            await profiler.trace_update(update, coroutine)
+        else:
+            await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+def build_application(bot=None):
+    """Створює Application з усіма обробниками і фоновими завданнями.
+
+    bot дозволяє підставити власний екземпляр Bot (наприклад, заглушку в
+    навантажувальному тесті); за замовчуванням бот створюється з TOKEN.
+    """
     # Створення ApplicationBuilder та ConversationHandler
-    application = ApplicationBuilder().token(TOKEN).build()
+    builder = ApplicationBuilder()
+    # Власний HTTPXRequest записує виклики Telegram API в трасування /profile
+    builder = builder.bot(bot) if bot is not None else builder.token(TOKEN).request(TracingHTTPXRequest(connection_pool_size=256))
+    application = (
+        builder
+        .concurrent_updates(PerUserUpdateProcessor(UPDATE_WORKERS))
+        .persistence(SQLitePersistence())
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     
     conv_handler = ConversationHandler(
+        name="booking",
+        persistent=True,
+        conversation_timeout=SESSION_TTL_SECONDS,
         entry_points=[
             CommandHandler("start", start, filters=filters.ChatType.PRIVATE),
             MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, handle_main_menu_choice)
@@ -768,19 +4541,19 @@ async def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, handle_main_menu_choice)
             ],
             CHECK_SAVED_CONTACTS: [
-                CallbackQueryHandler(check_saved_contacts_handler, pattern="^(use_saved_contacts|enter_new_contacts)$")
+                callbacks.handler(CB_SAVED_CONTACTS)
             ],
             BOOKING_DATE: [
-                CallbackQueryHandler(book_date_handler, pattern="^date_")
+                callbacks.handler(CB_DATE)
             ],
             BOOKING_TIME: [
-                CallbackQueryHandler(book_time_handler, pattern="^time_")
+                callbacks.handler(CB_TIME)
             ],
             BOOKING_GUESTS: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, book_guests_handler)
             ],
             BOOKING_CABIN: [
-                CallbackQueryHandler(book_cabin_handler, pattern="^cabin_")
+                callbacks.handler(CB_CABIN)
             ],
             BOOKING_NAME: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, book_name_handler)
@@ -792,10 +4565,10 @@ async def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, book_phone_handler)
             ],
             ASK_SAVE_CONTACT: [
-                CallbackQueryHandler(save_contact_handler, pattern="^save_contact_(yes|no)$")
+                callbacks.handler(CB_SAVE_CONTACT)
             ],
             ASK_REVIEW_RATING: [
-                CallbackQueryHandler(ask_review_rating_handler, pattern="^rating_")
+                callbacks.handler(CB_RATING)
             ],
             ASK_REVIEW_TEXT: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, ask_review_text_handler)
@@ -808,13 +4581,47 @@ async def main():
         ]
     )
 
+    # Група -1 обробляється раніше за розмову, інакше ці команди перехопив би її fallback
+    application.add_handler(CommandHandler("profile", profile_command, filters=filters.ChatType.PRIVATE), group=-1)
+    application.add_handler(CommandHandler("stats", stats_command, filters=filters.ChatType.PRIVATE), group=-1)
+    application.add_handler(CommandHandler("bookings", my_bookings_command, filters=filters.ChatType.PRIVATE), group=-1)
+    application.add_handler(CommandHandler("bulk", bulk_command, filters=filters.ChatType.PRIVATE), group=-1)
+    application.add_handler(CommandHandler("reload", reload_command, filters=filters.ChatType.PRIVATE), group=-1)
     application.add_handler(conv_handler)
-    application.add_handler(CallbackQueryHandler(admin_booking_callback, pattern="^admin_(confirm|reject)_.+"))
-    application.add_handler(CallbackQueryHandler(admin_force_cancel_booking, pattern="^admin_force_cancel_.+"))
+    application.job_queue.run_repeating(flush_sessions_job, interval=SESSION_FLUSH_INTERVAL_SECONDS, first=SESSION_FLUSH_INTERVAL_SECONDS)
+    application.job_queue.run_repeating(sweep_reservations_job, interval=RESERVATION_SWEEP_INTERVAL_SECONDS, first=RESERVATION_SWEEP_INTERVAL_SECONDS)
+    application.job_queue.run_repeating(archive_bookings_job, interval=ARCHIVE_INTERVAL_SECONDS, first=RESERVATION_SWEEP_INTERVAL_SECONDS)
+    application.job_queue.run_repeating(venue_reload_job, interval=VENUE_RELOAD_INTERVAL_SECONDS, first=VENUE_RELOAD_INTERVAL_SECONDS)
+    if isinstance(storage, SharedSQLiteStorage):
+        application.job_queue.run_repeating(storage_refresh_job, interval=STORAGE_REFRESH_INTERVAL_SECONDS, first=STORAGE_REFRESH_INTERVAL_SECONDS)
+    # Кнопки адміністраторів працюють поза розмовою; решту натискань, яких не прийняв жоден обробник
+    # (старі версії кнопок, кнопки з уже завершених кроків розмови), отримує reject_stale
+    application.add_handler(callbacks.handler(CB_ADMIN_DECISION, CB_FORCE_CANCEL, CB_ADMIN_LIST, CB_BULK, CB_BULK_CANCEL))
+    application.add_handler(CallbackQueryHandler(callbacks.reject_stale))
     application.add_handler(MessageHandler(filters.ChatType.PRIVATE & (filters.TEXT | filters.COMMAND), unknown))
-    
-    logging.info("Бот запущено...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    return application
+
+def main():
+    """Основна функція для запуску бота."""
+    storage.open()
+
+    application = build_application()
+
+    if BOT_MODE == "webhook":
+        # Telegram передає секрет у заголовку X-Telegram-Bot-Api-Secret-Token,
+        # запити без нього вбудований сервер відхиляє
+        logging.info(f"Бот запущено в режимі webhook на {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}...")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            allowed_updates=ALLOWED_UPDATES,
+        )
+    else:
+        logging.info("Бот запущено...")
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    main()
\ No newline at end of file